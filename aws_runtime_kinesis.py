@@ -1,8 +1,15 @@
 from stateflow.runtime.aws.kinesis_lambda import AWSKinesisLambdaRuntime
-from demo_common import stateflow
+import stateflow
+import os
 
+# Loading a snapshot skips analyzing the classes (and importing libcst) on a cold start. Build it with:
+# python -c "from demo_common import stateflow; stateflow.save_snapshot(stateflow.init(), 'dataflow.snapshot')"
+if os.path.exists("dataflow.snapshot"):
+    flow = stateflow.load_snapshot("dataflow.snapshot")
+else:
+    from demo_common import stateflow
 
-flow = stateflow.init()
+    flow = stateflow.init()
 print("Called init code!")
 
 runtime, handler = AWSKinesisLambdaRuntime.get_handler(flow)
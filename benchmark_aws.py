@@ -0,0 +1,69 @@
+from demo_common import User, Item, stateflow
+from stateflow.runtime.aws.gateway_lambda import AWSGatewayLambdaRuntime
+from stateflow.runtime.aws.kinesis_lambda import AWSKinesisLambdaRuntime
+from stateflow.util.aws_benchmark import AWSLambdaBenchmark, EventRecorder
+import argparse
+import random
+import time
+
+"""Benchmarks the Lambda runtimes against local DynamoDB and Kinesis stand-ins.
+For example:
+    python benchmark_aws.py --runtime kinesis --concurrency 8 --optimistic --prefetch
+    python benchmark_aws.py --optimistic --prefetch --table-per-operator --composite-key
+"""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--runtime", choices=["gateway", "kinesis"], default="gateway")
+parser.add_argument("--concurrency", type=int, default=4)
+parser.add_argument("--batch-size", type=int, default=100)
+parser.add_argument("--users", type=int, default=100)
+parser.add_argument("--items", type=int, default=10)
+parser.add_argument("--requests", type=int, default=1000)
+parser.add_argument("--optimistic", action="store_true")
+parser.add_argument("--prefetch", action="store_true")
+parser.add_argument("--table-per-operator", action="store_true")
+parser.add_argument("--composite-key", action="store_true")
+args = parser.parse_args()
+
+flow = stateflow.init()
+recorder = EventRecorder(flow)
+
+runtime_kwargs = {
+    "optimistic": args.optimistic,
+    "prefetch": args.prefetch,
+    "table_per_operator": args.table_per_operator,
+    "composite_key": args.composite_key,
+}
+runtime_class = (
+    AWSKinesisLambdaRuntime if args.runtime == "kinesis" else AWSGatewayLambdaRuntime
+)
+
+with AWSLambdaBenchmark(
+    flow,
+    runtime_class,
+    concurrency=args.concurrency,
+    batch_size=args.batch_size,
+    **runtime_kwargs,
+) as benchmark:
+    for i in range(args.users):
+        User(f"user-{i}")
+    for i in range(args.items):
+        Item(f"item-{i}", 1)
+    print(benchmark.run(recorder.record(), "create"))
+
+    for i in range(args.users):
+        User(__key=f"user-{i}").update_balance(args.requests)
+    for i in range(args.items):
+        Item(__key=f"item-{i}").update_stock(args.requests)
+    print(benchmark.run(recorder.record(), "fill"))
+
+    start = time.perf_counter()
+    users = len(list(benchmark.runtimes[0].scan_operator("global/User")))
+    print(f"scan: {users} users in {(time.perf_counter() - start) * 1000:.2f}ms")
+
+    # Popular items account for most of the traffic.
+    for _ in range(args.requests):
+        user = User(__key=f"user-{random.randrange(args.users)}")
+        item = Item(__key=f"item-{int(random.paretovariate(1.16)) % args.items}")
+        user.buy_item(1, item)
+    print(benchmark.run(recorder.record(), "buy_item"))
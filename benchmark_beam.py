@@ -0,0 +1,74 @@
+from demo_common import User, Item, stateflow
+from stateflow.util.beam_benchmark import BeamBenchmark
+from stateflow.util.benchmark import EventRecorder
+from apache_beam.options.pipeline_options import PipelineOptions
+import argparse
+import random
+
+"""Benchmarks the Beam runtime on the DirectRunner, with an in-memory stand-in of Kafka.
+For example:
+    python benchmark_beam.py --rate 500
+    python benchmark_beam.py --multiplexed --rate 500 --rate 1000 --rate 2000
+    python benchmark_beam.py --multiplexed --workers 4 --rate 1000
+"""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--users", type=int, default=100)
+parser.add_argument("--items", type=int, default=10)
+parser.add_argument("--requests", type=int, default=1000)
+parser.add_argument(
+    "--rate",
+    type=float,
+    action="append",
+    help="the amount of buy_item requests per second, can be repeated",
+)
+parser.add_argument("--multiplexed", action="store_true")
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="the amount of DirectRunner workers, these run in threads to share the in-memory broker",
+)
+parser.add_argument(
+    "--dedup-window",
+    type=int,
+    default=0,
+    help="the amount of events per key of which the output is kept to recognize duplicates, 0 disables it",
+)
+args = parser.parse_args()
+
+flow = stateflow.init()
+recorder = EventRecorder(flow)
+
+pipeline_options = PipelineOptions(
+    direct_num_workers=args.workers, direct_running_mode="multi_threading"
+)
+
+with BeamBenchmark(
+    flow,
+    multiplexed=args.multiplexed,
+    pipeline_options=pipeline_options,
+    dedup_window=args.dedup_window,
+) as benchmark:
+    for i in range(args.users):
+        User(f"user-{i}")
+    for i in range(args.items):
+        Item(f"item-{i}", 1)
+    print(benchmark.run(recorder.record(), "create"))
+
+    # Enough balance and stock for all runs.
+    rates = args.rate or [None]
+    for i in range(args.users):
+        User(__key=f"user-{i}").update_balance(args.requests * len(rates))
+    for i in range(args.items):
+        Item(__key=f"item-{i}").update_stock(args.requests * len(rates))
+    print(benchmark.run(recorder.record(), "fill"))
+
+    for rate in rates:
+        # Popular items account for most of the traffic.
+        for _ in range(args.requests):
+            user = User(__key=f"user-{random.randrange(args.users)}")
+            item = Item(__key=f"item-{int(random.paretovariate(1.16)) % args.items}")
+            user.buy_item(1, item)
+        name = "buy_item" if rate is None else f"buy_item@{rate:g}/s"
+        print(benchmark.run(recorder.record(), name, rate=rate))
@@ -19,5 +19,6 @@ setup(
         "fastapi",
         "uvicorn",
         "aiokafka",
+        "httpx",
     ],
 )
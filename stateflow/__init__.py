@@ -1,2 +1,2 @@
-from .core import stateflow, init
+from .core import stateflow, init, save_snapshot, load_snapshot
 from .util.stateflow_test import stateflow_test
@@ -0,0 +1,132 @@
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from typing import Dict, Optional
+from urllib.parse import quote
+import asyncio
+import boto3
+import httpx
+
+
+class AsyncHTTPPool:
+    """An asynchronous HTTP client with keep-alive connection pooling and bounded concurrency.
+
+    At most `max_concurrency` requests are in flight at once, other requests wait for a free slot
+    (instead of failing on a pool timeout). Connections are kept alive and reused between requests.
+    """
+
+    def __init__(self, max_concurrency: int = 100, timeout: float = 5):
+        """Initializes a pool.
+
+        :param max_concurrency: the maximum amount of concurrent requests (and open connections).
+        :param timeout: the timeout (in seconds) of a request, once it is sent.
+        """
+        self.max_concurrency: int = max_concurrency
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            timeout=timeout,
+        )
+
+        # Created lazily, so that it belongs to the event loop the requests are sent from.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """Sends a POST request, once a slot is free.
+
+        :param url: the url.
+        :param kwargs: the arguments of the request, e.g. json or content.
+        :return: the response.
+        """
+        async with self.semaphore:
+            return await self.client.post(url, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class AsyncLambdaInvoker:
+    """Invokes an AWS Lambda function asynchronously, without blocking the event loop.
+
+    The Invoke API is called directly over HTTP (signed with the credentials of a boto3 session),
+    so that requests share a pool of keep-alive connections.
+    See https://docs.aws.amazon.com/lambda/latest/dg/API_Invoke.html
+    """
+
+    def __init__(
+        self,
+        function_name: str,
+        region: Optional[str] = None,
+        session: Optional[boto3.session.Session] = None,
+        max_concurrency: int = 100,
+        timeout: float = 5,
+    ):
+        """Initializes an invoker.
+
+        :param function_name: the name (or ARN) of the Lambda function.
+        :param region: the region of the function, defaults to the region of the session.
+        :param session: the boto3 session to take the credentials from.
+        :param max_concurrency: the maximum amount of concurrent invocations.
+        :param timeout: the timeout (in seconds) of an invocation.
+        """
+        self.session = session if session is not None else boto3.session.Session()
+        self.region: str = region if region is not None else self.session.region_name
+        if self.region is None:
+            raise AttributeError(
+                f"No region to invoke Lambda function {function_name} in."
+            )
+
+        self.function_name: str = function_name
+        self.url: str = (
+            f"https://lambda.{self.region}.amazonaws.com/2015-03-31/functions/"
+            f"{quote(function_name, safe='')}/invocations"
+        )
+        self.pool: AsyncHTTPPool = AsyncHTTPPool(max_concurrency, timeout)
+
+    def _sign(self, payload: bytes) -> Dict[str, str]:
+        credentials = self.session.get_credentials()
+        if credentials is None:
+            raise AttributeError(
+                f"No credentials to invoke Lambda function {self.function_name}."
+            )
+
+        request = AWSRequest(
+            method="POST",
+            url=self.url,
+            data=payload,
+            headers={"Content-Type": "application/json"},
+        )
+        SigV4Auth(credentials.get_frozen_credentials(), "lambda", self.region).add_auth(
+            request
+        )
+        return dict(request.headers.items())
+
+    async def invoke(self, payload: bytes) -> bytes:
+        """Invokes the function synchronously (i.e. waits for its response), without blocking the event loop.
+
+        :param payload: the (JSON) payload of the invocation.
+        :return: the response payload of the function.
+        """
+        async with self.pool.semaphore:
+            # Signed once a slot is free, so the signature doesn't expire while waiting.
+            response: httpx.Response = await self.pool.client.post(
+                self.url, content=payload, headers=self._sign(payload)
+            )
+
+        response.raise_for_status()
+        if "X-Amz-Function-Error" in response.headers:
+            raise AttributeError(
+                f"Lambda function {self.function_name} failed: {response.text}"
+            )
+
+        return response.content
+
+    async def close(self):
+        await self.pool.close()
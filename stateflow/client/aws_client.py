@@ -3,13 +3,17 @@ from stateflow.serialization.pickle_serializer import PickleSerializer, SerDe
 from stateflow.dataflow.dataflow import Dataflow
 from stateflow.dataflow.event import Event, EventType
 from stateflow.dataflow.address import FunctionType, FunctionAddress
-from stateflow.client.future import StateflowFuture, T
-from typing import Dict, Optional, Any
+from stateflow.client.future import StateflowFuture, StateflowBatchFuture, T
+from stateflow.util.kinesis_buffer import KinesisBuffer, KinesisBufferError
+from typing import Dict, Optional, Any, List
 import boto3
+import logging
 import time
 import threading
 import uuid
 
+logger = logging.getLogger(__name__)
+
 
 class AWSKinesisClient(StateflowClient):
     def __init__(
@@ -18,47 +22,195 @@ class AWSKinesisClient(StateflowClient):
         request_stream: str = "stateflow-request",
         reply_stream: str = "stateflow-reply",
         serializer: SerDe = PickleSerializer(),
+        checkpoints: Optional[Dict[str, str]] = None,
+        shard_discovery_interval: float = 10.0,
+        linger: float = 0.01,
     ):
+        """Initializes a Kinesis client.
+
+        Replies are consumed from all shards of the reply stream, with a thread per shard.
+        Shards are re-discovered periodically, so shards created by resharding are followed as well.
+
+        :param flow: the dataflow.
+        :param request_stream: the stream to send requests to.
+        :param reply_stream: the stream to consume replies from.
+        :param serializer: the serializer for events.
+        :param checkpoints: a mapping of shard id to the last consumed sequence number. Consumption of a shard
+            resumes after its checkpoint. This mapping is updated in place, so it can be backed by persistent storage.
+        :param shard_discovery_interval: the interval (in seconds) to discover new shards.
+        :param linger: the maximum time (in seconds) a request is buffered before it is sent.
+            Requests are sent in batches using `put_records`.
+        """
         self.flow = flow
         self.request_stream = request_stream
         self.reply_stream = reply_stream
         self.serializer = serializer
 
-        self.kinesis = boto3.client("kinesis")
+        self.kinesis = self._setup_kinesis()
         self.request_stream: str = request_stream
         self.reply_stream: str = reply_stream
+        self.request_buffer: KinesisBuffer = KinesisBuffer(
+            self.kinesis, linger=linger, on_failure=self._fail_requests
+        )
 
         # The futures still to complete.
         self.futures: Dict[str, StateflowFuture] = {}
+        self.futures_lock = threading.Lock()
+
+        # The consumer thread per shard and the last consumed sequence number per shard.
+        self.shard_consumers: Dict[str, threading.Thread] = {}
+        self.checkpoints: Dict[str, str] = checkpoints if checkpoints is not None else {}
+        self.shard_discovery_interval: float = shard_discovery_interval
 
         # Set the wrapper.
         [op.meta_wrapper.set_client(self) for op in flow.operators]
 
         self.running = True
-        consume_thread = threading.Thread(target=self.consume)
-        consume_thread.start()
+        self.consume_thread = threading.Thread(target=self.consume)
+        self.consume_thread.start()
+
+    def _setup_kinesis(self):
+        return boto3.client("kinesis")
+
+    def _list_shards(self) -> List[Dict]:
+        shards: List[Dict] = []
+        response = self.kinesis.list_shards(StreamName=self.reply_stream)
+        shards.extend(response["Shards"])
+
+        while response.get("NextToken"):
+            response = self.kinesis.list_shards(NextToken=response["NextToken"])
+            shards.extend(response["Shards"])
+
+        return shards
+
+    def _get_shard_iterator(self, shard_id: str, iterator_type: str) -> str:
+        if shard_id in self.checkpoints:
+            return self.kinesis.get_shard_iterator(
+                StreamName=self.reply_stream,
+                ShardId=shard_id,
+                ShardIteratorType="AFTER_SEQUENCE_NUMBER",
+                StartingSequenceNumber=self.checkpoints[shard_id],
+            )["ShardIterator"]
+
+        return self.kinesis.get_shard_iterator(
+            StreamName=self.reply_stream,
+            ShardId=shard_id,
+            ShardIteratorType=iterator_type,
+        )["ShardIterator"]
+
+    def _discover_shards(self, iterator_type: str):
+        """Starts a consumer thread for each shard which is not consumed yet.
+
+        :param iterator_type: where to start consuming shards without a checkpoint.
+        """
+        for shard in self._list_shards():
+            shard_id: str = shard["ShardId"]
+            if shard_id in self.shard_consumers:
+                continue
+
+            # The iterator is requested before the thread starts, so that no replies are missed once discovered.
+            iterator: str = self._get_shard_iterator(shard_id, iterator_type)
+            consumer = threading.Thread(
+                target=self._consume_shard, args=(shard_id, iterator), daemon=True
+            )
+            self.shard_consumers[shard_id] = consumer
+            consumer.start()
 
     def consume(self):
-        iterator = self.kinesis.get_shard_iterator(
-            StreamName=self.reply_stream, ShardId="0", ShardIteratorType="LATEST"
-        )["ShardIterator"]
+        # Shards which exist on start-up are consumed from the latest record,
+        # shards discovered later on (i.e. by resharding) are consumed from their start.
+        iterator_type: str = "LATEST"
+        failures: int = 0
 
+        next_discovery: float = time.time()
         while self.running:
-            response = self.kinesis.get_records(ShardIterator=iterator)
-            iterator = response["NextShardIterator"]
+            if time.time() >= next_discovery:
+                try:
+                    self._discover_shards(iterator_type)
+                except Exception as exc:
+                    # A failed (e.g. throttled) discovery is retried, otherwise new shards are never consumed.
+                    failures += 1
+                    delay: float = min(self.shard_discovery_interval, 0.1 * 2 ** failures)
+                    logger.warning(
+                        f"Failed to discover shards, retrying in {delay:.1f}s: {exc!r}"
+                    )
+                    next_discovery = time.time() + delay
+                else:
+                    iterator_type = "TRIM_HORIZON"
+                    failures = 0
+                    next_discovery = time.time() + self.shard_discovery_interval
+
+            time.sleep(0.1)
+
+    def _consume_shard(self, shard_id: str, iterator: str):
+        while self.running and iterator is not None:
+            try:
+                response = self.kinesis.get_records(ShardIterator=iterator)
+            except self.kinesis.exceptions.ExpiredIteratorException:
+                # Without a checkpoint, the shard is consumed from its start so that no pending replies are skipped.
+                iterator = self._get_shard_iterator(shard_id, "TRIM_HORIZON")
+                continue
+            except self.kinesis.exceptions.ProvisionedThroughputExceededException:
+                time.sleep(1)
+                continue
+
+            # A closed shard (after resharding) has no next iterator.
+            iterator = response.get("NextShardIterator")
+
             for msg in response["Records"]:
-                event_serialized = msg["Data"]
-                event = self.serializer.deserialize_event(event_serialized)
-                key = event.event_id
+                self.checkpoints[shard_id] = msg["SequenceNumber"]
 
-                # print(f"{key} -> Received message")
-                if key in self.futures.keys():
-                    if not event:
-                        event = self.serializer.deserialize_event(msg.value())
-                    self.futures[key].complete(event)
-                    del self.futures[key]
+                # Replies are partitioned by their event id, so replies for other clients are discarded
+                # before decoding.
+                key = msg["PartitionKey"]
+                if key not in self.futures:
+                    continue
 
-            time.sleep(0.01)
+                # print(f"{key} -> Received message")
+                event = self.serializer.deserialize_event(msg["Data"])
+                self._complete_future(key, event)
+
+            # A shard supports 5 reads per second, we only back off if the shard is idle.
+            if len(response["Records"]) == 0:
+                time.sleep(0.2)
+
+    def stop(self):
+        self.running = False
+        self.request_buffer.close()
+        self.consume_thread.join()
+        for consumer in self.shard_consumers.values():
+            consumer.join()
+
+    def _complete_future(self, key: str, event: Event):
+        # Shards are consumed concurrently, so futures are completed under a lock.
+        with self.futures_lock:
+            future: Optional[StateflowFuture] = self.futures.pop(key, None)
+            if future is None:
+                return
+
+            future.complete(event)
+
+            # A batch future is registered under multiple ids, we clean them all up once it completes.
+            if isinstance(future, StateflowBatchFuture) and future.is_completed:
+                for future_id in future.ids():
+                    self.futures.pop(future_id, None)
+
+    def _fail_requests(self, error: KinesisBufferError):
+        # Requests are partitioned by their event id, so the futures of requests which were not sent are failed.
+        with self.futures_lock:
+            for record in error.records:
+                future: Optional[StateflowFuture] = self.futures.pop(
+                    record["PartitionKey"], None
+                )
+                if future is None:
+                    continue
+
+                future.complete_with_failure(f"Request failed: {error}")
+                future.is_completed = True
+
+                if isinstance(future, StateflowBatchFuture):
+                    for future_id in future.ids():
+                        self.futures.pop(future_id, None)
 
     def find(self, clasz, key: str) -> StateflowFuture[Optional[Any]]:
         event_id = str(uuid.uuid4())
@@ -69,16 +221,30 @@ class AWSKinesisClient(StateflowClient):
         return self.send(Event(event_id, fun_address, event_type, payload), clasz)
 
     def send(self, event: Event, return_type: T = None) -> StateflowFuture[T]:
-        self.kinesis.put_record(
-            StreamName=self.request_stream,
-            Data=self.serializer.serialize_event(event),
-            PartitionKey=event.event_id,
-        )
-
         future = StateflowFuture(
             event.event_id, time.time(), event.fun_address, return_type
         )
 
         self.futures[event.event_id] = future
 
+        self.request_buffer.put(
+            self.request_stream, self.serializer.serialize_event(event), event.event_id
+        )
+
         return future
+
+    def send_batch(
+        self, events: List[Event], return_type: T = None, batch_size: int = 1000
+    ) -> StateflowBatchFuture[T]:
+        batch_future = super().send_batch(events, return_type, batch_size)
+
+        # All batches are buffered, so we send them right away.
+        self.request_buffer.flush()
+        return batch_future
+
+    def _send_batch_event(self, batch: Event, future: StateflowBatchFuture):
+        self.futures[batch.event_id] = future
+
+        self.request_buffer.put(
+            self.request_stream, self.serializer.serialize_event(batch), batch.event_id
+        )
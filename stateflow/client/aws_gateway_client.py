@@ -1,15 +1,51 @@
 import base64
 
-import boto3
-
 from stateflow.client.stateflow_client import StateflowClient
+from stateflow.client.async_http import AsyncHTTPPool
 from stateflow.dataflow.dataflow import Dataflow
 from stateflow.serialization.pickle_serializer import SerDe, PickleSerializer
 from stateflow.dataflow.event import Event
-from stateflow.client.future import StateflowFuture, T
+from stateflow.client.future import StateflowFuture, StateflowBatchFuture, T
+import asyncio
+import threading
+import httpx
 import time
-import requests
-import json
+from typing import Any, Dict
+
+# The media type of raw serialized events.
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+
+def encode_request(serializer: SerDe, event: Event, binary: bool) -> Dict[str, Any]:
+    """Encodes an event as the arguments of a POST request to API Gateway.
+
+    :param serializer: the serializer for events.
+    :param event: the event to encode.
+    :param binary: if True, the raw serialized event is posted. Otherwise, it is base64 encoded in a JSON envelope.
+    :return: the arguments of the request.
+    """
+    event_serialized: bytes = serializer.serialize_event(event)
+    if binary:
+        return {
+            "content": event_serialized,
+            "headers": {"Content-Type": BINARY_MEDIA_TYPE, "Accept": BINARY_MEDIA_TYPE},
+        }
+
+    return {"json": {"event": base64.b64encode(event_serialized).decode()}}
+
+
+def decode_reply(serializer: SerDe, response: httpx.Response) -> Event:
+    """Decodes the reply event of an API Gateway response, either raw or in a JSON envelope.
+
+    :param serializer: the serializer for events.
+    :param response: the response.
+    :return: the reply event.
+    """
+    response.raise_for_status()
+    if response.headers.get("content-type", "").startswith(BINARY_MEDIA_TYPE):
+        return serializer.deserialize_event(response.content)
+
+    return serializer.deserialize_event(base64.b64decode(response.json()["event"]))
 
 
 class AWSGatewayClient(StateflowClient):
@@ -18,26 +54,64 @@ class AWSGatewayClient(StateflowClient):
         flow: Dataflow,
         api_gateway_url: str,
         serde: SerDe = PickleSerializer(),
+        max_concurrency: int = 100,
+        timeout: float = 30,
+        binary: bool = False,
     ):
+        """Initializes an API Gateway client.
+
+        Requests are sent asynchronously from an event loop in a background thread, over a pool
+        of keep-alive connections. Therefore, `send` returns immediately and many requests can be in flight at once.
+
+        :param flow: the dataflow.
+        :param api_gateway_url: the url of the API Gateway endpoint.
+        :param serde: the serializer for events.
+        :param max_concurrency: the maximum amount of requests in flight, other requests are queued.
+        :param timeout: the timeout (in seconds) of a request.
+        :param binary: post raw serialized events, instead of base64 encoded events in a JSON envelope.
+            This requires `application/octet-stream` to be configured as binary media type of the API.
+        """
         super().__init__(flow, serde)
 
         # Set the wrapper.
         [op.meta_wrapper.set_client(self) for op in flow.operators]
 
         self.api_gateway_url = api_gateway_url
+        self.binary: bool = binary
+        self.http: AsyncHTTPPool = AsyncHTTPPool(max_concurrency, timeout)
 
-    def send(self, event: Event, return_type: T = None) -> StateflowFuture[T]:
-        event_serialized: bytes = self.serializer.serialize_event(event)
-        event_encoded = base64.b64encode(event_serialized).decode()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
 
-        result = requests.post(self.api_gateway_url, json={"event": event_encoded})
-        result_json = result.json()
-        result_event = base64.b64decode(result_json["event"])
+    async def _post_event(self, event: Event) -> Event:
+        result = await self.http.post(
+            self.api_gateway_url, **encode_request(self.serializer, event, self.binary)
+        )
+        return decode_reply(self.serializer, result)
 
+    async def _complete(self, event: Event, future: StateflowFuture):
+        # Any error (e.g. a non-JSON body or a signing error) fails the future, otherwise the caller waits forever.
+        try:
+            result_event: Event = await self._post_event(event)
+            future.complete(result_event)
+        except Exception as exc:
+            future.complete_with_failure(f"Request failed: {exc!r}")
+            future.is_completed = True
+
+    def send(self, event: Event, return_type: T = None) -> StateflowFuture[T]:
         fut = StateflowFuture(
             event.event_id, time.time(), event.fun_address, return_type
         )
 
-        fut.complete(self.serializer.deserialize_event(result_event))
+        asyncio.run_coroutine_threadsafe(self._complete(event, fut), self.loop)
 
         return fut
+
+    def _send_batch_event(self, batch: Event, future: StateflowBatchFuture):
+        asyncio.run_coroutine_threadsafe(self._complete(batch, future), self.loop)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.http.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
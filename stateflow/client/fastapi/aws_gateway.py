@@ -11,9 +11,10 @@ from stateflow.client.fastapi.fastapi import (
     FunctionType,
     EventType,
 )
+from stateflow.client.async_http import AsyncHTTPPool
+from stateflow.client.aws_gateway_client import encode_request, decode_reply
 import httpx
 import uuid
-import base64
 import time
 
 
@@ -25,30 +26,35 @@ class AWSGatewayFastAPIClient(FastAPIClient):
         serializer: SerDe = PickleSerializer(),
         timeout: int = 5,
         root: str = "stateflow",
+        max_concurrency: int = 100,
+        binary: bool = False,
     ):
         super().__init__(flow, serializer, timeout, root)
         self.api_gateway_url: str = api_gateway_url
-        self.http_client = httpx.AsyncClient()
+        self.binary: bool = binary
+        self.http: AsyncHTTPPool = AsyncHTTPPool(max_concurrency, timeout)
 
     def setup_init(self):
         super().setup_init()
 
-    async def send(self, event: Event, return_type: T = None):
-        event_serialized: bytes = self.serializer.serialize_event(event)
-        event_encoded = base64.b64encode(event_serialized).decode()
+        @self.app.on_event("shutdown")
+        async def close_http():
+            await self.http.close()
 
-        result = await self.http_client.post(
-            self.api_gateway_url, json={"event": event_encoded}, timeout=self.timeout
+    async def _post_event(self, event: Event) -> Event:
+        result = await self.http.post(
+            self.api_gateway_url, **encode_request(self.serializer, event, self.binary)
         )
-        result_json = result.json()
+        return decode_reply(self.serializer, result)
 
-        result_event = base64.b64decode(result_json["event"])
+    async def send(self, event: Event, return_type: T = None):
+        result_event: Event = await self._post_event(event)
 
         future = StateflowFuture(
             event.event_id, time.time(), event.fun_address, return_type
         )
 
-        future.complete(self.serializer.deserialize_event(result_event))
+        future.complete(result_event)
 
         try:
             result = future.get()
@@ -63,19 +69,13 @@ class AWSGatewayFastAPIClient(FastAPIClient):
         future: StateflowFuture,
         timeout_msg: str = "Event timed out.",
     ):
-        event_serialized: bytes = self.serializer.serialize_event(event)
-        event_encoded = base64.b64encode(event_serialized).decode()
-
+        # Any error (e.g. an invalid reply or a signing error) fails the future, otherwise the caller waits forever.
         try:
-            result = await self.http_client.post(
-                self.api_gateway_url,
-                json={"event": event_encoded},
-                timeout=self.timeout,
-            )
+            result_event: Event = await self._post_event(event)
+            future.complete(result_event)
         except httpx.TimeoutException:
             future.complete_with_failure(timeout_msg)
-            return
-
-        result_json = result.json()
-        result_event = base64.b64decode(result_json["event"])
-        future.complete(self.serializer.deserialize_event(result_event))
+            future.is_completed = True
+        except Exception as exc:
+            future.complete_with_failure(f"Request failed: {exc!r}")
+            future.is_completed = True
@@ -10,9 +10,11 @@ from stateflow.client.fastapi.fastapi import (
     StateflowFuture,
     StateflowFailure,
 )
+from stateflow.client.async_http import AsyncLambdaInvoker
+from typing import Optional
 import base64
+import httpx
 import time
-import boto3
 
 
 class AWSLambdaFastAPIClient(FastAPIClient):
@@ -23,33 +25,52 @@ class AWSLambdaFastAPIClient(FastAPIClient):
         serializer: SerDe = PickleSerializer(),
         timeout: int = 5,
         root: str = "stateflow",
+        max_concurrency: int = 100,
+        region: Optional[str] = None,
+        binary: bool = False,
     ):
         super().__init__(flow, serializer, timeout, root)
-        self.client = boto3.client("lambda")
         self.function_name = function_name
 
+        # Lambda payloads have to be JSON, so the most compact payload is a base64 string (without envelope).
+        self.binary: bool = binary
+        self.invoker: AsyncLambdaInvoker = AsyncLambdaInvoker(
+            function_name, region, max_concurrency=max_concurrency, timeout=timeout
+        )
+
     def setup_init(self):
         super().setup_init()
 
-    async def send(self, event: Event, return_type: T = None):
+        @self.app.on_event("shutdown")
+        async def close_invoker():
+            await self.invoker.close()
+
+    async def _invoke_event(self, event: Event) -> Event:
         event_serialized: bytes = self.serializer.serialize_event(event)
+        event_encoded = base64.b64encode(event_serialized).decode()
 
-        event_encoded = base64.b64encode(event_serialized)
+        if self.binary:
+            payload = json.dumps(event_encoded)
+        else:
+            payload = json.dumps({"event": event_encoded})
 
-        result = self.client.invoke(
-            FunctionName=self.function_name,
-            Payload=event_encoded,
-        )
+        result = json.loads(await self.invoker.invoke(payload.encode()))
+
+        # A base64 string is replied to a base64 string, otherwise the reply is in an envelope.
+        if isinstance(result, str):
+            result_event = base64.b64decode(result)
+        else:
+            result_event = base64.b64decode(json.loads(result["body"])["event"])
+        return self.serializer.deserialize_event(result_event)
 
-        result = result["Payload"].read()
-        result_json = json.loads(result)["body"]
-        result_event = base64.b64decode(json.loads(result_json)["event"])
+    async def send(self, event: Event, return_type: T = None):
+        result_event: Event = await self._invoke_event(event)
 
         future = StateflowFuture(
             event.event_id, time.time(), event.fun_address, return_type
         )
 
-        future.complete(self.serializer.deserialize_event(result_event))
+        future.complete(result_event)
 
         try:
             result = future.get()
@@ -64,16 +85,13 @@ class AWSLambdaFastAPIClient(FastAPIClient):
         future: StateflowFuture,
         timeout_msg: str = "Event timed out.",
     ):
-        event_serialized: bytes = self.serializer.serialize_event(event)
-        event_encoded = base64.b64encode(event_serialized).decode()
-
-        result = self.client.invoke(
-            FunctionName=self.function_name,
-            Payload=json.dumps({"event": event_encoded}),
-        )
-        result = result["Payload"].read()
-        result_json = json.loads(result)["body"]
-        result_event = json.loads(result_json)["event"]
-        future.complete(
-            self.serializer.deserialize_event(base64.b64decode(result_event))
-        )
+        # Any error (e.g. an invalid reply or a signing error) fails the future, otherwise the caller waits forever.
+        try:
+            result_event: Event = await self._invoke_event(event)
+            future.complete(result_event)
+        except httpx.TimeoutException:
+            future.complete_with_failure(timeout_msg)
+            future.is_completed = True
+        except Exception as exc:
+            future.complete_with_failure(f"Request failed: {exc!r}")
+            future.is_completed = True
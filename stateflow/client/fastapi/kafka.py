@@ -11,7 +11,10 @@ from stateflow.client.fastapi.fastapi import (
     EventType,
     T,
 )
-from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+from stateflow.dataflow.address import ReplyAddress
+from stateflow.client.kafka_client import create_topics, NewTopic
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer, TopicPartition
+from typing import Optional
 import asyncio
 import uuid
 import time
@@ -24,7 +27,21 @@ class KafkaFastAPIClient(FastAPIClient):
         serializer: SerDe = PickleSerializer(),
         timeout: int = 5,
         root: str = "stateflow",
+        reply_partition: Optional[int] = None,
+        reply_topic_suffix: Optional[str] = None,
     ):
+        self.brokers: str = "localhost:9092"
+        self.reply_topic: str = "client_reply"
+        self.reply_address: Optional[ReplyAddress] = None
+
+        # A client can register its own reply topic or partition, so it only receives its own replies.
+        if reply_topic_suffix is not None:
+            self.reply_topic = f"{self.reply_topic}_{reply_topic_suffix}"
+            create_topics(self.brokers, [NewTopic(self.reply_topic, 1, 1)])
+            self.reply_address = ReplyAddress(self.reply_topic)
+        elif reply_partition is not None:
+            self.reply_address = ReplyAddress(self.reply_topic, reply_partition)
+
         super().__init__(flow, serializer, timeout, root)
 
         self.producer: AIOKafkaProducer = None
@@ -35,17 +52,32 @@ class KafkaFastAPIClient(FastAPIClient):
 
         @self.app.on_event("startup")
         async def setup_kafka():
-            self.producer = AIOKafkaProducer(bootstrap_servers="localhost:9092")
+            self.producer = AIOKafkaProducer(bootstrap_servers=self.brokers)
             await self.producer.start()
 
-            self.consumer = AIOKafkaConsumer(
-                "client_reply",
-                loop=asyncio.get_event_loop(),
-                bootstrap_servers="localhost:9092",
-                group_id=str(uuid.uuid4()),
-                auto_offset_reset="latest",
-            )
-            await self.consumer.start()
+            if (
+                self.reply_address is not None
+                and self.reply_address.partition is not None
+            ):
+                self.consumer = AIOKafkaConsumer(
+                    loop=asyncio.get_event_loop(),
+                    bootstrap_servers=self.brokers,
+                    auto_offset_reset="latest",
+                )
+                await self.consumer.start()
+                self.consumer.assign(
+                    [TopicPartition(self.reply_topic, self.reply_address.partition)]
+                )
+                await self.consumer.seek_to_end()
+            else:
+                self.consumer = AIOKafkaConsumer(
+                    self.reply_topic,
+                    loop=asyncio.get_event_loop(),
+                    bootstrap_servers=self.brokers,
+                    group_id=str(uuid.uuid4()),
+                    auto_offset_reset="latest",
+                )
+                await self.consumer.start()
             asyncio.create_task(self.consume_forever())
 
         @self.app.on_event("shutdown")
@@ -60,10 +92,23 @@ class KafkaFastAPIClient(FastAPIClient):
         :return:
         """
         async for msg in self.consumer:
-            return_event: Event = self.serializer.deserialize_event(msg.value)
-            if return_event.event_id in self.request_map:
-                self.request_map[return_event.event_id].set_result(return_event)
-                del self.request_map[return_event.event_id]
+            if msg.key is None:
+                # Replies without a key (i.e. from the Flink runtime) have to be decoded to find their id.
+                return_event: Event = self.serializer.deserialize_event(msg.value)
+                key = return_event.event_id
+            else:
+                return_event = None
+                key = msg.key.decode("utf-8")
+
+            # Replies for other clients are discarded by their key, before decoding.
+            if key not in self.request_map:
+                continue
+
+            if return_event is None:
+                return_event = self.serializer.deserialize_event(msg.value)
+
+            self.request_map[key].set_result(return_event)
+            del self.request_map[key]
 
     async def send_and_wait_with_future(
         self,
@@ -71,15 +116,20 @@ class KafkaFastAPIClient(FastAPIClient):
         future: StateflowFuture,
         timeout_msg: str = "Event timed out.",
     ):
-        await self.producer.send_and_wait(
-            "client_request", self.serializer.serialize_event(event)
-        )
+        event.set_reply_address(self.reply_address)
 
+        # We register the future before sending, otherwise a fast reply is discarded as foreign.
         loop = asyncio.get_running_loop()
         asyncio_future = loop.create_future()
 
         self.request_map[event.event_id] = asyncio_future
 
+        await self.producer.send_and_wait(
+            "client_request",
+            self.serializer.serialize_event(event),
+            key=bytes(event.event_id, "utf-8"),
+        )
+
         try:
             result = await asyncio.wait_for(asyncio_future, timeout=self.timeout)
         except asyncio.TimeoutError:
@@ -89,9 +139,7 @@ class KafkaFastAPIClient(FastAPIClient):
             future.complete(result)
 
     async def send(self, event: Event, return_type: T = None):
-        await self.producer.send_and_wait(
-            "client_request", self.serializer.serialize_event(event)
-        )
+        event.set_reply_address(self.reply_address)
         loop = asyncio.get_running_loop()
 
         fut = loop.create_future()
@@ -101,6 +149,12 @@ class KafkaFastAPIClient(FastAPIClient):
 
         self.request_map[event.event_id] = fut
 
+        await self.producer.send_and_wait(
+            "client_request",
+            self.serializer.serialize_event(event),
+            key=bytes(event.event_id, "utf-8"),
+        )
+
         try:
             result = await asyncio.wait_for(fut, timeout=self.timeout)
         except asyncio.TimeoutError:
@@ -1,4 +1,4 @@
-from typing import Generic, TypeVar, Optional
+from typing import Generic, TypeVar, Optional, List
 from stateflow.dataflow.event import FunctionAddress, Event
 import time
 from stateflow.dataflow.event import EventType
@@ -90,14 +90,7 @@ class StateflowFuture(Generic[T]):
     def complete_with_failure(self, msg: str):
         self.result = StateflowFailure(msg)
 
-    def get(self, timeout=-1) -> T:
-        """Gets the return value of this future.
-        If not completed, it will wait until it is.
-
-        NOTE: This might be blocking forever, if the future is never completed.
-
-        :return: the return value.
-        """
+    def _wait(self, timeout=-1):
         timeout_time = time.time() + timeout
         while not self.is_completed:
             if timeout != -1 and time.time() >= timeout_time:
@@ -106,6 +99,7 @@ class StateflowFuture(Generic[T]):
                 )
             time.sleep(0.01)
 
+    def _unpack_result(self):
         if isinstance(self.result, list):
             if (
                 len(self.result) == 1
@@ -116,9 +110,94 @@ class StateflowFuture(Generic[T]):
                     self.result
                 )  # We return lists as tuples, so it can be unpacked.
 
+        return self.result
+
+    def get(self, timeout=-1) -> T:
+        """Gets the return value of this future.
+        If not completed, it will wait until it is.
+
+        NOTE: This might be blocking forever, if the future is never completed.
+
+        :return: the return value.
+        """
+        self._wait(timeout)
+
+        if isinstance(self.result, list):
+            return self._unpack_result()
+
         if isinstance(
             self.result, StateflowFailure
         ):  # If it is an error, we throw a failure.
             raise StateflowFailure(self.result.error_msg)
 
         return self.result
+
+
+class StateflowBatchFuture(StateflowFuture[List[T]]):
+    def __init__(self, id: str, timestamp: float, futures: List[StateflowFuture[T]]):
+        """Initializes a future for a batch of events.
+
+        The batch future is completed either by a single Reply.BatchResult event,
+        or by the replies of the individual events in the batch (in any order).
+
+        :param id: the id of this batch.
+        :param timestamp: the timestamp for this future.
+        :param futures: the futures of the individual events, in the order of the batch.
+        """
+        super().__init__(id, timestamp, None, None)
+        self.futures: List[StateflowFuture[T]] = futures
+        self._futures_by_id = {fut.id: fut for fut in futures}
+        self._remaining: int = len(futures)
+
+        # The ids of the batch events this future is waiting for.
+        self.batch_ids: List[str] = []
+
+        if self._remaining == 0:
+            self.is_completed = True
+            self.result = []
+
+    def complete(self, event: Event):
+        """Completes (a part of) the batch given a 'reply' event.
+
+        :param event: either a Reply.BatchResult or the reply of a single event in the batch.
+        """
+        for sub_event in event.unpack():
+            future: Optional[StateflowFuture] = self._futures_by_id.get(
+                sub_event.event_id
+            )
+
+            if future is None or future.is_completed:
+                continue
+
+            future.complete(sub_event)
+            self._remaining -= 1
+
+        if self._remaining == 0:
+            self.result = [fut._unpack_result() for fut in self.futures]
+            self.is_completed = True
+
+    def ids(self) -> List[str]:
+        """Returns all ids this future can be completed by, i.e. the ids of the batches and the individual events.
+
+        :return: the list of ids.
+        """
+        return self.batch_ids + list(self._futures_by_id.keys())
+
+    def complete_with_failure(self, msg: str):
+        for future in self.futures:
+            if not future.is_completed:
+                future.complete_with_failure(msg)
+                future.is_completed = True
+
+        self.result = [fut._unpack_result() for fut in self.futures]
+        self.is_completed = True
+
+    def get(self, timeout=-1) -> List[T]:
+        """Gets the return values of all events in this batch, in the order of the batch.
+
+        Failed events do not raise, instead their StateflowFailure is part of the returned list.
+
+        :return: the list of return values.
+        """
+        self._wait(timeout)
+        return self.result
@@ -2,17 +2,34 @@ from stateflow.client.stateflow_client import StateflowClient, SerDe
 from stateflow.serialization.pickle_serializer import PickleSerializer
 from stateflow.dataflow.dataflow import Dataflow, IngressRouter
 from stateflow.dataflow.event import Event, FunctionAddress, EventType
-from stateflow.dataflow.address import FunctionType
-from stateflow.client.future import StateflowFuture, T
-from typing import Optional, Any, Dict
+from stateflow.dataflow.address import FunctionType, ReplyAddress
+from stateflow.client.future import StateflowFuture, StateflowBatchFuture, T
+from typing import Optional, Any, Dict, List, Hashable
 import threading
+import zlib
 
 import uuid
-from confluent_kafka import Producer, Consumer
+from confluent_kafka import Producer, Consumer, TopicPartition, OFFSET_END
 from confluent_kafka.admin import AdminClient, NewTopic
 import time
 
 
+def create_topics(brokers: str, topics_to_create: List[NewTopic]):
+    """Creates Kafka topics, a topic which already exists is skipped.
+
+    :param brokers: the Kafka brokers.
+    :param topics_to_create: the topics to create.
+    """
+    admin = AdminClient({"bootstrap.servers": brokers})
+
+    for topic, f in admin.create_topics(topics_to_create).items():
+        try:
+            f.result()  # The result itself is None
+            print("Topic {} created".format(topic))
+        except Exception as e:
+            print("Failed to create topic {}: {}".format(topic, e))
+
+
 class StateflowKafkaClient(StateflowClient):
     def __init__(
         self,
@@ -20,7 +37,23 @@ class StateflowKafkaClient(StateflowClient):
         brokers: str,
         serializer: SerDe = PickleSerializer(),
         statefun_mode: bool = False,
+        reply_partition: Optional[int] = None,
+        reply_topic_suffix: Optional[str] = None,
     ):
+        """Initializes a Kafka client.
+
+        By default, all clients share (and consume) all partitions of the reply topic.
+        A client can instead register its own reply partition or reply topic; the runtimes then only route
+        its replies there. Statefun can't produce to a specific partition, so it requires a reply topic suffix.
+        The Flink runtime does not support per-client reply routing yet.
+
+        :param flow: the dataflow.
+        :param brokers: the Kafka brokers.
+        :param serializer: the serializer for events.
+        :param statefun_mode: if True, events are sent directly to the topics of the stateful functions.
+        :param reply_partition: the partition of the reply topic this client receives its replies on.
+        :param reply_topic_suffix: the suffix of the reply topic this client receives its replies on.
+        """
         super().__init__(flow, serializer)
         self.brokers = brokers
 
@@ -35,6 +68,16 @@ class StateflowKafkaClient(StateflowClient):
         # Topics are hardcoded now, should be configurable later on.
         self.req_topic = "client_request"
         self.reply_topic = "client_reply"
+        self.request_partitions: Optional[int] = None
+
+        if statefun_mode and reply_partition is not None:
+            raise AttributeError(
+                "Statefun can't route replies to a partition, use a reply topic suffix instead."
+            )
+
+        self.reply_address: Optional[ReplyAddress] = self._register_reply_address(
+            reply_partition, reply_topic_suffix
+        )
 
         self.ingress_router = IngressRouter(self.serializer)
 
@@ -62,8 +105,29 @@ class StateflowKafkaClient(StateflowClient):
             }
         )
 
+    def _register_reply_address(
+        self, reply_partition: Optional[int], reply_topic_suffix: Optional[str]
+    ) -> Optional[ReplyAddress]:
+        if reply_topic_suffix is not None:
+            self.reply_topic = f"{self.reply_topic}_{reply_topic_suffix}"
+            self._create_topics([NewTopic(self.reply_topic, 1, 1)])
+            return ReplyAddress(self.reply_topic)
+        elif reply_partition is not None:
+            return ReplyAddress(self.reply_topic, reply_partition)
+
+        return None
+
     def start_consuming(self):
-        self.consumer.subscribe([self.reply_topic])
+        if self.reply_address is not None and self.reply_address.partition is not None:
+            self.consumer.assign(
+                [
+                    TopicPartition(
+                        self.reply_topic, self.reply_address.partition, OFFSET_END
+                    )
+                ]
+            )
+        else:
+            self.consumer.subscribe([self.reply_topic])
 
         while self.running:
             msg = self.consumer.poll(0.01)
@@ -74,23 +138,63 @@ class StateflowKafkaClient(StateflowClient):
                 continue
 
             if msg.key() is None:
+                # Replies without a key (i.e. from the Flink runtime) have to be decoded to find their id.
                 event = self.serializer.deserialize_event(msg.value())
                 key = event.event_id
             else:
                 event = None
                 key = msg.key().decode("utf-8")
 
+            # Replies for other clients are discarded by their key, before decoding.
+            if key not in self.futures:
+                continue
+
             print(f"{key} -> Received message")
-            if key in self.futures.keys():
-                if not event:
-                    event = self.serializer.deserialize_event(msg.value())
-                self.futures[key].complete(event)
-                del self.futures[key]
+            if not event:
+                event = self.serializer.deserialize_event(msg.value())
+            self._complete_future(key, event)
 
             # print(self.futures.keys())
             # print("Received message: {}".format(msg.value().decode("utf-8")))
 
+    def _complete_future(self, key: str, event: Event):
+        future: StateflowFuture = self.futures.pop(key)
+        future.complete(event)
+
+        # A batch future is registered under multiple ids, we clean them all up once it completes.
+        if isinstance(future, StateflowBatchFuture) and future.is_completed:
+            for future_id in future.ids():
+                self.futures.pop(future_id, None)
+
+    def _statefun_topic_and_key(self, event: Event):
+        route = self.ingress_router.route(event)
+        topic = route.route_name.replace("/", "_")
+        key = route.key or event.event_id
+
+        if not route.key:
+            topic = topic + "_create"
+
+        return topic, key
+
+    def _request_partitions(self) -> int:
+        if self.request_partitions is None:
+            metadata = self.producer.list_topics(self.req_topic, timeout=5)
+            self.request_partitions = max(
+                len(metadata.topics[self.req_topic].partitions), 1
+            )
+
+        return self.request_partitions
+
     def send(self, event: Event, return_type: T = None):
+        event.set_reply_address(self.reply_address)
+
+        # We register the future before sending, otherwise a fast reply is discarded as foreign.
+        future = StateflowFuture(
+            event.event_id, time.time(), event.fun_address, return_type
+        )
+
+        self.futures[event.event_id] = future
+
         if not self.statefun_mode:
             self.producer.produce(
                 self.req_topic,
@@ -98,12 +202,7 @@ class StateflowKafkaClient(StateflowClient):
                 key=bytes(event.event_id, "utf-8"),
             )
         else:
-            route = self.ingress_router.route(event)
-            topic = route.route_name.replace("/", "_")
-            key = route.key or event.event_id
-
-            if not route.key:
-                topic = topic + "_create"
+            topic, key = self._statefun_topic_and_key(event)
             print(f"Sending to {topic} with key {key}")
 
             self.producer.produce(
@@ -112,14 +211,56 @@ class StateflowKafkaClient(StateflowClient):
                 key=key,
             )
 
-        future = StateflowFuture(
-            event.event_id, time.time(), event.fun_address, return_type
-        )
+        self.producer.flush()
+        # print(f"{event.event_id} -> Send message")
+        return future
 
-        self.futures[event.event_id] = future
+    def _batch_group(self, event: Event) -> Hashable:
+        """Groups events of a batch by the partition (or statefun topic) they are sent to.
+
+        In statefun mode, a batch is delivered to a single function, which forwards
+        the events that are addressed to other instances.
+
+        :param event: the event to group.
+        :return: the target topic (statefun mode) or the target partition.
+        """
+        if self.statefun_mode:
+            return self._statefun_topic_and_key(event)[0]
+
+        key: str = event.fun_address.key or event.event_id
+        return zlib.crc32(bytes(key, "utf-8")) % self._request_partitions()
+
+    def _send_batch_event(self, batch: Event, future: StateflowBatchFuture):
+        batch.set_reply_address(self.reply_address)
+
+        self.futures[batch.event_id] = future
+        for sub_event in batch.unpack():
+            self.futures[sub_event.event_id] = future
+
+        # The partition (or key) is computed before serializing, as serializing may modify the event in place.
+        if not self.statefun_mode:
+            partition: int = self._batch_group(batch.unpack()[0])
+            self.producer.produce(
+                self.req_topic,
+                value=self.serializer.serialize_event(batch),
+                key=bytes(batch.event_id, "utf-8"),
+                partition=partition,
+            )
+        else:
+            topic, key = self._statefun_topic_and_key(batch)
+            self.producer.produce(
+                topic,
+                value=self.serializer.serialize_event(batch),
+                key=key,
+            )
+
+        self.producer.poll(0)
 
+    def send_batch(
+        self, events: List[Event], return_type: T = None, batch_size: int = 1000
+    ) -> StateflowBatchFuture[T]:
+        future = super().send_batch(events, return_type, batch_size)
         self.producer.flush()
-        # print(f"{event.event_id} -> Send message")
         return future
 
     def find(self, clasz, key: str) -> StateflowFuture[Optional[Any]]:
@@ -130,9 +271,10 @@ class StateflowKafkaClient(StateflowClient):
 
         return self.send(Event(event_id, fun_address, event_type, payload), clasz)
 
-    def create_all_topics(self):
-        admin = AdminClient({"bootstrap.servers": self.brokers})
+    def _create_topics(self, topics_to_create: List[NewTopic]):
+        create_topics(self.brokers, topics_to_create)
 
+    def create_all_topics(self, reply_partitions: int = 1):
         topics_to_create = [
             NewTopic("globals_ping", num_partitions=1, replication_factor=1)
         ]
@@ -152,15 +294,12 @@ class StateflowKafkaClient(StateflowClient):
                 )
             )
         topics_to_create.append(
-            NewTopic("client_reply", num_partitions=1, replication_factor=1)
+            NewTopic(
+                "client_reply", num_partitions=reply_partitions, replication_factor=1
+            )
         )
 
-        for topic, f in admin.create_topics(topics_to_create).items():
-            try:
-                f.result()  # The result itself is None
-                print("Topic {} created".format(topic))
-            except Exception as e:
-                print("Failed to create topic {}: {}".format(topic, e))
+        self._create_topics(topics_to_create)
 
     def _send_ping(self) -> StateflowFuture:
         event = Event(
@@ -168,19 +307,19 @@ class StateflowKafkaClient(StateflowClient):
             FunctionAddress(FunctionType("", "", False), None),
             EventType.Request.Ping,
             {},
+            self.reply_address,
         )
 
         topic = self.req_topic if not self.statefun_mode else "globals_ping"
 
+        future = StateflowFuture(event.event_id, time.time(), event.fun_address, None)
+        self.futures[event.event_id] = future
+
         self.producer.produce(
             topic,
             value=self.serializer.serialize_event(event),
             key=bytes(event.event_id, "utf-8"),
         )
-
-        future = StateflowFuture(event.event_id, time.time(), event.fun_address, None)
-
-        self.futures[event.event_id] = future
         self.producer.flush()
 
         return future
@@ -1,9 +1,12 @@
-from typing import Optional, Any, List
-from stateflow.client.future import StateflowFuture, T
+from typing import Optional, Any, List, Dict, Union, Tuple, Hashable
+from stateflow.client.future import StateflowFuture, StateflowBatchFuture, T
 from stateflow.serialization.json_serde import SerDe, JsonSerializer
 from stateflow.dataflow.event import Event, EventType
 from stateflow.dataflow.address import FunctionAddress, FunctionType
+from stateflow.dataflow.args import Arguments
 import uuid
+import time
+import copy
 
 
 class StateflowClient:
@@ -28,3 +31,155 @@ class StateflowClient:
         waiting_for = [fut for fut in future_list if not fut.is_completed]
         while len(waiting_for):
             waiting_for = [fut for fut in future_list if not fut.is_completed]
+
+    def bulk_create(
+        self, clasz, rows: List[Union[Dict[str, Any], Tuple]], batch_size: int = 1000
+    ) -> StateflowBatchFuture:
+        """Creates many instances of a class at once.
+
+        Each row is either a tuple of positional arguments or a dict of keyword arguments for `__init__`.
+        The result of the returned future is a list of class references (or failures), in the order of the rows.
+
+        :param clasz: the (stateflow) class to create instances of.
+        :param rows: the constructor arguments per instance.
+        :param batch_size: the maximum amount of events packed in a single batch.
+        :return: a batch future.
+        """
+        fun_type: FunctionType = FunctionType.create(clasz.descriptor)
+        init_desc = clasz.descriptor.get_method_by_name("__init__").input_desc.get()
+
+        events: List[Event] = []
+        for row in rows:
+            if isinstance(row, dict):
+                args = Arguments.from_args_and_kwargs(init_desc, **row)
+            else:
+                args = Arguments.from_args_and_kwargs(init_desc, *row)
+
+            events.append(
+                Event(
+                    str(uuid.uuid4()),
+                    FunctionAddress(fun_type, None),
+                    EventType.Request.InitClass,
+                    {"args": args},
+                )
+            )
+
+        return self.send_batch(events, clasz, batch_size)
+
+    def bulk_find(
+        self, clasz, keys: List[str], batch_size: int = 1000
+    ) -> StateflowBatchFuture:
+        """Finds many instances of a class at once.
+
+        :param clasz: the (stateflow) class to find instances of.
+        :param keys: the keys of the instances.
+        :param batch_size: the maximum amount of events packed in a single batch.
+        :return: a batch future, with a class reference (or failure) per key.
+        """
+        fun_type: FunctionType = FunctionType.create(clasz.descriptor)
+        events: List[Event] = [
+            Event(
+                str(uuid.uuid4()),
+                FunctionAddress(fun_type, key),
+                EventType.Request.FindClass,
+                {},
+            )
+            for key in keys
+        ]
+
+        return self.send_batch(events, clasz, batch_size)
+
+    def bulk_invoke(
+        self,
+        refs: List,
+        method_name: str,
+        args: List[Union[Dict[str, Any], Tuple]],
+        batch_size: int = 1000,
+    ) -> StateflowBatchFuture:
+        """Invokes the same method on many instances at once.
+
+        :param refs: the class references to invoke the method on.
+        :param method_name: the name of the method.
+        :param args: the arguments per reference, either a tuple of positional arguments or a dict of kwargs.
+        :param batch_size: the maximum amount of events packed in a single batch.
+        :return: a batch future, with the return value (or failure) per reference.
+        """
+        if len(refs) != len(args):
+            raise AttributeError(
+                f"Expected arguments for each of the {len(refs)} references, but got {len(args)}."
+            )
+
+        events: List[Event] = []
+        for ref, ref_args in zip(refs, args):
+            method_desc = ref._methods[method_name]
+            input_desc = method_desc.input_desc.get()
+
+            if isinstance(ref_args, dict):
+                arguments = Arguments.from_args_and_kwargs(input_desc, **ref_args)
+            else:
+                arguments = Arguments.from_args_and_kwargs(input_desc, *ref_args)
+
+            if method_desc.is_splitted_function():
+                events.append(
+                    ref._prepare_flow(copy.deepcopy(method_desc.flow_list), arguments)
+                )
+            else:
+                events.append(
+                    ref._prepare_invoke_method_event(method_name, arguments)
+                )
+
+        return self.send_batch(events, None, batch_size)
+
+    def _batch_group(self, event: Event) -> Hashable:
+        """Computes the group of an event in a batch. Only events of the same group are packed together.
+        Clients can override this, e.g. to group events by their target partition.
+
+        :param event: the event to group.
+        :return: the group of this event.
+        """
+        return None
+
+    def _batch_address(self, group: Hashable, events: List[Event]) -> FunctionAddress:
+        """Computes the address of a batch, by default the address of the first event in the batch.
+
+        :param group: the group of the batch.
+        :param events: the events in the batch.
+        :return: the address of the batch.
+        """
+        return events[0].fun_address
+
+    def send_batch(
+        self, events: List[Event], return_type: T = None, batch_size: int = 1000
+    ) -> StateflowBatchFuture[T]:
+        """Packs events in batches (per group) and sends them to the runtime.
+
+        :param events: the events to send.
+        :param return_type: the return type of each of the events.
+        :param batch_size: the maximum amount of events packed in a single batch.
+        :return: a batch future, which completes once all events are replied to.
+        """
+        futures: List[StateflowFuture[T]] = [
+            StateflowFuture(event.event_id, time.time(), event.fun_address, return_type)
+            for event in events
+        ]
+        batch_future: StateflowBatchFuture[T] = StateflowBatchFuture(
+            str(uuid.uuid4()), time.time(), futures
+        )
+
+        groups: Dict[Hashable, List[Event]] = {}
+        for event in events:
+            groups.setdefault(self._batch_group(event), []).append(event)
+
+        for group, group_events in groups.items():
+            for i in range(0, len(group_events), batch_size):
+                batch = group_events[i : i + batch_size]
+                batch_event: Event = Event.pack(
+                    str(uuid.uuid4()), self._batch_address(group, batch), batch
+                )
+                batch_future.batch_ids.append(batch_event.event_id)
+                self._send_batch_event(batch_event, batch_future)
+
+        return batch_future
+
+    def _send_batch_event(self, batch: Event, future: StateflowBatchFuture):
+        raise NotImplementedError("Needs to be implemented by subclass.")
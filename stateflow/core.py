@@ -1,20 +1,21 @@
 from inspect import isclass, getsource, getfile
-import libcst as cst
-from typing import List, Dict
+from typing import List, Dict, Tuple, TYPE_CHECKING
 from stateflow.wrappers.class_wrapper import ClassWrapper
 from stateflow.wrappers.meta_wrapper import MetaWrapper
 from stateflow.dataflow.dataflow import Dataflow, Ingress, Egress
 from stateflow.dataflow.stateful_operator import StatefulOperator, Edge, Operator
 from stateflow.dataflow.event import EventType
 from stateflow.dataflow.address import FunctionType
-from stateflow.analysis.extract_class_descriptor import (
-    ExtractClassDescriptor,
-    ClassDescriptor,
-)
-from stateflow.split.split_analyze import Split
+from stateflow.descriptors.class_descriptor import ClassDescriptor
 import textwrap
+from types import MappingProxyType
+import pickle
 
-parse_cache: Dict[str, cst.Module] = {}
+# The analysis (libcst) is imported lazily, so that a dataflow can be loaded from a snapshot without it.
+if TYPE_CHECKING:
+    import libcst as cst
+
+parse_cache: Dict[str, "cst.Module"] = {}
 
 registered_classes: List[ClassWrapper] = []
 meta_classes: List = []
@@ -24,6 +25,9 @@ def stateflow(cls, parse_file=True):
     if not isclass(cls):
         raise AttributeError(f"Expected a class but got an {cls}.")
 
+    import libcst as cst
+    from stateflow.analysis.extract_class_descriptor import ExtractClassDescriptor
+
     # Parse source.
     if parse_file:
         class_file_name = getfile(cls)
@@ -118,6 +122,8 @@ def init():
         desc.link_to_other_classes(class_descs)
 
     # We execute the split phase
+    from stateflow.split.split_analyze import Split
+
     split: Split = Split(class_descs, registered_classes)
     split.split_methods()
 
@@ -139,3 +145,86 @@ def clear():
     parse_cache.clear()
     registered_classes.clear()
     meta_classes.clear()
+
+
+# The version of the snapshot format, snapshots of another version can't be loaded.
+SNAPSHOT_VERSION: int = 1
+
+# Objects of these modules are only needed to analyze classes, they are not part of a snapshot.
+_ANALYSIS_MODULES: Tuple[str, ...] = ("libcst", "stateflow.analysis", "stateflow.split")
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        # Metadata of libcst (i.e. the expression provider of a class) is a mappingproxy.
+        if type(obj).__module__.startswith(_ANALYSIS_MODULES) or isinstance(
+            obj, MappingProxyType
+        ):
+            return "analysis"
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return None
+
+
+def _class_source(wrapper: ClassWrapper) -> str:
+    # Split classes are already recompiled to source, other classes are compiled from their (parsed) module.
+    if isinstance(wrapper.cls, str):
+        return wrapper.cls
+
+    from stateflow.split.split_transform import RemoveAfterClassDefinition
+
+    class_desc: ClassDescriptor = wrapper.class_desc
+    return class_desc.module_node.visit(
+        RemoveAfterClassDefinition(class_desc.class_name)
+    ).code
+
+
+def save_snapshot(flow: Dataflow, path: str):
+    """Saves an analyzed dataflow as a snapshot, which can be loaded without analyzing the classes again.
+
+    A snapshot contains the source (including split methods) and descriptor (including flows) of each class.
+    Syntax trees and other analysis artifacts are left out.
+    For example, a build step runs `stateflow.save_snapshot(stateflow.init(), "dataflow.snapshot")`.
+
+    :param flow: the dataflow, as returned by init().
+    :param path: the file to save the snapshot to.
+    """
+    classes: List[Tuple[str, ClassDescriptor]] = [
+        (_class_source(operator.class_wrapper), operator.class_wrapper.class_desc)
+        for operator in flow.operators
+    ]
+
+    with open(path, "wb") as file:
+        _SnapshotPickler(file, protocol=pickle.HIGHEST_PROTOCOL).dump(
+            {"version": SNAPSHOT_VERSION, "classes": classes}
+        )
+
+
+def load_snapshot(path: str) -> Dataflow:
+    """Loads a dataflow from a snapshot, instead of registering and analyzing classes with init().
+    Neither the module of the classes nor libcst is imported, which reduces the (cold) start time of a runtime.
+
+    :param path: the file of the snapshot.
+    :return: the dataflow.
+    """
+    with open(path, "rb") as file:
+        snapshot = _SnapshotUnpickler(file).load()
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise AttributeError(
+            f"Can't load snapshot {path} of version {snapshot.get('version')}, "
+            f"expected version {SNAPSHOT_VERSION}."
+        )
+
+    wrappers: List[ClassWrapper] = []
+    meta_classes: List[MetaWrapper] = []
+    for source, class_desc in snapshot["classes"]:
+        wrappers.append(ClassWrapper(source, class_desc))
+        meta_classes.append(
+            MetaWrapper(class_desc.class_name, (), {}, descriptor=class_desc)
+        )
+
+    return _build_dataflow(wrappers, meta_classes)
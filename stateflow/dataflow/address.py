@@ -93,3 +93,33 @@ class FunctionAddress:
             return False
 
         return self.key == other.key and self.function_type == other.function_type
+
+
+class ReplyAddress:
+    """The address a client receives its replies on.
+
+    Consists of two parts:
+    - a topic: the topic (or stream) the reply is sent to.
+    - a partition: an optional partition of this topic, if None the reply is partitioned by its key.
+
+    Clients set this address on outgoing events, so that a runtime only routes a reply to the client that sent it.
+    """
+
+    __slots__ = "topic", "partition"
+
+    def __init__(self, topic: str, partition: Optional[int] = None):
+        self.topic = topic
+        self.partition = partition
+
+    def to_dict(self) -> Dict:
+        return {"topic": self.topic, "partition": self.partition}
+
+    @staticmethod
+    def from_dict(dictionary: Dict) -> "ReplyAddress":
+        return ReplyAddress(dictionary["topic"], dictionary["partition"])
+
+    def __eq__(self, other):
+        if not isinstance(other, ReplyAddress):
+            return False
+
+        return self.topic == other.topic and self.partition == other.partition
@@ -1,7 +1,7 @@
 from typing import List, Optional, ByteString, Union
 from stateflow.dataflow.event import EventType, Event
 from stateflow.dataflow.event_flow import EventFlowGraph, EventFlowNode
-from stateflow.dataflow.address import FunctionType
+from stateflow.dataflow.address import FunctionType, ReplyAddress
 from stateflow.descriptors.class_descriptor import ClassDescriptor
 from stateflow.serialization.serde import SerDe
 from enum import Enum
@@ -44,6 +44,7 @@ class Route:
     route_name: str
     key: str
     value: Union[Event, ByteString]
+    reply_to: Optional[ReplyAddress] = None
 
 
 class EgressRouter:
@@ -62,15 +63,11 @@ class EgressRouter:
                     event_type=EventType.Reply.SuccessfulInvocation,
                     payload={"return_results": current_node.get_results()},
                 )
+                reply_to = event.reply_to
                 if self.serialize_on_return:
                     event = self.serialize(event)
 
-                return Route(
-                    RouteDirection.CLIENT,
-                    "",
-                    event_id,
-                    event,
-                )
+                return Route(RouteDirection.CLIENT, "", event_id, event, reply_to)
             else:
                 event_id = event.event_id
                 for next_node_id in current_node.next:
@@ -110,15 +107,11 @@ class EgressRouter:
             return self._route_event_flow(event)
         elif isinstance(event.event_type, EventType.Reply):
             event_id = event.event_id
+            reply_to = event.reply_to
             if self.serialize_on_return:
                 event = self.serialize(event)
 
-            return Route(
-                RouteDirection.CLIENT,
-                "",
-                event_id,
-                event,
-            )
+            return Route(RouteDirection.CLIENT, "", event_id, event, reply_to)
         else:
             raise AttributeError(
                 f"Unknown event type {event.event_type}.\nFull event: {self.serialize(event)}."
@@ -206,6 +199,16 @@ class IngressRouter:
         event: Event = self.parse(value)
         return self.route(event)
 
+    def parse_and_route_all(self, value: ByteString) -> List[Route]:
+        """Parses and routes an incoming event. If the event is a batch, it is unpacked
+        and all events in the batch are routed individually.
+
+        :param value: the serialized event.
+        :return: the list of routes.
+        """
+        event: Event = self.parse(value)
+        return [self.route(sub_event) for sub_event in event.unpack()]
+
 
 class Ingress(Edge):
     def __init__(self, name: str, to_operator: "Operator", event_type: EventType):
@@ -1,6 +1,6 @@
 from typing import List, Optional, Dict, Tuple, Any
 from enum import Enum, EnumMeta
-from stateflow.dataflow.address import FunctionAddress
+from stateflow.dataflow.address import FunctionAddress, ReplyAddress
 
 
 class MetaEnum(EnumMeta):
@@ -26,6 +26,8 @@ class _Request(Enum, metaclass=MetaEnum):
 
     EventFlow = "EventFlow"
 
+    Batch = "Batch"
+
     Ping = "Ping"
 
     def __str__(self):
@@ -42,6 +44,8 @@ class _Reply(Enum, metaclass=MetaEnum):
     SuccessfulStateRequest = "SuccessfulStateRequest"
     FailedInvocation = "FailedInvocation"
 
+    BatchResult = "BatchResult"
+
     Pong = "Pong"
 
     def __str__(self):
@@ -65,7 +69,7 @@ class EventType:
 class Event:
     from stateflow.dataflow.args import Arguments
 
-    __slots__ = "event_id", "fun_address", "event_type", "payload"
+    __slots__ = "event_id", "fun_address", "event_type", "payload", "reply_to"
 
     def __init__(
         self,
@@ -73,11 +77,13 @@ class Event:
         fun_address: FunctionAddress,
         event_type: EventType,
         payload: Dict,
+        reply_to: Optional[ReplyAddress] = None,
     ):
         self.event_id: str = event_id
         self.fun_address: FunctionAddress = fun_address
         self.event_type: EventType = event_type
         self.payload: Dict = payload
+        self.reply_to: Optional[ReplyAddress] = reply_to
 
     def get_arguments(self) -> Optional[Arguments]:
         if "args" in self.payload:
@@ -85,6 +91,49 @@ class Event:
         else:
             return None
 
+    def is_batch(self) -> bool:
+        return self.event_type in (EventType.Request.Batch, EventType.Reply.BatchResult)
+
+    def unpack(self) -> List["Event"]:
+        """Returns the events packed in this (batch) event.
+        If this is not a batch, a singleton list with this event is returned.
+
+        :return: the list of (sub)events.
+        """
+        if self.is_batch():
+            return self.payload["events"]
+        return [self]
+
+    @staticmethod
+    def pack(
+        event_id: str,
+        fun_address: FunctionAddress,
+        events: List["Event"],
+        reply: bool = False,
+        reply_to: Optional[ReplyAddress] = None,
+    ) -> "Event":
+        """Packs multiple events into a single batch event.
+
+        :param event_id: the id of the batch event.
+        :param fun_address: the address of the batch, used to route the batch as a whole.
+        :param events: the events to pack.
+        :param reply: if True, a Reply.BatchResult is created instead of a Request.Batch.
+        :param reply_to: the address the (batched) reply is sent to.
+        :return: the batch event.
+        """
+        event_type = EventType.Reply.BatchResult if reply else EventType.Request.Batch
+        return Event(event_id, fun_address, event_type, {"events": events}, reply_to)
+
+    def set_reply_address(self, reply_to: Optional[ReplyAddress]):
+        """Sets the reply address of this event and (if it is a batch) all events in it.
+
+        :param reply_to: the address to reply to.
+        """
+        self.reply_to = reply_to
+        if self.is_batch():
+            for sub_event in self.payload["events"]:
+                sub_event.reply_to = reply_to
+
     def copy(self, **kwargs) -> "Event":
         new_args = {}
         for key, value in kwargs.items():
@@ -12,7 +12,7 @@ from stateflow.wrappers.class_wrapper import (
     FailedInvocation,
 )
 from stateflow.wrappers.meta_wrapper import MetaWrapper
-from typing import NewType, List, Tuple, Optional
+from typing import NewType, List, Tuple, Optional, Union
 from stateflow.serialization.pickle_serializer import SerDe, PickleSerializer
 
 NoType = NewType("NoType", None)
@@ -101,15 +101,7 @@ class StatefulOperator(Operator):
         if state:  # If state exists, we can deserialize it.
             state = State(self.serializer.deserialize_dict(state))
         else:  # If state does not exists we can't execute these methods, so we return a KeyNotFound reply.
-            return (
-                event.copy(
-                    event_type=EventType.Reply.KeyNotFound,
-                    payload={
-                        "error_message": f"Stateful instance with key={event.fun_address.key} does not exist."
-                    },
-                ),
-                state,
-            )
+            return self._key_not_found(event), state
 
         # We dispatch the event to find the correct execution method.
         return_event, updated_state = self._dispatch_event(
@@ -121,8 +113,37 @@ class StatefulOperator(Operator):
 
         return return_event, updated_state
 
-    def _handle_create_with_state(
+    def handle_state(
         self, event: Event, state: Optional[State]
+    ) -> Tuple[Event, Optional[State]]:
+        """Handles incoming event and current (deserialized) state.
+
+        This is equal to `handle`, except that state is not (de)serialized.
+        Runtimes that keep state deserialized (e.g. cached across events) use this method.
+
+        :param event: the incoming event.
+        :param state: the incoming state. If this is None, we assume this 'key' does not exist.
+        :return: a tuple of outgoing event + updated state.
+        """
+        if event.event_type == EventType.Request.InitClass:
+            return_event, created_state = self._handle_create(event, state)
+            return return_event, created_state if created_state else state
+
+        if not state:
+            return self._key_not_found(event), state
+
+        return self._dispatch_event(event.event_type, event, state)
+
+    def _key_not_found(self, event: Event) -> Event:
+        return event.copy(
+            event_type=EventType.Reply.KeyNotFound,
+            payload={
+                "error_message": f"Stateful instance with key={event.fun_address.key} does not exist."
+            },
+        )
+
+    def _handle_create_with_state(
+        self, event: Event, state: Optional[bytes]
     ) -> Tuple[Event, bytes]:
         """Will 'create' this instance, by verifying if the state exists already.
 
@@ -134,6 +155,21 @@ class StatefulOperator(Operator):
         :param state: the current state (in bytes), might be None.
         :return: the outgoing event and (updated) state.
         """
+        return_event, created_state = self._handle_create(event, state)
+        if created_state is None:
+            return return_event, state
+
+        return return_event, self.serializer.serialize_dict(created_state.get())
+
+    def _handle_create(
+        self, event: Event, state: Optional[Union[bytes, State]]
+    ) -> Tuple[Event, Optional[State]]:
+        """Creates the state of this instance from an InitClass event, unless its state exists already.
+
+        :param event: the incoming InitClass event.
+        :param state: the current state (in bytes or deserialized), might be None.
+        :return: the outgoing event and the created state (None, if the instance already exists).
+        """
         if (
             state
         ):  # In this case, we already created a class before, so we will return an error.
@@ -145,17 +181,14 @@ class StatefulOperator(Operator):
                         f"with key={event.fun_address.key} already exists."
                     },
                 ),
-                state,
+                None,
             )
 
         return_event = event.copy(
             event_type=EventType.Reply.SuccessfulCreateClass,
             payload={"key": f"{event.fun_address.key}"},
         )
-        new_state = event.payload["init_class_state"]
-        updated_state = State(new_state)
-
-        return return_event, self.serializer.serialize_dict(updated_state.get())
+        return return_event, State(event.payload["init_class_state"])
 
     def _handle_get_state(self, event: Event, state: State) -> Tuple[Event, State]:
         """Gets a field/attribute of the current state.
@@ -1,8 +1,11 @@
 from stateflow.dataflow.state import StateDescriptor
-from typing import List, Optional
+from typing import List, Optional, TYPE_CHECKING
 from stateflow.descriptors.method_descriptor import MethodDescriptor
 from stateflow.dataflow.address import FunctionType
-import libcst as cst
+
+# libcst is only needed to analyze classes, not to execute an (analyzed) dataflow.
+if TYPE_CHECKING:
+    import libcst as cst
 
 
 class ClassDescriptor:
@@ -11,15 +14,15 @@ class ClassDescriptor:
     def __init__(
         self,
         class_name: str,
-        module_node: cst.Module,
-        class_node: cst.ClassDef,
+        module_node: "cst.Module",
+        class_node: "cst.ClassDef",
         state_desc: StateDescriptor,
         methods_dec: List[MethodDescriptor],
         expression_provider,
     ):
         self.class_name: str = class_name
-        self.module_node: cst.Module = module_node
-        self.class_node: cst.ClassDef = class_node
+        self.module_node: "cst.Module" = module_node
+        self.class_node: "cst.ClassDef" = class_node
         self.state_desc: StateDescriptor = state_desc
         self.methods_dec: List[MethodDescriptor] = methods_dec
         self.expression_provider = expression_provider
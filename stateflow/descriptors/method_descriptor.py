@@ -1,6 +1,8 @@
-from typing import Dict, Any, List, Set, Tuple
+from typing import Dict, Any, List, Set, Tuple, TYPE_CHECKING
 
-import libcst as cst
+# libcst is only needed to analyze classes, not to execute an (analyzed) dataflow.
+if TYPE_CHECKING:
+    import libcst as cst
 
 from stateflow.dataflow.args import Arguments
 import re
@@ -13,7 +15,7 @@ class MethodDescriptor:
         self,
         method_name: str,
         read_only: bool,
-        method_node: cst.FunctionDef,
+        method_node: "cst.FunctionDef",
         input_desc: "InputDescriptor",
         output_desc: "OutputDescriptor",
         external_attributes: Set[str],
@@ -22,7 +24,7 @@ class MethodDescriptor:
     ):
         self.method_name: str = method_name
         self.read_only: bool = read_only
-        self.method_node: cst.FunctionDef = method_node
+        self.method_node: "cst.FunctionDef" = method_node
         self.input_desc: "InputDescriptor" = input_desc
         self.output_desc: "OutputDescriptor" = output_desc
 
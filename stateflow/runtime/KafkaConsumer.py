@@ -1,21 +1,23 @@
 from __future__ import division, print_function
 
-from apache_beam import PTransform, ParDo, DoFn, Create, combiners, RestrictionProvider
-from typing import Tuple, ByteString
-from apache_beam.transforms.userstate import (
-    TimerSpec,
-    TimeDomain,
-    on_timer,
-    BagStateSpec,
-    CombiningValueStateSpec,
-    ReadModifyWriteStateSpec,
+from apache_beam import (
+    PTransform,
+    ParDo,
+    DoFn,
+    Create,
+    Reshuffle,
+    combiners,
+    RestrictionProvider,
 )
+from typing import Tuple, ByteString, Dict, Any, List, Optional
+from apache_beam.transforms.userstate import on_timer, BagStateSpec
+import functools
+import sys
 import time
-from apache_beam.io.restriction_trackers import OffsetRange
-from apache_beam.coders import VarIntCoder, TupleCoder, StrUtf8Coder, BytesCoder
+from apache_beam.io.restriction_trackers import OffsetRange, OffsetRestrictionTracker
+from apache_beam.coders import VarIntCoder, TupleCoder, BytesCoder
 from apache_beam.utils.timestamp import Timestamp, Duration
-from kafka import KafkaConsumer, KafkaProducer
-from confluent_kafka import Consumer, TopicPartition, OFFSET_END
+from confluent_kafka import Consumer, Producer, TopicPartition, OFFSET_END
 from confluent_kafka.admin import (
     AdminClient,
     ClusterMetadata,
@@ -27,8 +29,11 @@ import confluent_kafka
 
 class KafkaConsume(PTransform):
     """A :class:`~apache_beam.transforms.ptransform.PTransform` for reading from an Apache Kafka topic. This is a streaming
-    Transform that never returns. The transform uses `KafkaConsumer` from the
-    `kafka` python library.
+    Transform that never returns. The transform uses `Consumer` from the `confluent_kafka` library.
+
+    The partitions of all topics are enumerated and distributed over the workers, each partition is read by
+    a splittable ``DoFn``. The offset of a partition is tracked in its restriction, so that the runner
+    checkpoints it. Moreover, after each read the offset is committed to the consumer group.
 
     It outputs a :class:`~apache_beam.pvalue.PCollection` of
     ``key-values:s``, each object is a Kafka message in the form (msg-key, msg)
@@ -36,11 +41,18 @@ class KafkaConsume(PTransform):
     Args:
         consumer_config (dict): the kafka consumer configuration. The topic to
             be subscribed to should be specified with a key called 'topic'. The
-            remaining configurations are those of `KafkaConsumer` from the
-            `kafka` python library.
+            remaining configurations are those of `Consumer` from the
+            `confluent_kafka` library.
+        timeout (int): if not -1, the amount of seconds after which the consumer stops reading.
         value_decoder (function): Optional function to decode the consumed
             message value. If not specified, "bytes.decode" is used by default.
             "bytes.decode" which assumes "utf-8" encoding.
+        checkpoint_interval (float): the amount of seconds a partition is read, before it is checkpointed
+            (so that the runner can schedule other partitions). If None, a partition is read without checkpoints,
+            this requires at least as many workers as partitions.
+        max_buffer_size (int): the maximum amount of messages consumed (and claimed) at once.
+        buffer_timeout (float): the maximum amount of seconds to wait for a buffer to fill up,
+            after which the messages consumed so far are returned.
 
     Examples:
         Consuming from a Kafka Topic `notifications` ::
@@ -69,7 +81,15 @@ class KafkaConsume(PTransform):
     """
 
     def __init__(
-        self, consumer_config, timeout=-1, value_decoder=None, *args, **kwargs
+        self,
+        consumer_config,
+        timeout=-1,
+        value_decoder=None,
+        checkpoint_interval: Optional[float] = 1.0,
+        max_buffer_size: int = 500,
+        buffer_timeout: float = 0.1,
+        *args,
+        **kwargs,
     ):
         """Initializes ``KafkaConsume``"""
         super(KafkaConsume, self).__init__()
@@ -77,78 +97,252 @@ class KafkaConsume(PTransform):
             consumer_config=consumer_config,
             value_decoder=value_decoder,
             timeout=timeout,
+            checkpoint_interval=checkpoint_interval,
+            max_buffer_size=max_buffer_size,
+            buffer_timeout=buffer_timeout,
         )
 
     def expand(self, pcoll):
+        consumer_config = dict(self._consumer_args["consumer_config"])
+        topics = consumer_config.pop("topic")
+        if isinstance(topics, str):
+            topics = [topics]
+
         return (
             pcoll
-            | Create([("key", self._consumer_args)])
-            | ParDo(_ConsumeKafkaTopic(self._consumer_args))
+            | "kafka_topics" >> Create([topics])
+            | "kafka_partitions" >> ParDo(_ListKafkaPartitions(consumer_config))
+            | "kafka_distribute_partitions" >> Reshuffle()
+            | "kafka_read_partitions"
+            >> ParDo(_ConsumeKafkaTopic(dict(self._consumer_args)))
         )
 
 
-class _ConsumeKafkaTopic(DoFn):
-    """Internal ``DoFn`` to read from Kafka topic and return messages"""
+# The offsets which indicate to start reading at the end of a partition.
+LATEST_OFFSET_RESETS = ("latest", "largest", "end")
+
+
+class _ListKafkaPartitions(DoFn):
+    """Internal ``DoFn`` to enumerate the partitions of Kafka topics, with their start offset.
+
+    A partition starts at the offset committed by the consumer group.
+    If there is none, it starts at the beginning or end of the partition (depending on `auto.offset.reset`).
+    """
+
+    # The timeout (in seconds) of requests to the Kafka cluster.
+    METADATA_TIMEOUT = 10
+
+    def __init__(self, consumer_config: Dict[str, Any]):
+        self.consumer_config = consumer_config
+
+    def process(self, topics: List[str]):
+        consumer = Consumer(**self.consumer_config)
+        try:
+            metadata: ClusterMetadata = consumer.list_topics(
+                timeout=self.METADATA_TIMEOUT
+            )
+
+            partitions: List[TopicPartition] = []
+            for topic in topics:
+                topic_metadata: Optional[TopicMetadata] = metadata.topics.get(topic)
+                if topic_metadata is None or topic_metadata.error is not None:
+                    raise AttributeError(f"Kafka topic {topic} does not exist.")
+
+                partitions.extend(
+                    TopicPartition(topic, partition)
+                    for partition in sorted(topic_metadata.partitions)
+                )
+
+            latest: bool = (
+                self.consumer_config.get("auto.offset.reset", "latest")
+                in LATEST_OFFSET_RESETS
+            )
+            for committed in consumer.committed(
+                partitions, timeout=self.METADATA_TIMEOUT
+            ):
+                offset: int = committed.offset
+                if offset < 0:
+                    low, high = consumer.get_watermark_offsets(
+                        committed, timeout=self.METADATA_TIMEOUT
+                    )
+                    offset = high if latest else low
+
+                yield committed.topic, committed.partition, offset
+        finally:
+            consumer.close()
+
 
-    BUFFER_TIMER = TimerSpec("buffer_timer", TimeDomain.REAL_TIME)
-    STALE_TIMER = TimerSpec("stale_timer", TimeDomain.REAL_TIME)
-    OFFSET_STATE = ReadModifyWriteStateSpec("offsets", StrUtf8Coder())
+class _KafkaPartitionRestrictionProvider(RestrictionProvider):
+    """Provides the (unbounded) range of offsets of a Kafka partition, starting at its start offset."""
+
+    def initial_restriction(self, element: Tuple[str, int, int]) -> OffsetRange:
+        return OffsetRange(element[2], sys.maxsize)
+
+    def create_tracker(self, restriction: OffsetRange) -> OffsetRestrictionTracker:
+        return OffsetRestrictionTracker(restriction)
+
+    def split(self, element: Tuple[str, int, int], restriction: OffsetRange):
+        # A partition is read sequentially, it is only 'split' by checkpoints.
+        yield restriction
+
+    def restriction_size(
+        self, element: Tuple[str, int, int], restriction: OffsetRange
+    ) -> int:
+        return 1
+
+
+class _ConsumeKafkaTopic(DoFn):
+    """Internal (splittable) ``DoFn`` to read from a Kafka partition and return messages.
+
+    The input is a (topic, partition, start offset) tuple. Messages are consumed in buffers of up to
+    `max_buffer_size` messages, a buffer is returned when it is full or after `buffer_timeout` seconds.
+    Each buffer is claimed at once in the restriction, every `checkpoint_interval` seconds the remainder
+    of the partition is deferred.
+    The offset of a partition is committed when the bundle is finalized, i.e. after the runner committed
+    the output of the bundle. Messages of a failed bundle are therefore read again after a restart.
+    """
 
     def __init__(self, consumer_args):
-        self.consumer_config = consumer_args.pop("consumer_config")
-        self.topic = self.consumer_config.pop("topic")
+        self.consumer_config = dict(consumer_args.pop("consumer_config"))
+        self.consumer_config.pop("topic", None)
+        self.consumer_config["enable.auto.commit"] = False
         self.timeout = consumer_args.pop("timeout")
         self.value_decoder = consumer_args.pop("value_decoder") or bytes.decode
-        self.max_buffer_size = 1
+        self.checkpoint_interval: Optional[float] = consumer_args.pop(
+            "checkpoint_interval", 1.0
+        )
+        self.max_buffer_size: int = consumer_args.pop("max_buffer_size", 500)
+        self.buffer_timeout: float = consumer_args.pop("buffer_timeout", 0.1)
 
-        self.consumer: Consumer = None
+        self.consumers: Dict[Tuple[str, int], Consumer] = {}
+        self.positions: Dict[Tuple[str, int], int] = {}
+        self.stop_time: Optional[float] = None
 
+    def setup(self):
+        self.consumers = {}
+        self.positions = {}
+        if self.timeout != -1:
+            print(f"Now starting Kafka with a timeout of {self.timeout}")
+            self.stop_time = time.time() + self.timeout
+
+    def _consumer(self, topic: str, partition: int, offset: int) -> Consumer:
+        """Returns the consumer of a partition, positioned at `offset`."""
+        consumer: Optional[Consumer] = self.consumers.get((topic, partition))
+        if consumer is None:
+            consumer = Consumer(**self.consumer_config)
+            self.consumers[(topic, partition)] = consumer
+
+        if self.positions.get((topic, partition)) != offset:
+            consumer.assign([TopicPartition(topic, partition, offset)])
+            self.positions[(topic, partition)] = offset
+
+        return consumer
+
+    def _commit(self, consumer: Consumer, topic: str, partition: int, offset: int):
+        consumer.commit(
+            offsets=[TopicPartition(topic, partition, offset)], asynchronous=True
+        )
+
+    @DoFn.unbounded_per_element()
     def process(
         self,
-        element_pair,
+        element: Tuple[str, int, int],
+        bundle_finalizer=DoFn.BundleFinalizerParam,
+        tracker=DoFn.RestrictionParam(_KafkaPartitionRestrictionProvider()),
     ):
-        if self.timeout == -1:
-            self.consumer = Consumer(**self.consumer_config)
-            self.consumer.subscribe(topics=self.topic)
-            while True:
-                msg = self.consumer.poll(0.1)
-                if msg is None:
-                    continue
-
-                if msg.error():
-                    print("Consumer error: {}".format(msg.error()))
-                    continue
+        topic, partition, _ = element
+        restriction: OffsetRange = tracker.current_restriction()
+        consumer: Consumer = self._consumer(topic, partition, restriction.start)
+
+        checkpoint_time: Optional[float] = (
+            time.time() + self.checkpoint_interval
+            if self.checkpoint_interval is not None
+            else None
+        )
+        next_offset: int = restriction.start
+        unclaimed: bool = False
 
-                yield msg.key(), msg.value()
-        else:
-            print(f"Now starting Kafka with a timeout of {self.timeout}")
-            start_time = time.time() + self.timeout
-            self.consumer = Consumer(**self.consumer_config)
-            self.consumer.subscribe(topics=self.topic)
+        try:
             while True:
-                if time.time() >= start_time:
+                if self.stop_time is not None and time.time() >= self.stop_time:
                     print("Now returning due to timeout.")
+                    # Claiming the end of the range, marks this partition as done.
+                    tracker.try_claim(restriction.stop)
                     return
-                msg = self.consumer.poll(0.1)
-                if msg is None:
+
+                if checkpoint_time is not None and time.time() >= checkpoint_time:
+                    tracker.defer_remainder()
+                    return
+
+                buffer = consumer.consume(
+                    num_messages=self.max_buffer_size, timeout=self.buffer_timeout
+                )
+                if not buffer:
                     continue
 
-                if msg.error():
-                    print("Consumer error: {}".format(msg.error()))
+                messages = []
+                for msg in buffer:
+                    if msg.error():
+                        print("Consumer error: {}".format(msg.error()))
+                        continue
+                    messages.append(msg)
+
+                if not messages:
                     continue
 
-                yield msg.key(), msg.value()
+                # Claiming the last offset, claims the whole buffer.
+                if not tracker.try_claim(messages[-1].offset()):
+                    unclaimed = True
+                    return
+
+                next_offset = messages[-1].offset() + 1
+                for msg in messages:
+                    yield msg.key(), msg.value()
+        finally:
+            if unclaimed:
+                # The consumer is positioned past messages it did not claim (e.g. after a split),
+                # so it has to seek back once the remainder of the partition is read.
+                self.positions.pop((topic, partition), None)
+            elif next_offset > restriction.start:
+                # The consumer is positioned at the next offset.
+                self.positions[(topic, partition)] = next_offset
+
+            if next_offset > restriction.start:
+                # The offset is only committed once the bundle is done.
+                bundle_finalizer.register(
+                    functools.partial(
+                        self._commit, consumer, topic, partition, next_offset
+                    )
+                )
+
+    def teardown(self):
+        for consumer in self.consumers.values():
+            consumer.close()
+        self.consumers = {}
+
+
+# The default configuration of the Kafka producer, messages are batched (and compressed) for up to `linger.ms`.
+DEFAULT_PRODUCER_CONFIG: Dict[str, Any] = {
+    # Retries of the producer do not duplicate (or reorder) messages.
+    "enable.idempotence": True,
+    "linger.ms": 5,
+    "batch.num.messages": 10000,
+    "compression.type": "lz4",
+}
 
 
 class KafkaProduce(PTransform):
     """A :class:`~apache_beam.transforms.ptransform.PTransform` for pushing messages
     into an Apache Kafka topic. This class expects a tuple with the first element being the message key
-    and the second element being the message. The transform uses `KafkaProducer`
-    from the `kafka` python library.
+    and the second element being the message. An optional third element is a `ReplyAddress`,
+    which overrides the topic (and partition) of that message. The transform uses `Producer`
+    from the `confluent_kafka` library. A single producer is kept per DoFn instance, messages are
+    batched by the producer and flushed at the end of each bundle.
 
     Args:
         topic: Kafka topic to publish to
         servers: list of Kafka servers to listen to
+        producer_config: additional configuration of the `Producer`, overrides `DEFAULT_PRODUCER_CONFIG`.
 
     Examples:
         Examples:
@@ -176,33 +370,98 @@ class KafkaProduce(PTransform):
         Where the key is the Kafka topic published to and the element is the Kafka message produced
     """
 
-    def __init__(self, topic=None, servers="127.0.0.1:9092"):
+    def __init__(
+        self,
+        topic=None,
+        servers="127.0.0.1:9092",
+        producer_config: Optional[Dict[str, Any]] = None,
+    ):
         """Initializes ``KafkaProduce``"""
         super(KafkaProduce, self).__init__()
-        self._attributes = dict(topic=topic, servers=servers)
+        self._attributes = dict(
+            topic=topic, servers=servers, producer_config=producer_config or {}
+        )
 
     def expand(self, pcoll):
         return pcoll | ParDo(_ProduceKafkaMessage(self._attributes))
 
 
 class _ProduceKafkaMessage(DoFn):
-    """Internal ``DoFn`` to publish message to Kafka topic"""
+    """Internal ``DoFn`` to publish message to Kafka topic.
+
+    The producer is created once in `setup` and reused for all bundles. Messages are produced asynchronously,
+    at the end of a bundle the producer is flushed. If a message could not be delivered, the bundle fails
+    (and is retried by the runner).
+    """
+
+    # The timeout (in seconds) of flushing the producer at the end of a bundle.
+    FLUSH_TIMEOUT = 30
 
     def __init__(self, attributes, *args, **kwargs):
         super(_ProduceKafkaMessage, self).__init__(*args, **kwargs)
         self.attributes = attributes
 
-    def start_bundle(self):
-        self._producer = KafkaProducer(bootstrap_servers=self.attributes["servers"])
+        self._producer: Optional[Producer] = None
+        self._delivery_errors: List[confluent_kafka.KafkaError] = []
 
-    def finish_bundle(self):
-        self._producer.close()
+    def _producer_config(self) -> Dict[str, Any]:
+        return {
+            **DEFAULT_PRODUCER_CONFIG,
+            **self.attributes.get("producer_config", {}),
+            "bootstrap.servers": self.attributes["servers"],
+        }
+
+    def setup(self):
+        self._producer = Producer(self._producer_config())
+        self._delivery_errors = []
+
+    def _on_delivery(self, err: Optional[confluent_kafka.KafkaError], msg):
+        if err is not None:
+            self._delivery_errors.append(err)
+
+    def _produce(self, topic: str, value: bytes, key: bytes, partition: Optional[int]):
+        kwargs = dict(key=key, on_delivery=self._on_delivery)
+        if partition is not None:
+            kwargs["partition"] = partition
+
+        while True:
+            try:
+                self._producer.produce(topic, value, **kwargs)
+                break
+            except BufferError:
+                # The local queue is full, wait for messages to be delivered.
+                self._producer.poll(0.1)
+
+        # Serve delivery callbacks of earlier messages.
+        self._producer.poll(0)
 
     def process(self, element):
-        try:
-            self._producer.send(
-                self.attributes["topic"], element[1], key=element[0].encode()
+        # A reply might be addressed to the topic (and partition) of a specific client.
+        reply_to = element[2] if len(element) > 2 else None
+        if reply_to is not None:
+            self._produce(
+                reply_to.topic, element[1], element[0].encode(), reply_to.partition
+            )
+        else:
+            self._produce(
+                self.attributes["topic"], element[1], element[0].encode(), None
             )
-            yield element
-        except Exception as e:
-            raise e
+        yield element
+
+    def finish_bundle(self):
+        remaining: int = self._producer.flush(self.FLUSH_TIMEOUT)
+
+        if self._delivery_errors:
+            errors, self._delivery_errors = self._delivery_errors, []
+            raise AttributeError(
+                f"Failed to deliver {len(errors)} message(s) to Kafka: {errors[0]}."
+            )
+        if remaining > 0:
+            raise AttributeError(
+                f"Failed to flush {remaining} message(s) to Kafka within {self.FLUSH_TIMEOUT}s."
+            )
+
+    def teardown(self):
+        if self._producer is not None:
+            self._producer.flush(self.FLUSH_TIMEOUT)
+            self._producer = None
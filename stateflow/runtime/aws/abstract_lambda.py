@@ -11,14 +11,27 @@ from stateflow.dataflow.dataflow import (
 )
 from stateflow.dataflow.stateful_operator import StatefulOperator
 from stateflow.dataflow.event import EventType
+from stateflow.dataflow.event_flow import InternalClassRef
+from stateflow.dataflow.address import FunctionAddress
 from stateflow.serialization.pickle_serializer import SerDe, PickleSerializer
 from stateflow.runtime.runtime import Runtime
+from stateflow.runtime.aws.state_cache import StateCache
+from stateflow.runtime.metrics import MetricsCollector
 from python_dynamodb_lock.python_dynamodb_lock import *
 import boto3
 from pynamodb.models import Model
-from pynamodb.attributes import UnicodeAttribute, BinaryAttribute
+from pynamodb.attributes import UnicodeAttribute, BinaryAttribute, NumberAttribute
+from pynamodb.exceptions import PutError, TransactWriteError, DoesNotExist
+from pynamodb.transactions import TransactWrite
+from pynamodb.connection import Connection
+from typing import Optional, Tuple, Dict, List, Type, Iterator
 from botocore.config import Config
 import datetime
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
 
 """Base class for implementing Lambda handlers as classes.
 Used across multiple Lambda functions (included in each zip file).
@@ -51,15 +64,124 @@ class StateflowRecord(Model):
     key = UnicodeAttribute(hash_key=True)
     state = BinaryAttribute(null=True)
 
+    # Only used with optimistic concurrency control, records written with locks have no version.
+    version = NumberAttribute(null=True)
+
+
+class StateflowOperatorRecord(Model):
+    """
+    A Stateflow Record with a composite key: the operator as hash key and the instance key as range key.
+    All instances of an operator share a partition, so they can be queried (in order of their key).
+    """
+
+    class Meta:
+        table_name = "stateflow"
+        region = "eu-west-1"
+
+    operator = UnicodeAttribute(hash_key=True)
+    key = UnicodeAttribute(range_key=True)
+    state = BinaryAttribute(null=True)
+    version = NumberAttribute(null=True)
+
+
+# The record classes per layout, table name and region.
+_record_classes: Dict[Tuple[bool, str, str], Type[Model]] = {
+    (
+        False,
+        StateflowRecord.Meta.table_name,
+        StateflowRecord.Meta.region,
+    ): StateflowRecord
+}
+
+
+def record_class(
+    table_name: str, region: str, composite_key: bool = False
+) -> Type[Model]:
+    """Gets the record class of a DynamoDB table.
+    PynamoDB configures the table of a model in its class, so a subclass is created per table and region.
+
+    :param table_name: the name of the table.
+    :param region: the region of the table.
+    :param composite_key: use StateflowOperatorRecord (operator and key) instead of StateflowRecord (a single key).
+    :return: the record class.
+    """
+    layout: Tuple[bool, str, str] = (composite_key, table_name, region)
+    if layout not in _record_classes:
+        base: Type[Model] = (
+            StateflowOperatorRecord if composite_key else StateflowRecord
+        )
+        meta = type("Meta", (), {"table_name": table_name, "region": region})
+        _record_classes[layout] = type(base.__name__, (base,), {"Meta": meta})
+
+    return _record_classes[layout]
+
+
+class StateTransaction:
+    """The state read and (buffered) state written during the execution of a single flow."""
+
+    def __init__(self):
+        # The state and version per key, as read from DynamoDB (or the state cache).
+        self.reads: Dict[str, Tuple[Optional[bytes], Optional[int]]] = {}
+
+        # The updated state per key, which is committed at the end of the flow.
+        self.writes: Dict[str, bytes] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        if key in self.writes:
+            return self.writes[key]
+
+        return self.reads[key][0]
+
+    def put(self, key: str, state: bytes):
+        self.writes[key] = state
+
 
 class AWSLambdaRuntime(LambdaBase, Runtime):
+    # The maximum amount of items in a single DynamoDB transaction.
+    MAX_TRANSACTION_ITEMS: int = 100
+
     def __init__(
         self,
         flow: Dataflow,
         table_name="stateflow",
         serializer: SerDe = PickleSerializer(),
         config: Config = Config(region_name="eu-west-1"),
+        optimistic: bool = False,
+        max_conflict_retries: int = 10,
+        state_cache: Optional[StateCache] = None,
+        prefetch: bool = False,
+        metrics: Optional[MetricsCollector] = None,
+        table_per_operator: bool = False,
+        composite_key: bool = False,
     ):
+        """Initializes the Lambda runtime.
+
+        By default, a key is locked in DynamoDB for each event that (possibly) updates its state.
+        In optimistic mode, no locks are used. Instead, a version is stored next to the state
+        and the state is only written if the version did not change since it was read.
+        On a conflict, the event is executed again on the latest state.
+
+        :param flow: the dataflow.
+        :param table_name: the name of the DynamoDB table, or the prefix of the table names if there is a
+            table per operator.
+        :param serializer: the serializer for events and state.
+        :param config: the boto3 config, its region is the region of the DynamoDB tables.
+        :param optimistic: use optimistic concurrency control instead of locks.
+        :param max_conflict_retries: the maximum amount of retries on a conflict, in optimistic mode.
+        :param state_cache: a cache of state, used across warm invocations. Requires optimistic mode,
+            so that stale cached state is detected on commit. Read-only events are not validated,
+            so they might observe state as stale as the TTL of the cache.
+        :param prefetch: execute each flow as a single transaction. All keys of a flow which are known up front,
+            are read in a single BatchGetItem. All writes are buffered and committed in a single TransactWriteItems
+            at the end of the flow. Requires optimistic mode.
+        :param metrics: a collector for latency histograms per phase, operator and method.
+            If None, no latencies are measured at all.
+        :param table_per_operator: store the state of each operator in its own table,
+            named `{table_name}-{namespace}-{class name}`.
+        :param composite_key: store state with the operator as hash key and the instance key as range key,
+            instead of a single hash key `{operator}_{key}`. This allows to query the instances of an operator
+            (see `scan_operator`), but all instances of an operator share a partition.
+        """
         self.flow: Dataflow = flow
         self.serializer: SerDe = serializer
 
@@ -71,8 +193,37 @@ class AWSLambdaRuntime(LambdaBase, Runtime):
             for operator in self.flow.operators
         }
 
+        self.optimistic: bool = optimistic
+        self.max_conflict_retries: int = max_conflict_retries
+
+        if state_cache is not None and not optimistic:
+            raise AttributeError("A state cache can only be used in optimistic mode.")
+        self.state_cache: Optional[StateCache] = state_cache
+
+        if prefetch and not optimistic:
+            raise AttributeError("Prefetching can only be used in optimistic mode.")
+        self.prefetch: bool = prefetch
+        self.metrics: Optional[MetricsCollector] = metrics
+
+        self.region: str = (
+            config.region_name
+            if config.region_name is not None
+            else boto3.session.Session().region_name
+        )
+        self.table_name: str = table_name
+        self.table_per_operator: bool = table_per_operator
+        self.composite_key: bool = composite_key
+        self.record_classes: Dict[str, Type[Model]] = {
+            operator_name: record_class(
+                self._table_name(operator_name), self.region, composite_key
+            )
+            for operator_name in self.operators.keys()
+        }
+
         self.dynamodb = self._setup_dynamodb(config)
-        self.lock_client: DynamoDBLockClient = self._setup_lock_client(3)
+        self.lock_client: Optional[DynamoDBLockClient] = (
+            self._setup_lock_client(3) if not optimistic else None
+        )
 
     def _setup_dynamodb(self, config: Config):
         return boto3.resource("dynamodb", config=config)
@@ -86,18 +237,252 @@ class AWSLambdaRuntime(LambdaBase, Runtime):
         print(f"Locking {key}")
         return self.lock_client.acquire_lock(key)
 
+    def _table_name(self, operator_name: str) -> str:
+        if not self.table_per_operator:
+            return self.table_name
+
+        # Table names can't contain a '/'.
+        return f"{self.table_name}-{operator_name.replace('/', '-')}"
+
+    def _split_key(self, key: str) -> Tuple[str, str]:
+        """Splits a full key into the name of its operator and the key of the instance.
+
+        :param key: the full key, i.e. {operator}_{key}.
+        :return: the operator name and instance key.
+        """
+        # The longest operator name is matched, as an operator name might contain a '_'.
+        for operator_name in sorted(self.operators.keys(), key=len, reverse=True):
+            if key.startswith(f"{operator_name}_"):
+                return operator_name, key[len(operator_name) + 1 :]
+
+        raise AttributeError(f"Key {key} does not belong to any of the operators.")
+
+    def _new_record(self, key: str, **attributes) -> Model:
+        """Creates the record of a full key, in its table and with its key layout.
+
+        :param key: the full key.
+        :param attributes: the other attributes of the record.
+        :return: the record.
+        """
+        operator_name, instance_key = self._split_key(key)
+        clasz: Type[Model] = self.record_classes[operator_name]
+
+        if self.composite_key:
+            return clasz(operator_name, instance_key, **attributes)
+        return clasz(key, **attributes)
+
+    def _get_record(self, key: str) -> Model:
+        record: Model = self._new_record(key)
+        if self.composite_key:
+            return record.__class__.get(record.operator, record.key)
+        return record.__class__.get(record.key)
+
+    def _full_key(self, record: Model) -> str:
+        if self.composite_key:
+            return f"{record.operator}_{record.key}"
+        return record.key
+
+    def create_tables(
+        self, read_capacity_units: int = 1, write_capacity_units: int = 1
+    ):
+        """Creates the DynamoDB tables of this runtime, if they don't exist yet.
+
+        :param read_capacity_units: the provisioned read capacity of each table.
+        :param write_capacity_units: the provisioned write capacity of each table.
+        """
+        for clasz in set(self.record_classes.values()):
+            clasz.create_table(
+                read_capacity_units=read_capacity_units,
+                write_capacity_units=write_capacity_units,
+                wait=True,
+            )
+
     def get_state(self, key: str):
         try:
-            record = StateflowRecord.get(key)
+            record = self._get_record(key)
             return record.state
-        except StateflowRecord.DoesNotExist:
+        except DoesNotExist:
             print(f"{key} does not exist yet")
             return None
 
     def save_state(self, key: str, state):
-        record = StateflowRecord(key, state=state)
+        record = self._new_record(key, state=state)
         record.save()
 
+    def get_versioned_state(self, key: str) -> Tuple[Optional[bytes], Optional[int]]:
+        """Gets the state of a key, together with its version.
+
+        :param key: the key.
+        :return: the state and version, the version is None if the key does not exist yet.
+        """
+        try:
+            record = self._get_record(key)
+            return record.state, record.version or 0
+        except DoesNotExist:
+            return None, None
+
+    def save_versioned_state(
+        self, key: str, state: bytes, version: Optional[int]
+    ) -> bool:
+        """Saves the state of a key, only if its version is still the version that was read.
+
+        :param key: the key.
+        :param state: the updated state.
+        :param version: the version that was read, None if the key did not exist.
+        :return: True if the state is saved, False if the version changed in the meantime.
+        """
+        record = self._new_record(key, state=state, version=(version or 0) + 1)
+        try:
+            record.save(condition=self._version_condition(record.__class__, version))
+        except PutError as e:
+            if e.cause_response_code == "ConditionalCheckFailedException":
+                return False
+            raise e
+
+        return True
+
+    def _version_condition(self, clasz: Type[Model], version: Optional[int]):
+        if version is None:
+            return clasz.key.does_not_exist()
+        elif version == 0:
+            return clasz.version.does_not_exist()
+        else:
+            return clasz.version == version
+
+    def batch_get_versioned_state(
+        self, keys: List[str]
+    ) -> Dict[str, Tuple[Optional[bytes], Optional[int]]]:
+        """Gets the state and version of multiple keys, using BatchGetItem (per table).
+
+        :param keys: the keys.
+        :return: the state and version per key, the version is None if the key does not exist yet.
+        """
+        states: Dict[str, Tuple[Optional[bytes], Optional[int]]] = {
+            key: (None, None) for key in keys
+        }
+
+        per_table: Dict[Type[Model], List] = {}
+        for key in keys:
+            record: Model = self._new_record(key)
+            per_table.setdefault(record.__class__, []).append(
+                (record.operator, record.key) if self.composite_key else record.key
+            )
+
+        for clasz, table_keys in per_table.items():
+            for record in clasz.batch_get(table_keys):
+                states[self._full_key(record)] = (record.state, record.version or 0)
+
+        return states
+
+    def commit_versioned_states(
+        self, writes: Dict[str, Tuple[bytes, Optional[int]]]
+    ) -> bool:
+        """Saves the state of multiple keys atomically, only if none of their versions changed.
+        A single write is committed with a conditional PutItem, multiple writes with a TransactWriteItems.
+        The latter supports at most MAX_TRANSACTION_ITEMS keys (possibly across tables).
+
+        :param writes: the updated state and the version that was read, per key.
+        :return: True if all state is saved, False if any version changed in the meantime.
+        """
+        if len(writes) > self.MAX_TRANSACTION_ITEMS:
+            raise AttributeError(
+                f"Can't commit {len(writes)} keys in a single transaction, "
+                f"DynamoDB supports at most {self.MAX_TRANSACTION_ITEMS}."
+            )
+
+        if len(writes) == 1:
+            key, (state, version) = next(iter(writes.items()))
+            return self.save_versioned_state(key, state, version)
+
+        try:
+            with TransactWrite(
+                connection=Connection(region=self.region)
+            ) as transaction:
+                for key, (state, version) in writes.items():
+                    record: Model = self._new_record(
+                        key, state=state, version=(version or 0) + 1
+                    )
+                    transaction.save(
+                        record,
+                        condition=self._version_condition(record.__class__, version),
+                    )
+        except TransactWriteError as e:
+            if e.cause_response_code == "TransactionCanceledException":
+                return False
+            raise e
+
+        return True
+
+    def scan_operator(
+        self, operator_name: str, start_key: Optional[str] = None
+    ) -> Iterator[Tuple[str, Optional[bytes]]]:
+        """Iterates over the state of all instances of an operator.
+
+        With a composite key, this is a query of the partition of the operator, in order of the instance keys.
+        Otherwise, the (whole) table is scanned and filtered on the operator, in no particular order.
+
+        :param operator_name: the name of the operator, e.g. global/User.
+        :param start_key: only iterate over instance keys from this key (inclusive).
+        :return: an iterator of instance keys and their state.
+        """
+        clasz: Type[Model] = self.record_classes[operator_name]
+
+        if self.composite_key:
+            records = clasz.query(
+                operator_name,
+                range_key_condition=(
+                    clasz.key >= start_key if start_key is not None else None
+                ),
+            )
+        else:
+            condition = clasz.key.startswith(f"{operator_name}_")
+            if start_key is not None:
+                condition &= clasz.key >= f"{operator_name}_{start_key}"
+            records = clasz.scan(condition)
+
+        for record in records:
+            yield self._split_key(self._full_key(record))[1], record.state
+
+    def _record(
+        self,
+        phase: str,
+        start: float,
+        operator: Optional[str] = None,
+        method: Optional[str] = None,
+    ) -> float:
+        """Records the latency of a phase, only call this if metrics are enabled.
+
+        :param phase: the phase.
+        :param start: the start of the phase, as given by time.perf_counter().
+        :param operator: the name of the operator, if any.
+        :param method: the name of the method, if any.
+        :return: the end of the phase, which can be used as start of the next phase.
+        """
+        now: float = time.perf_counter()
+        self.metrics.record(phase, (now - start) * 1000, operator, method)
+        return now
+
+    def _method_name(self, event: Event) -> str:
+        if event.event_type == EventType.Request.InvokeStateful:
+            return event.payload["method_name"]
+        elif event.event_type == EventType.Request.EventFlow:
+            current_node = event.payload["flow"].current_node
+            return getattr(current_node, "fun_name", current_node.typ)
+
+        return event.event_type.value
+
+    def flush_metrics(self, start: Optional[float] = None):
+        """Records the latency of the whole invocation and emits all metrics, at the end of an invocation.
+
+        :param start: the start of the invocation, as given by time.perf_counter().
+        """
+        if self.metrics is None:
+            return
+
+        if start is not None:
+            self._record("invocation", start)
+        self.metrics.flush()
+
     def is_request_state(self, event: Event) -> bool:
         if event.event_type == EventType.Request.GetState:
             return True
@@ -113,7 +498,9 @@ class AWSLambdaRuntime(LambdaBase, Runtime):
 
         return False
 
-    def invoke_operator(self, route: Route) -> Event:
+    def invoke_operator(
+        self, route: Route, transaction: Optional[StateTransaction] = None
+    ) -> Event:
         event: Event = route.value
 
         operator_name: str = route.route_name
@@ -127,55 +514,315 @@ class AWSLambdaRuntime(LambdaBase, Runtime):
                     operator_name,
                     new_event.fun_address.key,
                     new_event,
-                )
+                ),
+                transaction,
             )
-        else:
-            full_key: str = f"{operator_name}_{route.key}"
 
+        full_key: str = f"{operator_name}_{route.key}"
+
+        # The labels of the metrics, these are only computed if metrics are enabled.
+        metrics_enabled: bool = self.metrics is not None
+        method_name: Optional[str] = (
+            self._method_name(event) if metrics_enabled else None
+        )
+        start: float = time.perf_counter() if metrics_enabled else 0
+
+        if transaction is not None:
+            self._read_into_transaction(transaction, [full_key])
+            operator_state = transaction.get(full_key)
+            if metrics_enabled:
+                start = self._record("read", start, operator_name, method_name)
+
+            return_event, updated_state = operator.handle(event, operator_state)
+            if metrics_enabled:
+                self._record("execute", start, operator_name, method_name)
+
+            # Handling always serializes state again, so unchanged (i.e. read-only) state is compared by value.
+            if updated_state != operator_state:
+                transaction.put(full_key, updated_state)
+
+            return return_event
+        elif self.optimistic:
+            return self._invoke_optimistic(
+                operator, event, full_key, operator_name, method_name
+            )
+        else:
             # Lock the key in DynamoDB.
-            start = datetime.datetime.now()
             if not self.is_request_state(event):
                 lock = self.lock_key(full_key)
             else:
                 lock = None
+            if metrics_enabled:
+                start = self._record("lock", start, operator_name, method_name)
 
-            end = datetime.datetime.now()
-            delta = end - start
-            print(f"Locking key took {delta.total_seconds() * 1000}ms")
-
-            start = datetime.datetime.now()
             operator_state = self.get_state(full_key)
-            end = datetime.datetime.now()
-            delta = end - start
-            print(f"Getting state took {delta.total_seconds() * 1000}ms")
+            if metrics_enabled:
+                start = self._record("read", start, operator_name, method_name)
 
-            start = datetime.datetime.now()
             return_event, updated_state = operator.handle(event, operator_state)
-            end = datetime.datetime.now()
-            delta = end - start
-            print(f"Executing event took {delta.total_seconds() * 1000}ms")
+            if metrics_enabled:
+                start = self._record("execute", start, operator_name, method_name)
 
-            start = datetime.datetime.now()
-            if updated_state is not operator_state:
+            if updated_state != operator_state:
                 self.save_state(full_key, updated_state)
-            end = datetime.datetime.now()
-            delta = end - start
-            print(f"Saving state took {delta.total_seconds() * 1000}ms")
+            if metrics_enabled:
+                start = self._record("write", start, operator_name, method_name)
 
             if lock:
                 lock.release()
+                if metrics_enabled:
+                    self._record("unlock", start, operator_name, method_name)
+
             return return_event
 
-    def handle_invocation(self, event: Event) -> Route:
+    def _invoke_optimistic(
+        self,
+        operator: StatefulOperator,
+        event: Event,
+        full_key: str,
+        operator_name: str,
+        method_name: Optional[str],
+    ) -> Event:
+        # The operator might modify the event, so we keep a serialized copy to retry on a conflict.
+        serialized_event: bytes = self.serializer.serialize_event(event)
+
+        metrics_enabled: bool = self.metrics is not None
+        for attempt in range(self.max_conflict_retries + 1):
+            if attempt > 0:
+                self._backoff(attempt)
+
+            start: float = time.perf_counter() if metrics_enabled else 0
+            attempt_start: float = start
+
+            cached = (
+                self.state_cache.get(full_key) if self.state_cache is not None else None
+            )
+            if cached is not None:
+                operator_state, version = cached
+            else:
+                operator_state, version = self.get_versioned_state(full_key)
+                self._cache_state(full_key, operator_state, version)
+            if metrics_enabled:
+                start = self._record("read", start, operator_name, method_name)
+
+            return_event, updated_state = operator.handle(event, operator_state)
+            if metrics_enabled:
+                start = self._record("execute", start, operator_name, method_name)
+
+            # Read-only events are not written, so they don't bump the version and cause conflicts.
+            if updated_state == operator_state:
+                return return_event
+
+            committed: bool = self.save_versioned_state(
+                full_key, updated_state, version
+            )
+            if metrics_enabled:
+                self._record("write", start, operator_name, method_name)
+
+            if committed:
+                if self.state_cache is not None:
+                    self.state_cache.put(full_key, updated_state, (version or 0) + 1)
+                return return_event
+
+            # The (cached) state is stale, so we read the latest state on the retry.
+            logger.info(f"Conflict on {full_key}, retrying.")
+            if metrics_enabled:
+                self._record("conflict", attempt_start, operator_name, method_name)
+            if self.state_cache is not None:
+                self.state_cache.invalidate(full_key)
+            event = self.serializer.deserialize_event(serialized_event)
+
+        raise AttributeError(
+            f"Could not commit state of {full_key} after {self.max_conflict_retries} retries."
+        )
+
+    def _backoff(self, attempt: int):
+        """Sleeps before retrying after a conflict, with an exponential backoff and full jitter.
+        Without a backoff, concurrent invocations conflicting on a hot key keep on conflicting.
+
+        :param attempt: the attempt which is about to start, starting at 1 for the first retry.
+        """
+        time.sleep(random.uniform(0, min(1.0, 0.005 * 2**attempt)))
+
+    def _read_into_transaction(self, transaction: StateTransaction, keys: List[str]):
+        """Reads the state of all keys not yet read in the transaction, from the cache or DynamoDB.
+
+        :param transaction: the transaction.
+        :param keys: the keys to read.
+        """
+        missing: List[str] = list(
+            dict.fromkeys([key for key in keys if key not in transaction.reads])
+        )
+
+        if self.state_cache is not None:
+            for key in list(missing):
+                cached = self.state_cache.get(key)
+                if cached is not None:
+                    transaction.reads[key] = cached
+                    missing.remove(key)
+
+        if len(missing) == 1:
+            transaction.reads[missing[0]] = self.get_versioned_state(missing[0])
+        elif len(missing) > 1:
+            transaction.reads.update(self.batch_get_versioned_state(missing))
+
+        for key in missing:
+            self._cache_state(key, *transaction.reads[key])
+
+    def _cache_state(self, key: str, state: Optional[bytes], version: Optional[int]):
+        """Caches state read from DynamoDB, so that (read-mostly) keys are cached without being written.
+        Keys without state are not cached.
+
+        :param key: the full key.
+        :param state: the state, or None if the key does not exist.
+        :param version: the version of the state.
+        """
+        if self.state_cache is not None and state is not None:
+            self.state_cache.put(key, state, version or 0)
+
+    def flow_keys(self, event: Event) -> List[str]:
+        """Collects the keys an event will (possibly) touch, as far as they are known before execution.
+        For an event flow, these are the keys of all addresses and class references in the flow graph.
+
+        :param event: the incoming event.
+        :return: the full keys (i.e. {operator}_{key}).
+        """
+        keys: List[str] = []
+
+        def add_key(fun_addr: Optional[FunctionAddress]):
+            if fun_addr is None or fun_addr.key is None:
+                return
+
+            operator_name: str = fun_addr.function_type.get_full_name()
+            if operator_name in self.operators:
+                keys.append(f"{operator_name}_{fun_addr.key}")
+
+        add_key(event.fun_address)
+
+        if event.event_type == EventType.Request.EventFlow:
+            for node in event.payload["flow"].graph:
+                add_key(node.fun_addr)
+
+                for value in node.input.values():
+                    for ref in value if isinstance(value, list) else [value]:
+                        if isinstance(ref, InternalClassRef):
+                            add_key(ref._fun_addr)
+                        elif (
+                            isinstance(ref, dict)
+                            and ref.get("_type") == "InternalClassRef"
+                        ):
+                            add_key(FunctionAddress.from_dict(ref["fun_addr"]))
+
+        return list(dict.fromkeys(keys))
+
+    def handle_invocation(
+        self, event: Event, transaction: Optional[StateTransaction] = None
+    ) -> Route:
         route: Route = self.ingress_router.route(event)
         print(f"Received and routed event! {event.event_type}")
 
         if route.direction == RouteDirection.INTERNAL:
-            return self.egress_router.route_and_serialize(self.invoke_operator(route))
+            return self.egress_router.route_and_serialize(
+                self.invoke_operator(route, transaction)
+            )
         elif route.direction == RouteDirection.EGRESS:
             return self.egress_router.route_and_serialize(route.value)
         else:
             return route
 
+    def execute_event(self, event: Event) -> Event:
+        """Executes an event until it can be replied to the client.
+        A batch is executed event by event and replied to as a single Reply.BatchResult.
+
+        :param event: the (parsed) incoming event.
+        :return: the reply event.
+        """
+        if event.is_batch():
+            return Event.pack(
+                event.event_id,
+                event.fun_address,
+                [self.execute_event(sub_event) for sub_event in event.unpack()],
+                reply=True,
+                reply_to=event.reply_to,
+            )
+
+        if self.prefetch:
+            return self._execute_transaction([event])[0]
+
+        return self._execute_flow(event)
+
+    def _execute_flow(
+        self, event: Event, transaction: Optional[StateTransaction] = None
+    ) -> Event:
+        return_route: Route = self.handle_invocation(event, transaction)
+
+        while return_route.direction != RouteDirection.CLIENT:
+            return_route = self.handle_invocation(return_route.value, transaction)
+
+        return return_route.value
+
+    def _execute_transaction(self, events: List[Event]) -> List[Event]:
+        """Executes events (in order) as a single transaction.
+        The state of each key is read at most once and written at most once, for all events together.
+
+        :param events: the (parsed) incoming events, none of them a batch.
+        :return: the reply event per incoming event.
+        """
+        # The flow might modify the events, so we keep serialized copies to retry on a conflict.
+        serialized_events: List[bytes] = [
+            self.serializer.serialize_event(event) for event in events
+        ]
+
+        metrics_enabled: bool = self.metrics is not None
+        for attempt in range(self.max_conflict_retries + 1):
+            if attempt > 0:
+                self._backoff(attempt)
+
+            start: float = time.perf_counter() if metrics_enabled else 0
+            attempt_start: float = start
+
+            transaction: StateTransaction = StateTransaction()
+            self._read_into_transaction(
+                transaction, [key for event in events for key in self.flow_keys(event)]
+            )
+            if metrics_enabled:
+                start = self._record("prefetch", start)
+
+            return_events: List[Event] = [
+                self._execute_flow(event, transaction) for event in events
+            ]
+            if metrics_enabled:
+                start = time.perf_counter()
+
+            writes: Dict[str, Tuple[bytes, Optional[int]]] = {
+                key: (state, transaction.reads[key][1])
+                for key, state in transaction.writes.items()
+            }
+            committed: bool = len(writes) == 0 or self.commit_versioned_states(writes)
+            if metrics_enabled:
+                self._record("commit", start)
+
+            if committed:
+                if self.state_cache is not None:
+                    for key, (state, version) in writes.items():
+                        self.state_cache.put(key, state, (version or 0) + 1)
+                return return_events
+
+            # Some of the (cached) state is stale, so we read the latest state on the retry.
+            logger.info(f"Conflict on committing {list(writes.keys())}, retrying.")
+            if metrics_enabled:
+                self._record("conflict", attempt_start)
+            if self.state_cache is not None:
+                for key in transaction.reads.keys():
+                    self.state_cache.invalidate(key)
+            events = [
+                self.serializer.deserialize_event(serialized_event)
+                for serialized_event in serialized_events
+            ]
+
+        raise AttributeError(
+            f"Could not commit flow of {[event.event_id for event in events]} after {self.max_conflict_retries} retries."
+        )
+
     def handle(self, event, context):
         raise NotImplementedError("Needs to be implemented by subclasses.")
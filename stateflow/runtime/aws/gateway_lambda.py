@@ -5,12 +5,17 @@ from stateflow.runtime.aws.abstract_lambda import (
     Dataflow,
     SerDe,
     Config,
+    StateCache,
+    MetricsCollector,
     PickleSerializer,
     Event,
-    RouteDirection,
-    Route,
 )
+from typing import Optional
 import base64
+import time
+
+# The media type of raw serialized events.
+BINARY_MEDIA_TYPE = "application/octet-stream"
 
 
 class AWSGatewayLambdaRuntime(AWSLambdaRuntime):
@@ -21,30 +26,87 @@ class AWSGatewayLambdaRuntime(AWSLambdaRuntime):
         gateway: bool = True,
         serializer: SerDe = PickleSerializer(),
         config: Config = Config(region_name="eu-west-1"),
+        optimistic: bool = False,
+        state_cache: Optional[StateCache] = None,
+        prefetch: bool = False,
+        metrics: Optional[MetricsCollector] = None,
+        table_per_operator: bool = False,
+        composite_key: bool = False,
     ):
-        super().__init__(flow, table_name, serializer, config)
+        super().__init__(
+            flow,
+            table_name,
+            serializer,
+            config,
+            optimistic,
+            state_cache=state_cache,
+            prefetch=prefetch,
+            metrics=metrics,
+            table_per_operator=table_per_operator,
+            composite_key=composite_key,
+        )
         self.gateway = gateway
 
+    def _is_binary(self, event) -> bool:
+        headers = {
+            key.lower(): value for key, value in (event.get("headers") or {}).items()
+        }
+        return event.get("isBase64Encoded", False) and headers.get(
+            "content-type", ""
+        ).startswith(BINARY_MEDIA_TYPE)
+
     def handle(self, event, context):
+        """Handles an invocation, either through API Gateway or a direct invocation.
+
+        Through API Gateway, an event is either posted as raw bytes (with the binary media type) or
+        base64 encoded in a JSON envelope `{"event": ...}`. Binary requests are replied to with raw bytes,
+        API Gateway needs `application/octet-stream` configured as binary media type for this.
+
+        A direct invocation (i.e. not through API Gateway) has either the JSON envelope or a base64 string as payload.
+        Lambda payloads have to be JSON, so a base64 string is the most compact. It is replied to with a base64 string.
+
+        :param event: the Lambda event.
+        :param context: the Lambda context.
+        :return: the reply.
+        """
+        start: Optional[float] = (
+            time.perf_counter() if self.metrics is not None else None
+        )
         print(event)
-        if self.gateway:
+        binary: bool = False
+        compact: bool = False
+        if self.gateway and self._is_binary(event):
+            binary = True
+            event_serialized = base64.b64decode(event["body"])
+        elif self.gateway:
             event_body = json.loads(event["body"])
             event_encoded = event_body["event"]
             event_serialized = base64.b64decode(event_encoded)
+        elif isinstance(event, str):
+            compact = True
+            event_serialized = base64.b64decode(event)
         else:
             event_body = event["event"]
             event_serialized = base64.b64decode(event_body)
 
         parsed_event: Event = self.ingress_router.parse(event_serialized)
-        return_route: Route = self.handle_invocation(parsed_event)
+        return_event: Event = self.execute_event(parsed_event)
 
-        while return_route.direction != RouteDirection.CLIENT:
-            return_route = self.handle_invocation(return_route.value)
+        return_event_serialized = self.egress_router.serialize(return_event)
+        return_event_encoded = base64.b64encode(return_event_serialized).decode()
 
-        return_event_serialized = self.egress_router.serialize(return_route.value)
-        return_event_encoded = base64.b64encode(return_event_serialized)
+        self.flush_metrics(start)
+        if binary:
+            return {
+                "statusCode": 200,
+                "headers": {"Content-Type": BINARY_MEDIA_TYPE},
+                "isBase64Encoded": True,
+                "body": return_event_encoded,
+            }
+        elif compact:
+            return return_event_encoded
 
         return {
             "statusCode": 200,
-            "body": json.dumps({"event": return_event_encoded.decode()}),
+            "body": json.dumps({"event": return_event_encoded}),
         }
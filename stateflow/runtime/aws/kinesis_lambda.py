@@ -1,16 +1,23 @@
 from stateflow.runtime.aws.abstract_lambda import (
     AWSLambdaRuntime,
-    Route,
-    RouteDirection,
     Event,
     SerDe,
     PickleSerializer,
     Dataflow,
     Config,
+    StateCache,
+    MetricsCollector,
 )
+from stateflow.util.kinesis_buffer import KinesisBuffer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Set, Tuple
 import base64
+import logging
+import time
 import boto3
 
+logger = logging.getLogger(__name__)
+
 
 class AWSKinesisLambdaRuntime(AWSLambdaRuntime):
     def __init__(
@@ -21,29 +28,230 @@ class AWSKinesisLambdaRuntime(AWSLambdaRuntime):
         reply_stream="stateflow-reply",
         serializer: SerDe = PickleSerializer(),
         config: Config = Config(region_name="eu-west-1"),
+        optimistic: bool = False,
+        state_cache: Optional[StateCache] = None,
+        prefetch: bool = False,
+        metrics: Optional[MetricsCollector] = None,
+        table_per_operator: bool = False,
+        composite_key: bool = False,
+        max_workers: int = 8,
     ):
-        super().__init__(flow, table_name, serializer, config)
+        """Initializes a Lambda runtime which consumes requests from Kinesis.
+
+        The records of an invocation are grouped by the key they target. Groups are executed concurrently
+        with a thread pool, the events within a group are executed in order. In optimistic mode, all events
+        of a group are executed as a single transaction, so the state of a key is read and written once per group.
+        Events of which the flows (statically) share keys are grouped together as well, so that concurrent groups
+        don't conflict on these keys. A group touches at most MAX_TRANSACTION_ITEMS keys, events which would exceed
+        this are executed one by one after all groups.
+
+        A failing group does not fail the whole invocation, only the records of its events are reported
+        as `batchItemFailures` (this requires `ReportBatchItemFailures` on the event source mapping).
+        Other groups are committed and replied to. Kinesis retries from the first failed record, so
+        later records of the batch are redelivered and executed again.
+
+        :param max_workers: the maximum amount of groups executed concurrently.
+        See AWSLambdaRuntime for the other parameters.
+        """
+        super().__init__(
+            flow,
+            table_name,
+            serializer,
+            config,
+            optimistic,
+            state_cache=state_cache,
+            prefetch=prefetch,
+            metrics=metrics,
+            table_per_operator=table_per_operator,
+            composite_key=composite_key,
+        )
 
         self.kinesis = self._setup_kinesis(config)
+        self.reply_buffer: KinesisBuffer = KinesisBuffer(self.kinesis)
         self.request_stream: str = request_stream
         self.reply_stream: str = reply_stream
 
+        # The pool lives across warm invocations.
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers)
+
     def _setup_kinesis(self, config: Config):
         return boto3.client("kinesis", config=config)
 
+    def _group_key(self, event: Event) -> str:
+        # Events creating an instance without a known key, can't be grouped.
+        if event.fun_address.key is None:
+            return event.event_id
+
+        return (
+            f"{event.fun_address.function_type.get_full_name()}_{event.fun_address.key}"
+        )
+
+    def _group_events(
+        self, events: List[Event]
+    ) -> Tuple[List[List[Event]], List[Event]]:
+        """Groups events by their target key, preserving the order of events within a group.
+        In optimistic mode, groups sharing any key of their flows are merged, as long as the merged group
+        touches at most MAX_TRANSACTION_ITEMS keys (i.e. the limit of a single transaction).
+        Events which can't be merged, and all later events touching any of their keys, are executed sequentially.
+
+        :param events: the events to group.
+        :return: the groups, and the events to execute sequentially (in order) after all groups.
+        """
+        # A union-find over keys, each event connects its target key with all keys of its flow.
+        parents: Dict[str, str] = {}
+        # The amount of keys per group, by the root of the group.
+        sizes: Dict[str, int] = {}
+
+        def find(key: str) -> str:
+            while parents[key] != key:
+                parents[key] = parents[parents[key]]
+                key = parents[key]
+            return key
+
+        def merged_size(keys: List[str]) -> int:
+            roots: Set[str] = set([find(key) for key in keys if key in parents])
+            return sum([sizes[root] for root in roots]) + len(
+                [key for key in keys if key not in parents]
+            )
+
+        event_keys: List[str] = []
+        grouped_events: List[Event] = []
+        sequential_keys: Set[str] = set()
+        sequential_events: List[Event] = []
+        for event in events:
+            keys: List[str] = [self._group_key(event)]
+            if self.optimistic:
+                keys = list(dict.fromkeys(keys + self.flow_keys(event)))
+
+                if (
+                    any([key in sequential_keys for key in keys])
+                    or merged_size(keys) > self.MAX_TRANSACTION_ITEMS
+                ):
+                    sequential_keys.update(keys)
+                    sequential_events.append(event)
+                    continue
+
+            for key in keys:
+                if key not in parents:
+                    parents[key] = key
+                    sizes[key] = 1
+            for key in keys[1:]:
+                root, other_root = find(keys[0]), find(key)
+                if root != other_root:
+                    parents[other_root] = root
+                    sizes[root] += sizes.pop(other_root)
+
+            event_keys.append(keys[0])
+            grouped_events.append(event)
+
+        groups: Dict[str, List[Event]] = {}
+        for event, key in zip(grouped_events, event_keys):
+            groups.setdefault(find(key), []).append(event)
+
+        return list(groups.values()), sequential_events
+
+    def _execute_group(self, events: List[Event]) -> Tuple[List[Event], List[Event]]:
+        """Executes the events of a group in order. If an event fails, the group stops executing.
+
+        :param events: the events of the group.
+        :return: the replies of the executed events, and the events which failed or were not executed.
+        """
+        if self.optimistic:
+            try:
+                return self._execute_transaction(events), []
+            except Exception:
+                logger.exception(f"Failed to execute a group of {len(events)} events.")
+                return [], events
+
+        replies: List[Event] = []
+        for i, event in enumerate(events):
+            try:
+                replies.append(self._execute_flow(event))
+            except Exception:
+                logger.exception(f"Failed to execute event {event.event_id}.")
+                return replies, events[i:]
+
+        return replies, []
+
     def handle(self, event, context):
-        for record in event["Records"]:
-            event = base64.b64decode(record["kinesis"]["data"])
+        start: Optional[float] = (
+            time.perf_counter() if self.metrics is not None else None
+        )
+        parsed_events: List[Event] = [
+            self.ingress_router.parse(base64.b64decode(record["kinesis"]["data"]))
+            for record in event["Records"]
+        ]
 
-            parsed_event: Event = self.ingress_router.parse(event)
-            return_route: Route = self.handle_invocation(parsed_event)
+        # Batches are unpacked, so that their events are grouped with other events for the same key.
+        groups, sequential_events = self._group_events(
+            [
+                sub_event
+                for parsed_event in parsed_events
+                for sub_event in parsed_event.unpack()
+            ]
+        )
 
-            while return_route.direction != RouteDirection.CLIENT:
-                return_route = self.handle_invocation(return_route.value)
+        replies: Dict[str, Event] = {}
+        failed_events: List[Event] = []
+        for group_replies, group_failed_events in self.executor.map(
+            self._execute_group, groups
+        ):
+            for reply in group_replies:
+                replies[reply.event_id] = reply
+            failed_events.extend(group_failed_events)
 
-            serialized_event = self.egress_router.serialize(return_route.value)
-            self.kinesis.put_record(
-                StreamName=self.reply_stream,
-                Data=serialized_event,
-                PartitionKey=return_route.value.event_id,
+        # Sequential events might touch the keys of earlier ones, so all events after a failure are retried.
+        for i, sequential_event in enumerate(sequential_events):
+            sequential_replies, sequential_failed_events = self._execute_group(
+                [sequential_event]
             )
+            for reply in sequential_replies:
+                replies[reply.event_id] = reply
+            if len(sequential_failed_events) > 0:
+                failed_events.extend(sequential_events[i:])
+                break
+
+        failed_event_ids: Set[str] = set(
+            [failed_event.event_id for failed_event in failed_events]
+        )
+        batch_item_failures: List[Dict] = []
+        for record, parsed_event in zip(event["Records"], parsed_events):
+            if any(
+                [
+                    sub_event.event_id in failed_event_ids
+                    for sub_event in parsed_event.unpack()
+                ]
+            ):
+                batch_item_failures.append(
+                    {"itemIdentifier": record["kinesis"]["sequenceNumber"]}
+                )
+                continue
+
+            if parsed_event.is_batch():
+                return_event: Event = Event.pack(
+                    parsed_event.event_id,
+                    parsed_event.fun_address,
+                    [
+                        replies[sub_event.event_id]
+                        for sub_event in parsed_event.unpack()
+                    ],
+                    reply=True,
+                    reply_to=parsed_event.reply_to,
+                )
+            else:
+                return_event: Event = replies[parsed_event.event_id]
+
+            serialized_event = self.egress_router.serialize(return_event)
+            # A client might have registered its own reply stream.
+            reply_stream: str = (
+                return_event.reply_to.topic
+                if return_event.reply_to
+                else self.reply_stream
+            )
+            self.reply_buffer.put(reply_stream, serialized_event, return_event.event_id)
+
+        # Replies are sent in batches, once all records of this invocation are handled.
+        self.reply_buffer.flush()
+        self.flush_metrics(start)
+
+        return {"batchItemFailures": batch_item_failures}
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import threading
+import time
+
+
+class StateCache:
+    """An in-memory LRU cache of versioned state.
+
+    A Lambda runtime is constructed once per container, so this cache lives across warm invocations.
+    Entries are evicted least-recently-used first, once the maximum amount of entries or bytes is exceeded.
+    Cached state might be stale (i.e. updated by another container). For writes, this is detected when the
+    state is committed with a conditional write on its version. Reads are not validated, instead each entry
+    expires `ttl` seconds after it was cached. A read-only event therefore observes state which is at most
+    `ttl` seconds old. The cache is thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: Optional[float] = 1.0,
+    ):
+        """Initializes a state cache.
+
+        :param max_entries: the maximum amount of cached keys.
+        :param max_bytes: the maximum total size (in bytes) of the cached keys and state.
+        :param ttl: the time (in seconds) after which an entry expires, this bounds the staleness of reads.
+            If None, entries never expire and read-only events might observe arbitrarily stale state.
+        """
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.ttl: Optional[float] = ttl
+
+        self.entries: OrderedDict = OrderedDict()
+        self.size: int = 0
+        self.lock = threading.RLock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: str) -> Optional[Tuple[bytes, int]]:
+        """Gets the cached state and version of a key.
+
+        :param key: the key.
+        :return: the state and version, or None if the key is not cached or its entry expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if (
+                entry is not None
+                and entry[2] is not None
+                and entry[2] <= time.monotonic()
+            ):
+                self.invalidate(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key: str, state: bytes, version: int):
+        """Caches the state of a key, evicting the least recently used keys if necessary.
+
+        :param key: the key.
+        :param state: the state.
+        :param version: the version of the state.
+        """
+        with self.lock:
+            self.invalidate(key)
+
+            entry_size: int = self._entry_size(key, state)
+            if entry_size > self.max_bytes:
+                return
+
+            expires_at: Optional[float] = (
+                time.monotonic() + self.ttl if self.ttl is not None else None
+            )
+            self.entries[key] = (state, version, expires_at)
+            self.size += entry_size
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                evicted_key, (evicted_state, _, _) = self.entries.popitem(last=False)
+                self.size -= self._entry_size(evicted_key, evicted_state)
+
+    def invalidate(self, key: str):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= self._entry_size(key, entry[0])
+
+    def _entry_size(self, key: str, state: bytes) -> int:
+        return len(key) + len(state)
+
+    def __len__(self) -> int:
+        return len(self.entries)
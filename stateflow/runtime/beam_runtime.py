@@ -1,15 +1,19 @@
-import uuid
-
 from apache_beam import DoFn
-from apache_beam.coders import BytesCoder
+from apache_beam.coders import Coder, FastPrimitivesCoder
 from apache_beam.transforms.userstate import ReadModifyWriteStateSpec
 import apache_beam as beam
-from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.options.pipeline_options import (
+    PipelineOptions,
+    StandardOptions,
+    DirectOptions,
+    FlinkRunnerOptions,
+)
 from beam_nuggets.io import kafkaio
 
 from stateflow.runtime.KafkaConsumer import KafkaConsume, KafkaProduce
+from stateflow.runtime.kafka_config import KafkaConfig
 from stateflow.dataflow.stateful_operator import StatefulOperator, Operator
-from typing import List, Tuple, Any, Union
+from typing import List, Tuple, Any, Union, Optional, Dict, Callable
 from stateflow.serialization.json_serde import JsonSerializer, SerDe
 from stateflow.runtime.runtime import Runtime
 from stateflow.dataflow.dataflow import (
@@ -19,41 +23,69 @@ from stateflow.dataflow.dataflow import (
     RouteDirection,
     EgressRouter,
 )
-from stateflow.dataflow.event import EventType
+from stateflow.dataflow.event import EventType, Event
+from stateflow.dataflow.state import State
 from apache_beam import pvalue
+import hashlib
 from apache_beam.testing.test_pipeline import TestPipeline
 
+# The output tag of all operator events, in the multiplexed layout.
+OPERATORS_OUTPUT = "operators"
+
+# The runners which execute a pipeline (in-process or in worker processes) on the local machine.
+DIRECT_RUNNERS = ["DirectRunner", "SwitchingDirectRunner", "BundleBasedDirectRunner"]
+
+# The runners which are configured using the Flink runner options.
+FLINK_RUNNERS = ["FlinkRunner", "PortableRunner"]
+
 
 class IngressBeamRouter(DoFn):
     def __init__(
-        self, operators: List[Operator], router: IngressRouter, egress: EgressRouter
+        self,
+        operators: List[Operator],
+        router: IngressRouter,
+        egress: EgressRouter,
+        multiplexed: bool = False,
     ):
         self.operators: List[Operator] = operators
         self.router: IngressRouter = router
         self.egress: EgressRouter = egress
+        self.multiplexed: bool = multiplexed
         self.outputs = set()
 
-        for operator in self.operators:
-            if isinstance(operator, StatefulOperator):
-                name: str = operator.function_type.get_full_name()
-                self.outputs.add(f"{name}")
+        if self.multiplexed:
+            self.outputs.add(OPERATORS_OUTPUT)
+        else:
+            for operator in self.operators:
+                if isinstance(operator, StatefulOperator):
+                    name: str = operator.function_type.get_full_name()
+                    self.outputs.add(f"{name}")
 
         self.outputs.add("client")
         self.outputs.add("internal")
 
     def process(self, element: Tuple[bytes, bytes]) -> Union[Tuple[str, Any], Any]:
-        route: Route = self.router.parse_and_route(element[1])
-
-        if route.direction == RouteDirection.EGRESS:
-            egress_route = self.egress.route_and_serialize(route.value)
-            if egress_route.direction == RouteDirection.CLIENT:
-                yield pvalue.TaggedOutput("client", (route.key, egress_route.value))
-            elif egress_route.direction == RouteDirection.INTERNAL:
-                yield pvalue.TaggedOutput("internal", (route.key, egress_route.value))
-        elif route.direction == RouteDirection.INTERNAL:
-            yield pvalue.TaggedOutput(route.route_name, (route.key, route.value))
-        else:
-            raise AttributeError(f"Unknown route direction {route.direction}.")
+        # A batch is unpacked here, each event in the batch is routed (and replied to) individually.
+        for route in self.router.parse_and_route_all(element[1]):
+            if route.direction == RouteDirection.EGRESS:
+                egress_route = self.egress.route_and_serialize(route.value)
+                if egress_route.direction == RouteDirection.CLIENT:
+                    yield pvalue.TaggedOutput(
+                        "client",
+                        (route.key, egress_route.value, egress_route.reply_to),
+                    )
+                elif egress_route.direction == RouteDirection.INTERNAL:
+                    yield pvalue.TaggedOutput(
+                        "internal", (route.key, egress_route.value)
+                    )
+            elif route.direction == RouteDirection.INTERNAL and self.multiplexed:
+                yield pvalue.TaggedOutput(
+                    OPERATORS_OUTPUT, ((route.route_name, route.key), route.value)
+                )
+            elif route.direction == RouteDirection.INTERNAL:
+                yield pvalue.TaggedOutput(route.route_name, (route.key, route.value))
+            else:
+                raise AttributeError(f"Unknown route direction {route.direction}.")
 
 
 class BeamInitOperator(DoFn):
@@ -70,36 +102,192 @@ class BeamInitOperator(DoFn):
             yield return_event.fun_address.key, return_event
 
 
+class BeamMultiplexedInitOperator(DoFn):
+    """Creates instances of all operators, for the multiplexed layout.
+
+    Elements are keyed by (operator name, instance key).
+    """
+
+    def __init__(self, operators: List[StatefulOperator]):
+        self.operators: Dict[str, StatefulOperator] = {
+            operator.function_type.get_full_name(): operator for operator in operators
+        }
+
+    @beam.typehints.with_input_types(Tuple[Tuple[str, str], Any])
+    def process(
+        self, element: Tuple[Tuple[str, str], Any]
+    ) -> Tuple[Tuple[str, str], Any]:
+        (name, key), event = element
+        if event.event_type != EventType.Request.InitClass:
+            yield (name, key), event
+        else:
+            return_event = self.operators[name].handle_create(event)
+            yield (name, return_event.fun_address.key), return_event
+
+
+class DeduplicatedState:
+    """The `State` of an instance, with the outputs of its last events (by deduplication id)."""
+
+    __slots__ = "state", "outputs"
+
+    def __init__(self, state: Optional[State], outputs: Dict[str, Tuple[str, Tuple]]):
+        self.state: Optional[State] = state
+        self.outputs: Dict[str, Tuple[str, Tuple]] = outputs
+
+
+class StateCoder(Coder):
+    """Encodes the (deserialized) `State` of an operator in Beam state, or its `DeduplicatedState`."""
+
+    def __init__(self):
+        self.coder = FastPrimitivesCoder()
+
+    def encode(self, state: Union[State, DeduplicatedState]) -> bytes:
+        if isinstance(state, DeduplicatedState):
+            return self.coder.encode(
+                (state.state.get() if state.state else None, state.outputs)
+            )
+        return self.coder.encode(state.get())
+
+    def decode(self, encoded: bytes) -> Union[State, DeduplicatedState]:
+        decoded = self.coder.decode(encoded)
+        if isinstance(decoded, tuple):
+            data, outputs = decoded
+            return DeduplicatedState(State(data) if data is not None else None, outputs)
+        return State(decoded)
+
+    def is_deterministic(self) -> bool:
+        return False
+
+
 class BeamOperator(DoFn):
-    STATE_SPEC = ReadModifyWriteStateSpec("state", BytesCoder())
+    """Executes the events of a stateful operator, keyed by instance.
+
+    State is kept deserialized: within a bundle, Beam reads (and decodes) the state of a key once and caches
+    the written `State` object. It is only encoded once, when the bundle is committed.
+    Therefore, multiple events for the same key in a bundle do not (de)serialize state per event.
+
+    If `dedup_window` > 0, the outputs of the last `dedup_window` events of a key are kept in state.
+    A duplicate of one of these events (e.g. replayed from Kafka after a restart) is not executed again,
+    instead its original output is sent again. The outputs are kept in the same state cell as the instance,
+    a separate cell (i.e. an extra state request per key and bundle) roughly halves the throughput.
+    """
+
+    STATE_SPEC = ReadModifyWriteStateSpec("state", StateCoder())
 
     def __init__(
-        self, operator: StatefulOperator, serializer: SerDe, router: EgressRouter
+        self,
+        operator: StatefulOperator,
+        serializer: SerDe,
+        router: EgressRouter,
+        dedup_window: int = 0,
     ):
         self.operator = operator
         self.serializer = serializer
         self.router = router
+        self.dedup_window: int = dedup_window
 
     @beam.typehints.with_input_types(Tuple[str, Any])
     def process(
-        self, element: Tuple[str, Any], operator_state=DoFn.StateParam(STATE_SPEC)
+        self,
+        element: Tuple[str, Any],
+        operator_state=DoFn.StateParam(STATE_SPEC),
     ) -> Tuple[str, Any]:
-        original_state = operator_state.read()
-        return_event, updated_state = self.operator.handle(element[1], original_state)
+        return self._handle(self.operator, element[1], operator_state)
 
-        # Update state.
-        if updated_state is not original_state:
-            operator_state.write(updated_state)
+    def _deduplication_id(self, event: Event) -> str:
+        """Returns the id of an event, to recognize its duplicates.
+
+        All events of an event flow share the same event id, so the (serialized) flow is included.
+        Duplicates have an equal flow, whereas the next step (or iteration) of a flow has not.
+
+        :param event: the incoming event, before it is handled.
+        :return: the deduplication id.
+        """
+        if event.event_type != EventType.Request.EventFlow:
+            return event.event_id
+
+        flow: Union[bytes, str] = self.serializer.serialize_dict(
+            event.payload["flow"].to_dict()
+        )
+        if isinstance(flow, str):  # The JSON serializer returns a string.
+            flow = flow.encode()
+
+        digest: str = hashlib.blake2b(flow, digest_size=16).hexdigest()
+        return f"{event.event_id}:{digest}"
+
+    def _handle(
+        self, operator: StatefulOperator, event: Event, operator_state
+    ) -> Tuple[str, Any]:
+        original_state: Optional[Union[State, DeduplicatedState]] = (
+            operator_state.read()
+        )
+        deduplicated: Optional[DeduplicatedState] = None
+        if isinstance(original_state, DeduplicatedState):
+            deduplicated, original_state = original_state, original_state.state
+
+        dedup_id: Optional[str] = None
+        if self.dedup_window > 0:
+            dedup_id = self._deduplication_id(event)
+            if deduplicated is not None and dedup_id in deduplicated.outputs:
+                tag, output = deduplicated.outputs[dedup_id]
+                yield pvalue.TaggedOutput(tag, output)
+                return
+
+        return_event, updated_state = operator.handle_state(event, original_state)
 
         route = self.router.route_and_serialize(return_event)
 
         if route.direction == RouteDirection.CLIENT:
-            yield pvalue.TaggedOutput("client", (route.key, route.value))
+            tag, output = "client", (route.key, route.value, route.reply_to)
         elif route.direction == RouteDirection.INTERNAL:
-            yield pvalue.TaggedOutput("internal", (route.key, route.value))
+            tag, output = "internal", (route.key, route.value)
         else:
             raise AttributeError(f"Unknown route direction {route.direction}.")
 
+        # Update state, state might be updated in-place so we always write it (it is encoded at the end of the bundle).
+        if dedup_id is not None and (updated_state or original_state):
+            # The output is written together with the state update, the oldest output is evicted.
+            if deduplicated is None:
+                deduplicated = DeduplicatedState(None, {})
+            if updated_state is not None:
+                deduplicated.state = updated_state
+
+            deduplicated.outputs[dedup_id] = (tag, output)
+            if len(deduplicated.outputs) > self.dedup_window:
+                del deduplicated.outputs[next(iter(deduplicated.outputs))]
+            operator_state.write(deduplicated)
+        elif updated_state is not None:
+            operator_state.write(updated_state)
+
+        yield pvalue.TaggedOutput(tag, output)
+
+
+class BeamMultiplexedOperator(BeamOperator):
+    """Executes the events of all stateful operators, in a single stateful DoFn.
+
+    Elements are keyed by (operator name, instance key), so that state is namespaced per operator.
+    """
+
+    def __init__(
+        self,
+        operators: List[StatefulOperator],
+        serializer: SerDe,
+        router: EgressRouter,
+        dedup_window: int = 0,
+    ):
+        super().__init__(None, serializer, router, dedup_window)
+        self.operators: Dict[str, StatefulOperator] = {
+            operator.function_type.get_full_name(): operator for operator in operators
+        }
+
+    @beam.typehints.with_input_types(Tuple[Tuple[str, str], Any])
+    def process(
+        self,
+        element: Tuple[Tuple[str, str], Any],
+        operator_state=DoFn.StateParam(BeamOperator.STATE_SPEC),
+    ) -> Tuple[str, Any]:
+        return self._handle(self.operators[element[0][0]], element[1], operator_state)
+
 
 class BeamRuntime(Runtime):
     def __init__(
@@ -108,17 +296,56 @@ class BeamRuntime(Runtime):
         serializer: SerDe = JsonSerializer(),
         test_mode=False,
         timeout=-1,
+        config: Optional[KafkaConfig] = None,
+        multiplexed: bool = False,
+        source: Optional[beam.PTransform] = None,
+        sink: Optional[Callable[[str], beam.PTransform]] = None,
+        pipeline_options: Optional[PipelineOptions] = None,
+        runner: Optional[str] = None,
+        parallelism: Optional[int] = None,
+        dedup_window: int = 0,
     ):
+        """Initializes a Beam runtime.
+
+        :param dataflow: the dataflow to execute.
+        :param serializer: the serializer for events.
+        :param test_mode: if True, a test pipeline is used and its outputs are kept in `test_output`.
+        :param timeout: if not -1, the amount of seconds after which the Kafka consumer stops.
+        :param config: the Kafka configuration.
+        :param multiplexed: if True, all stateful operators are executed by a single stateful DoFn (keyed by
+            operator and instance). Otherwise, each operator has its own stages. The multiplexed layout keeps the pipeline small if there are many operators.
+        :param source: the transform which reads (key, value) tuples from the request and internal topic,
+            by default Kafka is consumed.
+        :param sink: a function from a topic to the transform which writes (key, value[, reply_to]) tuples
+            to that topic, by default these are produced to Kafka.
+        :param pipeline_options: the options of the pipeline, e.g. `PipelineOptions(["--flink_master=localhost:8081"])`.
+        :param runner: the runner, e.g. "DirectRunner" or "FlinkRunner". Overrides the runner in `pipeline_options`.
+        :param parallelism: the amount of workers of the DirectRunner (in separate processes), or the parallelism
+            of the Flink runner. Overrides the corresponding setting in `pipeline_options`.
+        :param dedup_window: the amount of events per key of which the output is kept, to recognize duplicates
+            (e.g. replayed after a restart). A duplicate is not executed again, its original output is sent again.
+            If 0, events are not deduplicated.
+        """
         self.init_operators: List[BeamInitOperator] = []
         self.operators: List[BeamOperator] = []
 
         self.serializer = serializer
         self.egress_router = EgressRouter(serializer)
+        self.multiplexed: bool = multiplexed
         self.ingress_router = IngressBeamRouter(
-            dataflow.operators, IngressRouter(serializer), self.egress_router
+            dataflow.operators,
+            IngressRouter(serializer),
+            self.egress_router,
+            multiplexed=multiplexed,
         )
 
         self.pipeline: beam.Pipeline = None
+        self.config: KafkaConfig = config or KafkaConfig()
+        self.source: Optional[beam.PTransform] = source
+        self.sink: Optional[Callable[[str], beam.PTransform]] = sink
+        self.pipeline_options: PipelineOptions = pipeline_options or PipelineOptions()
+        self.runner: Optional[str] = runner
+        self.parallelism: Optional[int] = parallelism
 
         # Test-related variables.
         # If enabled, we keep track of the output collections.
@@ -131,37 +358,78 @@ class BeamRuntime(Runtime):
             operator.meta_wrapper = None  # We set this meta wrapper to None, we don't need it in the runtime.
             self.init_operators.append(BeamInitOperator(operator))
             self.operators.append(
-                BeamOperator(operator, self.serializer, self.egress_router)
+                BeamOperator(
+                    operator, self.serializer, self.egress_router, dedup_window
+                )
             )
 
-    def _setup_kafka_client(self) -> KafkaConsume:
+        self.multiplexed_init_operator = BeamMultiplexedInitOperator(dataflow.operators)
+        self.multiplexed_operator = BeamMultiplexedOperator(
+            dataflow.operators, self.serializer, self.egress_router, dedup_window
+        )
+
+    def _setup_kafka_client(self) -> beam.PTransform:
+        if self.source is not None:
+            return self.source
+
         return KafkaConsume(
             consumer_config={
-                "bootstrap.servers": "localhost:9092",
-                "auto.offset.reset": "latest",
-                "group.id": str(uuid.uuid4()),
-                "topic": ["client_request", "internal"],
+                **self.config.consumer_config(),
+                "topic": self.config.input_topics(),
             },
             value_decoder=bytes,
             timeout=self.timeout,
         )
 
-    def _setup_kafka_producer(self, topic: str) -> kafkaio.KafkaProduce:
+    def _setup_kafka_producer(self, topic: str) -> beam.PTransform:
+        if self.sink is not None:
+            return self.sink(topic)
+
         return KafkaProduce(
-            servers="localhost:9092",
+            servers=self.config.brokers,
             topic=topic,
+            producer_config=self.config.producer_config(),
         )
 
+    def _setup_pipeline_options(self) -> PipelineOptions:
+        options: PipelineOptions = self.pipeline_options
+        standard_options: StandardOptions = options.view_as(StandardOptions)
+        if self.runner is not None:
+            standard_options.runner = self.runner
+
+        runner: str = standard_options.runner or "DirectRunner"
+        if runner in DIRECT_RUNNERS:
+            if self.parallelism is not None:
+                direct_options: DirectOptions = options.view_as(DirectOptions)
+                direct_options.direct_num_workers = self.parallelism
+                # A running mode set in the pipeline options (e.g. multi_threading) is kept.
+                if "direct_running_mode" not in options.get_all_options(
+                    drop_default=True
+                ):
+                    direct_options.direct_running_mode = "multi_processing"
+        else:
+            # Kafka is an unbounded source, other runners have to execute the pipeline in streaming mode.
+            standard_options.streaming = True
+
+            if self.parallelism is not None and runner in FLINK_RUNNERS:
+                options.view_as(FlinkRunnerOptions).parallelism = self.parallelism
+            elif self.parallelism is not None:
+                raise AttributeError(
+                    f"Parallelism is not supported for the {runner}, set it in the pipeline options."
+                )
+
+        return options
+
     def _setup_pipeline(self):
         if self.test_mode:
             pipeline = beam.testing.test_pipeline.TestPipeline(blocking=False)
         else:
-            pipeline = beam.Pipeline(options=PipelineOptions())
+            pipeline = beam.Pipeline(options=self._setup_pipeline_options())
 
         # Setup KafkaIO.
         kafka_client = self._setup_kafka_client()
-        kafka_producer = self._setup_kafka_producer("client_reply")
-        kafka_producer_internal = self._setup_kafka_producer("internal")
+        kafka_producer = self._setup_kafka_producer(self.config.reply_topic)
+        kafka_producer_internal = self._setup_kafka_producer(self.config.internal_topic)
 
         # Read from Kafka and route
         input_and_router = (
@@ -172,6 +440,20 @@ class BeamRuntime(Runtime):
             )
         )
 
+        if self.multiplexed:
+            self._setup_multiplexed_operators(
+                input_and_router, kafka_producer, kafka_producer_internal
+            )
+        else:
+            self._setup_operators(
+                input_and_router, kafka_producer, kafka_producer_internal
+            )
+
+        self.pipeline = pipeline
+
+    def _setup_operators(
+        self, input_and_router, kafka_producer, kafka_producer_internal
+    ):
         for operator, init_operator in zip(self.operators, self.init_operators):
             name = operator.operator.function_type.get_full_name()
 
@@ -203,7 +485,34 @@ class BeamRuntime(Runtime):
         ] | "egress_internal_router" >> kafka_producer_internal
         input_and_router["client"] | "egress_client_router" >> kafka_producer
 
-        self.pipeline = pipeline
+    def _setup_multiplexed_operators(
+        self, input_and_router, kafka_producer, kafka_producer_internal
+    ):
+        operator_pipeline = (
+            input_and_router[OPERATORS_OUTPUT]
+            | "operators_init" >> beam.ParDo(self.multiplexed_init_operator)
+            | "operators_stateful"
+            >> beam.ParDo(self.multiplexed_operator).with_outputs("client", "internal")
+        )
+
+        # Both outputs are produced directly, the (streaming) DirectRunner holds back the output of a Flatten.
+        external_outputs = (
+            operator_pipeline["client"] | "kafka" >> kafka_producer,
+            input_and_router["client"] | "egress_client_router" >> kafka_producer,
+        )
+        internal_outputs = (
+            operator_pipeline["internal"] | "kafka_internal" >> kafka_producer_internal,
+            input_and_router["internal"]
+            | "egress_internal_router" >> kafka_producer_internal,
+        )
+
+        if self.test_mode:
+            self.test_output["external"] = external_outputs | "flatten_client" >> (
+                beam.Flatten()
+            )
+            self.test_output["internal"] = internal_outputs | "flatten_internal" >> (
+                beam.Flatten()
+            )
 
     def run(self, async_execution=False):
         print("Running Beam pipeline!")
@@ -2,6 +2,7 @@ from stateflow.runtime.runtime import Runtime
 from pyflink.datastream import (
     RuntimeContext,
     MapFunction,
+    FlatMapFunction,
     StreamExecutionEnvironment,
     DataStream,
 )
@@ -29,8 +30,8 @@ from stateflow.dataflow.dataflow import (
     RouteDirection,
 )
 from stateflow.serialization.json_serde import SerDe, JsonSerializer
-from typing import List
-import uuid
+from stateflow.runtime.kafka_config import KafkaConfig
+from typing import List, Optional
 
 
 class ByteSerializer(SerializationSchema, DeserializationSchema):
@@ -49,16 +50,17 @@ class ByteSerializer(SerializationSchema, DeserializationSchema):
         )
 
 
-class FlinkIngressRouter(MapFunction):
+class FlinkIngressRouter(FlatMapFunction):
     def __init__(self, router: IngressRouter):
         self.router = router
 
-    def map(self, value) -> Route:
-        route = self.router.parse_and_route(value)
-        import logging
+    def flat_map(self, value) -> Route:
+        # A batch is unpacked here, each event in the batch is routed individually.
+        for route in self.router.parse_and_route_all(value):
+            import logging
 
-        logging.info(f"Ingress operator, return route {route}")
-        return route
+            logging.info(f"Ingress operator, return route {route}")
+            yield route
 
 
 class FlinkEgressRouter(MapFunction):
@@ -115,10 +117,27 @@ class FlinkOperator(KeyedProcessFunction):
 
 
 class FlinkRuntime(Runtime):
-    def __init__(self, dataflow: Dataflow, serializer: SerDe = JsonSerializer()):
+    def __init__(
+        self,
+        dataflow: Dataflow,
+        serializer: SerDe = JsonSerializer(),
+        config: Optional[KafkaConfig] = None,
+        loopback: bool = False,
+    ):
+        """Initializes a Flink runtime.
+
+        :param dataflow: the dataflow to execute.
+        :param serializer: the serializer for events.
+        :param config: the Kafka configuration.
+        :param loopback: if True, internal events are fed back to the operators through a Flink iteration,
+            instead of a round-trip through the internal Kafka topic. Note that Flink does not checkpoint
+            the records in flight in an iteration.
+        """
         super().__init__()
         self.dataflow = dataflow
         self.serializer = serializer
+        self.config: KafkaConfig = config or KafkaConfig()
+        self.loopback: bool = loopback
         self.env: StreamExecutionEnvironment = (
             StreamExecutionEnvironment.get_execution_environment()
         )
@@ -145,17 +164,13 @@ class FlinkRuntime(Runtime):
 
     def _setup_kafka_client(self) -> FlinkKafkaConsumer:
         return FlinkKafkaConsumer(
-            ["client_request", "internal"],
+            self.config.input_topics(),
             ByteSerializer(),
-            {
-                "bootstrap.servers": "localhost:9092",
-                "auto.offset.reset": "latest",
-                "group.id": str(uuid.uuid4()),
-            },
+            self.config.java_consumer_properties(),
         )
 
     def _setup_kafka_producer(self, topic: str) -> FlinkKafkaProducer:
-        kafka_props = {"bootstrap.servers": "localhost:9092"}
+        kafka_props = self.config.java_producer_properties()
         return FlinkKafkaProducer(
             topic,
             ByteSerializer(),
@@ -166,10 +181,10 @@ class FlinkRuntime(Runtime):
         # Setup all Kafka communication.
         kafka_consumer: FlinkKafkaConsumer = self._setup_kafka_client()
         kafka_producer_reply: FlinkKafkaProducer = self._setup_kafka_producer(
-            "client_reply"
+            self.config.reply_topic
         )
         kafka_producer_internal: FlinkKafkaProducer = self._setup_kafka_producer(
-            "internal"
+            self.config.internal_topic
         )
 
         # Routers
@@ -181,11 +196,16 @@ class FlinkRuntime(Runtime):
         )
 
         # Reading all Kafka messages here
-        routed_kafka_consumption: DataStream[Route] = (
-            self.env.add_source(kafka_consumer)
-            .map(ingress_router)
-            .name("Route-Incoming-Events")
-        )
+        kafka_stream: DataStream = self.env.add_source(kafka_consumer)
+
+        # Internal events are fed back to the head of an iteration, which is not (yet) exposed in PyFlink.
+        if self.loopback:
+            j_iteration = kafka_stream._j_data_stream.iterate()
+            kafka_stream = DataStream(j_iteration)
+
+        routed_kafka_consumption: DataStream[Route] = kafka_stream.flat_map(
+            ingress_router
+        ).name("Route-Incoming-Events")
 
         final_operator_streams: List[DataStream] = []
 
@@ -241,9 +261,21 @@ class FlinkRuntime(Runtime):
         ).name(f"Kafka-To-Client").add_sink(kafka_producer_reply)
 
         # Internal output
-        egress_stream.filter(lambda r: r.direction is RouteDirection.INTERNAL).map(
-            lambda r: r.value
-        ).name(f"Kafka-To-Internal").add_sink(kafka_producer_internal)
+        internal_stream: DataStream = egress_stream.filter(
+            lambda r: r.direction is RouteDirection.INTERNAL
+        )
+        if self.loopback:
+            # The feedback must have the same type as the Kafka source (i.e. serialized events as byte[]).
+            serializer: SerDe = self.serializer
+            feedback: DataStream = internal_stream.map(
+                lambda r: serializer.serialize_event(r.value),
+                output_type=Types.PRIMITIVE_ARRAY(Types.BYTE()),
+            ).name("Loopback-Internal")
+            j_iteration.closeWith(feedback._j_data_stream)
+        else:
+            internal_stream.map(lambda r: r.value).name(f"Kafka-To-Internal").add_sink(
+                kafka_producer_internal
+            )
 
         self.pipeline_initialized = True
 
@@ -65,29 +65,33 @@ class StatefunRuntime(Runtime):
 
             outgoing_route: Route = self.ingress_router.route(incoming_event)
 
-            ctx.send_egress(
-                kafka_egress_message(
-                    typename="stateflow/kafka-egress",
-                    topic=self.reply_topic,
-                    key=outgoing_route.value.event_id,
-                    value=self.egress_router.serialize(outgoing_route.value),
-                )
-            )
+            self._send_reply(ctx, outgoing_route.value)
 
         self.stateful_functions.register("globals/ping", ping_endpoint)
 
+    def _send_reply(self, ctx: Context, event: Event):
+        """Sends a reply to the client. If the client registered a reply topic, it is sent there.
+        Statefun egress messages can't target a partition, so those replies are partitioned by key.
+
+        :param ctx: the context of the function.
+        :param event: the reply event.
+        """
+        topic: str = event.reply_to.topic if event.reply_to else self.reply_topic
+
+        ctx.send_egress(
+            kafka_egress_message(
+                typename="stateflow/kafka-egress",
+                topic=topic,
+                key=event.event_id,
+                value=self.egress_router.serialize(event),
+            )
+        )
+
     def _route(self, ctx: Context, outgoing_event: Event):
         egress_route: Route = self.egress_router.route_and_serialize(outgoing_event)
 
         if egress_route.direction == RouteDirection.CLIENT:
-            ctx.send_egress(
-                kafka_egress_message(
-                    typename="stateflow/kafka-egress",
-                    topic=self.reply_topic,
-                    key=egress_route.value.event_id,
-                    value=self.egress_router.serialize(egress_route.value),
-                )
-            )
+            self._send_reply(ctx, egress_route.value)
             return
 
         ingress_route: Route = self.ingress_router.route(egress_route.value)
@@ -102,12 +106,34 @@ class StatefunRuntime(Runtime):
                 )
             )
         elif ingress_route.direction == RouteDirection.EGRESS:
-            ctx.send_egress(
-                kafka_egress_message(
-                    typename="stateflow/kafka-egress",
-                    topic=self.reply_topic,
-                    key=ingress_route.value.event_id,
-                    value=self.egress_router.serialize(ingress_route.value),
+            self._send_reply(ctx, ingress_route.value)
+
+    def _forward(self, ctx: Context, event: Event):
+        """Forwards an event (from a batch) to the function it is addressed to.
+
+        :param ctx: the context of the function which received the batch.
+        :param event: the event to forward.
+        """
+        route: Route = self.ingress_router.route(event)
+
+        if route.direction == RouteDirection.EGRESS:
+            self._send_reply(ctx, route.value)
+        elif route.key is None:
+            ctx.send(
+                message_builder(
+                    target_typename=f"{route.route_name}_create",
+                    target_id=event.event_id,
+                    value=self.egress_router.serialize(route.value),
+                    value_type=self.byte_type,
+                )
+            )
+        else:
+            ctx.send(
+                message_builder(
+                    target_typename=route.route_name,
+                    target_id=route.key,
+                    value=self.egress_router.serialize(route.value),
+                    value_type=self.byte_type,
                 )
             )
 
@@ -120,14 +146,27 @@ class StatefunRuntime(Runtime):
                 current_state = ctx.storage.state
                 incoming_event = self.serializer.deserialize_event(event_serialized)
 
-                outgoing_event, updated_state = self.operators_dict[
-                    ctx.address.typename
-                ].handle(incoming_event, current_state)
+                # Events of a batch addressed to this instance are handled here, the others are forwarded.
+                state = current_state
+                for event in incoming_event.unpack():
+                    if incoming_event.is_batch():
+                        route: Route = self.ingress_router.route(event)
+                        if (
+                            route.direction != RouteDirection.INTERNAL
+                            or route.route_name != ctx.address.typename
+                            or route.key != ctx.address.id
+                        ):
+                            self._forward(ctx, event)
+                            continue
+
+                    outgoing_event, state = self.operators_dict[
+                        ctx.address.typename
+                    ].handle(event, state)
 
-                if current_state != updated_state:
-                    ctx.storage.state = updated_state
+                    self._route(ctx, outgoing_event)
 
-                self._route(ctx, outgoing_event)
+                if current_state != state:
+                    ctx.storage.state = state
 
             self.stateful_functions.register(
                 f"{operator.function_type.get_full_name()}",
@@ -149,18 +188,23 @@ class StatefunRuntime(Runtime):
                 )
                 print(f"{ctx.address}")
 
-                outgoing_event: Event = self.operators_dict[
-                    ctx.address.typename
-                ].handle_create(incoming_event)
-
-                ctx.send(
-                    message_builder(
-                        target_typename=outgoing_event.fun_address.function_type.get_full_name(),
-                        target_id=outgoing_event.fun_address.key,
-                        value=self.egress_router.serialize(outgoing_event),
-                        value_type=self.byte_type,
+                for event in incoming_event.unpack():
+                    if event.event_type != EventType.Request.InitClass:
+                        self._forward(ctx, event)
+                        continue
+
+                    outgoing_event: Event = self.operators_dict[
+                        ctx.address.typename
+                    ].handle_create(event)
+
+                    ctx.send(
+                        message_builder(
+                            target_typename=outgoing_event.fun_address.function_type.get_full_name(),
+                            target_id=outgoing_event.fun_address.key,
+                            value=self.egress_router.serialize(outgoing_event),
+                            value_type=self.byte_type,
+                        )
                     )
-                )
 
             self.stateful_functions.register(
                 f"{operator.function_type.get_full_name()}_create", endpoint
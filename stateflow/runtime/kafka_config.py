@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from typing import Dict, Any, List
+
+
+@dataclass
+class KafkaConfig:
+    """The Kafka configuration of a (Kafka-based) runtime, i.e. the Beam and Flink runtimes.
+
+    The consumer and producer configuration is derived from these settings.
+    The Beam runtime uses `confluent_kafka` (librdkafka) clients, whereas Flink uses the Java clients.
+    Additional (client-specific) settings can be passed in `consumer_extra` and `producer_extra`.
+    """
+
+    # Cluster.
+    brokers: str = "localhost:9092"
+
+    # Topics.
+    request_topic: str = "client_request"
+    internal_topic: str = "internal"
+    reply_topic: str = "client_reply"
+
+    # Consumer settings, all instances of a runtime share the same consumer group.
+    group_id: str = "stateflow-runtime"
+    auto_offset_reset: str = "latest"
+    fetch_min_bytes: int = 1
+    fetch_max_wait_ms: int = 100
+    max_partition_fetch_bytes: int = 1048576
+
+    # Producer settings, an idempotent producer does not duplicate messages when it retries.
+    enable_idempotence: bool = True
+    linger_ms: int = 5
+    batch_size: int = 1048576
+    compression_type: str = "lz4"
+
+    consumer_extra: Dict[str, Any] = field(default_factory=dict)
+    producer_extra: Dict[str, Any] = field(default_factory=dict)
+
+    def input_topics(self) -> List[str]:
+        """Returns the topics a runtime consumes from.
+
+        :return: the request and internal topic.
+        """
+        return [self.request_topic, self.internal_topic]
+
+    def consumer_config(self) -> Dict[str, Any]:
+        """Returns the configuration of a `confluent_kafka.Consumer`.
+
+        :return: the consumer configuration.
+        """
+        return {
+            "bootstrap.servers": self.brokers,
+            "group.id": self.group_id,
+            "auto.offset.reset": self.auto_offset_reset,
+            "fetch.min.bytes": self.fetch_min_bytes,
+            "fetch.wait.max.ms": self.fetch_max_wait_ms,
+            "max.partition.fetch.bytes": self.max_partition_fetch_bytes,
+            **self.consumer_extra,
+        }
+
+    def producer_config(self) -> Dict[str, Any]:
+        """Returns the configuration of a `confluent_kafka.Producer`.
+
+        :return: the producer configuration.
+        """
+        return {
+            "bootstrap.servers": self.brokers,
+            "enable.idempotence": self.enable_idempotence,
+            "linger.ms": self.linger_ms,
+            "batch.size": self.batch_size,
+            "compression.type": self.compression_type,
+            **self.producer_extra,
+        }
+
+    def java_consumer_properties(self) -> Dict[str, str]:
+        """Returns the properties of a Java Kafka consumer (e.g. `FlinkKafkaConsumer`).
+
+        :return: the consumer properties, all values are strings.
+        """
+        return _to_properties(
+            {
+                "bootstrap.servers": self.brokers,
+                "group.id": self.group_id,
+                "auto.offset.reset": self.auto_offset_reset,
+                "fetch.min.bytes": self.fetch_min_bytes,
+                "fetch.max.wait.ms": self.fetch_max_wait_ms,
+                "max.partition.fetch.bytes": self.max_partition_fetch_bytes,
+                **self.consumer_extra,
+            }
+        )
+
+    def java_producer_properties(self) -> Dict[str, str]:
+        """Returns the properties of a Java Kafka producer (e.g. `FlinkKafkaProducer`).
+
+        :return: the producer properties, all values are strings.
+        """
+        return _to_properties(self.producer_config())
+
+
+def _to_properties(config: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        key: str(value).lower() if isinstance(value, bool) else str(value)
+        for key, value in config.items()
+    }
@@ -0,0 +1,185 @@
+from apache_beam import PTransform, ParDo, DoFn, Create, RestrictionProvider
+from apache_beam.io.restriction_trackers import OffsetRange, OffsetRestrictionTracker
+from apache_beam.utils.timestamp import Duration
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import sys
+import uuid
+
+
+class InMemoryBroker:
+    """An in-process stand-in of Kafka, which keeps its topics in memory.
+
+    The DoFns of a pipeline are (de)serialized by the runner, so they refer to a broker by its name.
+    Therefore, the broker has to live in the same process as the pipeline, e.g. with the DirectRunner.
+    Each message is stored with the (perf counter) time it was produced, which is used to measure latency.
+    """
+
+    _brokers: Dict[str, "InMemoryBroker"] = {}
+    _brokers_lock = threading.Lock()
+
+    def __init__(self, name: Optional[str] = None):
+        self.name: str = name or str(uuid.uuid4())
+        self.topics: Dict[str, List[Tuple[float, bytes, bytes]]] = {}
+        self.closed: bool = False
+        self.reads: int = 0
+        self.lock = threading.Lock()
+
+        with InMemoryBroker._brokers_lock:
+            InMemoryBroker._brokers[self.name] = self
+
+    @staticmethod
+    def get(name: str) -> "InMemoryBroker":
+        broker: Optional[InMemoryBroker] = InMemoryBroker._brokers.get(name)
+        if broker is None:
+            raise AttributeError(f"In-memory broker {name} does not exist.")
+        return broker
+
+    def produce(self, topic: str, key: bytes, value: bytes):
+        with self.lock:
+            self.topics.setdefault(topic, []).append((time.perf_counter(), key, value))
+
+    def read(
+        self, topic: str, offset: int, max_messages: int
+    ) -> List[Tuple[float, bytes, bytes]]:
+        """Reads the messages of a topic from an offset.
+
+        :param topic: the topic.
+        :param offset: the offset of the first message.
+        :param max_messages: the maximum amount of messages.
+        :return: the messages, as (produce time, key, value).
+        """
+        with self.lock:
+            self.reads += 1
+            return self.topics.get(topic, [])[offset : offset + max_messages]
+
+    def close(self):
+        """Closes the broker, sources stop reading once they have read all messages."""
+        self.closed = True
+
+    def remove(self):
+        with InMemoryBroker._brokers_lock:
+            InMemoryBroker._brokers.pop(self.name, None)
+
+
+class InMemoryConsume(PTransform):
+    """A :class:`~apache_beam.transforms.ptransform.PTransform` for reading from the topics of an `InMemoryBroker`.
+
+    It outputs (key, value) tuples like `KafkaConsume`, and reads until the broker is closed.
+    """
+
+    def __init__(
+        self,
+        broker_name: str,
+        topics: List[str],
+        max_buffer_size: int = 500,
+        checkpoint_interval: float = 0.05,
+    ):
+        super(InMemoryConsume, self).__init__()
+        self.broker_name: str = broker_name
+        self.topics: List[str] = topics
+        self.max_buffer_size: int = max_buffer_size
+        self.checkpoint_interval: float = checkpoint_interval
+
+    def expand(self, pcoll):
+        return (
+            pcoll
+            | "memory_topics" >> Create(self.topics)
+            | "memory_read_topics"
+            >> ParDo(
+                _ConsumeInMemoryTopic(
+                    self.broker_name, self.max_buffer_size, self.checkpoint_interval
+                )
+            )
+        )
+
+
+class _InMemoryTopicRestrictionProvider(RestrictionProvider):
+    def initial_restriction(self, element: str) -> OffsetRange:
+        return OffsetRange(0, sys.maxsize)
+
+    def create_tracker(self, restriction: OffsetRange) -> OffsetRestrictionTracker:
+        return OffsetRestrictionTracker(restriction)
+
+    def split(self, element: str, restriction: OffsetRange):
+        yield restriction
+
+    def restriction_size(self, element: str, restriction: OffsetRange) -> int:
+        return 1
+
+
+class _ConsumeInMemoryTopic(DoFn):
+    """Internal (splittable) ``DoFn`` to read an in-memory topic.
+
+    If there are no new messages, the remainder of the topic is deferred, so that other topics can be read.
+    """
+
+    # The time (in seconds) to wait for new messages, before deferring.
+    IDLE_WAIT = 0.001
+
+    def __init__(
+        self, broker_name: str, max_buffer_size: int, checkpoint_interval: float
+    ):
+        self.broker_name: str = broker_name
+        self.max_buffer_size: int = max_buffer_size
+        self.checkpoint_interval: float = checkpoint_interval
+
+    @DoFn.unbounded_per_element()
+    def process(
+        self,
+        topic: str,
+        tracker=DoFn.RestrictionParam(_InMemoryTopicRestrictionProvider()),
+    ):
+        broker: InMemoryBroker = InMemoryBroker.get(self.broker_name)
+        restriction: OffsetRange = tracker.current_restriction()
+        offset: int = restriction.start
+        checkpoint_time: float = time.time() + self.checkpoint_interval
+
+        while time.time() < checkpoint_time:
+            # Read closed before reading messages, so that no message produced before closing is missed.
+            closed: bool = broker.closed
+            messages = broker.read(topic, offset, self.max_buffer_size)
+
+            if not messages:
+                if closed:
+                    tracker.try_claim(restriction.stop)
+                    return
+
+                time.sleep(self.IDLE_WAIT)
+                break
+
+            if not tracker.try_claim(offset + len(messages) - 1):
+                return
+
+            offset += len(messages)
+            for _, key, value in messages:
+                yield key, value
+
+        tracker.defer_remainder(Duration())
+
+
+class InMemoryProduce(PTransform):
+    """A :class:`~apache_beam.transforms.ptransform.PTransform` for producing (key, value) tuples to a topic
+    of an `InMemoryBroker`, like `KafkaProduce`. The topic of a `ReplyAddress` is ignored.
+    """
+
+    def __init__(self, broker_name: str, topic: str):
+        super(InMemoryProduce, self).__init__()
+        self.broker_name: str = broker_name
+        self.topic: str = topic
+
+    def expand(self, pcoll):
+        return pcoll | ParDo(_ProduceInMemoryMessage(self.broker_name, self.topic))
+
+
+class _ProduceInMemoryMessage(DoFn):
+    def __init__(self, broker_name: str, topic: str):
+        self.broker_name: str = broker_name
+        self.topic: str = topic
+
+    def process(self, element):
+        InMemoryBroker.get(self.broker_name).produce(
+            self.topic, element[0].encode(), element[1]
+        )
+        yield element
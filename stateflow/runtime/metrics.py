@@ -0,0 +1,204 @@
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import json
+
+
+class Histogram:
+    """A histogram of latencies (in milliseconds).
+
+    Values are rounded to two significant digits, so a histogram has a bounded amount of distinct values
+    (about 90 per order of magnitude) regardless of the amount of recorded values.
+    """
+
+    def __init__(self):
+        self.values: Dict[float, int] = {}
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float):
+        bucket: float = float(f"{value:.2g}")
+        self.values[bucket] = self.values.get(bucket, 0) + 1
+
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Computes a percentile of the (rounded) values.
+
+        :param percentile: the percentile, between 0 and 100.
+        :return: the value at this percentile, or None if the histogram is empty.
+        """
+        if self.count == 0:
+            return None
+
+        rank: float = percentile / 100 * self.count
+        seen: int = 0
+        for value in sorted(self.values.keys()):
+            seen += self.values[value]
+            if seen >= rank:
+                return value
+
+        return self.max
+
+
+# A metric is identified by its phase, operator name and method name.
+MetricKey = Tuple[str, Optional[str], Optional[str]]
+
+
+class MetricsCollector:
+    """Collects latency histograms per phase (e.g. read, execute, write), operator and method.
+
+    Histograms are aggregated in memory until `flush` is called, which emits and resets them.
+    Recording is thread-safe.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[MetricKey, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def record(
+        self,
+        phase: str,
+        millis: float,
+        operator: Optional[str] = None,
+        method: Optional[str] = None,
+    ):
+        """Records a latency.
+
+        :param phase: the phase, e.g. read, execute or write.
+        :param millis: the latency in milliseconds.
+        :param operator: the name of the operator, if any.
+        :param method: the name of the method, if any.
+        """
+        with self.lock:
+            key: MetricKey = (phase, operator, method)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+
+            self.histograms[key].record(millis)
+
+    def flush(self):
+        with self.lock:
+            histograms, self.histograms = self.histograms, {}
+
+        if len(histograms) > 0:
+            self.emit(histograms)
+
+    def emit(self, histograms: Dict[MetricKey, Histogram]):
+        raise NotImplementedError("Needs to be implemented by subclasses.")
+
+
+class LocalMetricsCollector(MetricsCollector):
+    """Keeps all emitted histograms in memory, e.g. for tests and benchmarks."""
+
+    def __init__(self):
+        super().__init__()
+        self.emitted: Dict[MetricKey, Histogram] = {}
+
+    def emit(self, histograms: Dict[MetricKey, Histogram]):
+        for key, histogram in histograms.items():
+            if key not in self.emitted:
+                self.emitted[key] = Histogram()
+
+            merged: Histogram = self.emitted[key]
+            for value, count in histogram.values.items():
+                merged.values[value] = merged.values.get(value, 0) + count
+            merged.count += histogram.count
+            merged.sum += histogram.sum
+            merged.min = (
+                histogram.min if merged.min is None else min(merged.min, histogram.min)
+            )
+            merged.max = (
+                histogram.max if merged.max is None else max(merged.max, histogram.max)
+            )
+
+    def get(
+        self, phase: str, operator: Optional[str] = None, method: Optional[str] = None
+    ) -> Optional[Histogram]:
+        return self.emitted.get((phase, operator, method))
+
+
+class EMFMetricsCollector(MetricsCollector):
+    """Emits histograms as CloudWatch Embedded Metric Format (EMF) JSON lines.
+
+    In AWS Lambda, everything written to stdout ends up in CloudWatch Logs, which extracts the metrics.
+    A line is written per operator and method, containing a metric per phase.
+    See https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+    """
+
+    # EMF supports at most 100 distinct values per metric.
+    MAX_VALUES: int = 100
+
+    def __init__(self, namespace: str = "stateflow", out=None):
+        """Initializes an EMF collector.
+
+        :param namespace: the CloudWatch namespace of the metrics.
+        :param out: a function to write a line with, defaults to print.
+        """
+        super().__init__()
+        self.namespace: str = namespace
+        self.out = out if out is not None else print
+
+    def emit(self, histograms: Dict[MetricKey, Histogram]):
+        per_dimensions: Dict[Tuple[Optional[str], Optional[str]], Dict] = {}
+        for (phase, operator, method), histogram in histograms.items():
+            per_dimensions.setdefault((operator, method), {})[phase] = histogram
+
+        timestamp: int = int(time.time() * 1000)
+        for (operator, method), phases in per_dimensions.items():
+            for line in self._to_lines(timestamp, operator, method, phases):
+                self.out(json.dumps(line))
+
+    def _to_lines(
+        self,
+        timestamp: int,
+        operator: Optional[str],
+        method: Optional[str],
+        phases: Dict[str, Histogram],
+    ) -> List[Dict]:
+        dimensions: Dict[str, str] = {}
+        if operator is not None:
+            dimensions["Operator"] = operator
+        if method is not None:
+            dimensions["Method"] = method
+
+        # Histograms with more than 100 distinct values, are split over multiple lines.
+        lines: List[Dict] = []
+        for phase, histogram in phases.items():
+            values: List[Tuple[float, int]] = sorted(histogram.values.items())
+            for i in range(0, len(values), EMFMetricsCollector.MAX_VALUES):
+                if len(lines) <= i // EMFMetricsCollector.MAX_VALUES:
+                    lines.append(self._line(timestamp, dimensions))
+
+                line: Dict = lines[i // EMFMetricsCollector.MAX_VALUES]
+                line["_aws"]["CloudWatchMetrics"][0]["Metrics"].append(
+                    {"Name": phase, "Unit": "Milliseconds"}
+                )
+                chunk = values[i : i + EMFMetricsCollector.MAX_VALUES]
+                line[phase] = {
+                    "Values": [value for value, _ in chunk],
+                    "Counts": [count for _, count in chunk],
+                }
+
+        return lines
+
+    def _line(self, timestamp: int, dimensions: Dict[str, str]) -> Dict:
+        line: Dict = {
+            "_aws": {
+                "Timestamp": timestamp,
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(dimensions.keys())],
+                        "Metrics": [],
+                    }
+                ],
+            }
+        }
+        line.update(dimensions)
+        return line
@@ -1,12 +1,12 @@
 from stateflow.serialization.serde import SerDe, Event, Dict
 from stateflow.dataflow.args import Arguments
-from stateflow.dataflow.event import EventType, FunctionAddress
+from stateflow.dataflow.event import EventType, FunctionAddress, ReplyAddress
 from stateflow.dataflow.event_flow import EventFlowGraph
 import ujson
 
 
 class JsonSerializer(SerDe):
-    def serialize_event(self, event: Event) -> bytes:
+    def _event_to_dict(self, event: Event) -> Dict:
         event_id: str = event.event_id
         event_type: str = event.event_type.value
         fun_address: dict = event.fun_address.to_dict()
@@ -16,18 +16,24 @@ class JsonSerializer(SerDe):
             if hasattr(payload[item], "to_dict"):
                 payload[item] = payload[item].to_dict()
 
-        event = {
+        if event.is_batch():
+            payload["events"] = [
+                self._event_to_dict(sub_event) for sub_event in payload["events"]
+            ]
+
+        event_dict = {
             "event_id": event_id,
             "event_type": event_type,
             "fun_address": fun_address,
             "payload": payload,
         }
 
-        return bytes(self.serialize_dict(event), "utf-8")
+        if event.reply_to is not None:
+            event_dict["reply_to"] = event.reply_to.to_dict()
 
-    def deserialize_event(self, event: bytes) -> Event:
-        json = self.deserialize_dict(event)
+        return event_dict
 
+    def _event_from_dict(self, json: Dict) -> Event:
         event_id: str = json["event_id"]
         event_type: str = EventType.from_str(json["event_type"])
         fun_address: dict = FunctionAddress.from_dict(json["fun_address"])
@@ -39,7 +45,24 @@ class JsonSerializer(SerDe):
         if "flow" in payload:
             payload["flow"] = EventFlowGraph.from_dict(payload["flow"])
 
-        return Event(event_id, fun_address, event_type, payload)
+        reply_to = None
+        if json.get("reply_to") is not None:
+            reply_to = ReplyAddress.from_dict(json["reply_to"])
+
+        event = Event(event_id, fun_address, event_type, payload, reply_to)
+
+        if event.is_batch():
+            payload["events"] = [
+                self._event_from_dict(sub_event) for sub_event in payload["events"]
+            ]
+
+        return event
+
+    def serialize_event(self, event: Event) -> bytes:
+        return bytes(self.serialize_dict(self._event_to_dict(event)), "utf-8")
+
+    def deserialize_event(self, event: bytes) -> Event:
+        return self._event_from_dict(self.deserialize_dict(event))
 
     def serialize_dict(self, dictionary: Dict) -> bytes:
         return ujson.encode(dictionary)
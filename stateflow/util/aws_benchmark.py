@@ -0,0 +1,264 @@
+from stateflow.dataflow.dataflow import Dataflow
+from stateflow.dataflow.event import Event
+from stateflow.runtime.aws.abstract_lambda import AWSLambdaRuntime
+from stateflow.runtime.aws.gateway_lambda import AWSGatewayLambdaRuntime
+from stateflow.runtime.aws.kinesis_lambda import AWSKinesisLambdaRuntime
+from stateflow.runtime.metrics import Histogram, LocalMetricsCollector
+from stateflow.util.benchmark import EventRecorder, BenchmarkResult, is_failure
+from stateflow.serialization.pickle_serializer import PickleSerializer, SerDe
+from python_dynamodb_lock.python_dynamodb_lock import DynamoDBLockClient
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Type
+from moto import mock_aws
+from botocore.config import Config
+import contextlib
+import threading
+import base64
+import boto3
+import json
+import time
+import os
+
+
+class AWSLambdaBenchmark:
+    """Benchmarks a Lambda runtime end to end, without an AWS account.
+
+    DynamoDB and Kinesis are replaced by in-process stand-ins (moto). Each concurrent 'container' has its own
+    runtime instance (like a warm Lambda container) and handles one invocation at a time.
+    For the Kinesis runtime, an invocation handles a batch of records, like a Kinesis event source mapping.
+
+    Usage:
+        with AWSLambdaBenchmark(flow, AWSKinesisLambdaRuntime, optimistic=True) as benchmark:
+            benchmark.run(create_events, "create")
+            print(benchmark.run(invoke_events, "invoke").report())
+    """
+
+    def __init__(
+        self,
+        flow: Dataflow,
+        runtime_class: Type[AWSLambdaRuntime] = AWSGatewayLambdaRuntime,
+        concurrency: int = 4,
+        batch_size: int = 100,
+        quiet: bool = True,
+        serializer: SerDe = PickleSerializer(),
+        region: str = "eu-west-1",
+        **runtime_kwargs: Any,
+    ):
+        """Initializes a benchmark.
+
+        :param flow: the dataflow.
+        :param runtime_class: the runtime to benchmark, AWSGatewayLambdaRuntime or AWSKinesisLambdaRuntime.
+        :param concurrency: the amount of concurrent containers.
+        :param batch_size: the maximum amount of records per invocation, for the Kinesis runtime.
+        :param quiet: suppress the output of the runtime during a run.
+        :param serializer: the serializer for events.
+        :param region: the (fake) region of DynamoDB and Kinesis.
+        :param runtime_kwargs: additional arguments for the runtime, e.g. optimistic=True.
+        """
+        self.flow: Dataflow = flow
+        self.runtime_class: Type[AWSLambdaRuntime] = runtime_class
+        self.concurrency: int = concurrency
+        self.batch_size: int = batch_size
+        self.quiet: bool = quiet
+        self.serializer: SerDe = serializer
+        self.region: str = region
+        self.runtime_kwargs: Dict[str, Any] = runtime_kwargs
+
+        self.metrics: LocalMetricsCollector = LocalMetricsCollector()
+        self.runtimes: List[AWSLambdaRuntime] = []
+        self.handlers: List = []
+
+        self._mock = None
+        self._environ: Dict[str, Optional[str]] = {}
+
+    def is_kinesis(self) -> bool:
+        return issubclass(self.runtime_class, AWSKinesisLambdaRuntime)
+
+    def __enter__(self) -> "AWSLambdaBenchmark":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        # Fake credentials, so that nothing can reach a real AWS account.
+        for key, value in [
+            ("AWS_DEFAULT_REGION", self.region),
+            ("AWS_ACCESS_KEY_ID", "benchmark"),
+            ("AWS_SECRET_ACCESS_KEY", "benchmark"),
+        ]:
+            self._environ[key] = os.environ.get(key)
+            os.environ[key] = value
+
+        self._mock = mock_aws()
+        self._mock.start()
+
+        if not self.runtime_kwargs.get("optimistic", False):
+            DynamoDBLockClient.create_dynamodb_table(
+                boto3.client("dynamodb", region_name=self.region)
+            )
+
+        if self.is_kinesis():
+            kinesis = boto3.client("kinesis", region_name=self.region)
+            kinesis.create_stream(StreamName="stateflow-request", ShardCount=1)
+            kinesis.create_stream(StreamName="stateflow-reply", ShardCount=1)
+
+        for _ in range(self.concurrency):
+            runtime_kwargs: Dict[str, Any] = dict(self.runtime_kwargs)
+            if issubclass(self.runtime_class, AWSGatewayLambdaRuntime):
+                runtime_kwargs.setdefault("gateway", True)
+            runtime_kwargs.setdefault("config", Config(region_name=self.region))
+
+            runtime, handler = self.runtime_class.get_handler(
+                self.flow,
+                serializer=self.serializer,
+                metrics=self.metrics,
+                **runtime_kwargs,
+            )
+            self.runtimes.append(runtime)
+            self.handlers.append(handler)
+
+        self.runtimes[0].create_tables()
+
+    def stop(self):
+        for runtime in self.runtimes:
+            if runtime.lock_client is not None:
+                runtime.lock_client.close()
+
+        self._mock.stop()
+
+        for key, value in self._environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    def _invocations(self, events: List[Event]) -> List[Dict]:
+        serialized: List[str] = [
+            base64.b64encode(self.serializer.serialize_event(event)).decode()
+            for event in events
+        ]
+
+        if self.is_kinesis():
+            return [
+                {
+                    "Records": [
+                        {"kinesis": {"data": data}}
+                        for data in serialized[i : i + self.batch_size]
+                    ]
+                }
+                for i in range(0, len(serialized), self.batch_size)
+            ]
+
+        return [{"body": json.dumps({"event": data})} for data in serialized]
+
+    def _gateway_replies(self, responses: List[Dict]) -> List[Event]:
+        return [
+            self.serializer.deserialize_event(
+                base64.b64decode(json.loads(response["body"])["event"])
+            )
+            for response in responses
+        ]
+
+    def _kinesis_replies(self, events: List[Event]) -> List[Event]:
+        event_ids = set([event.event_id for event in events])
+        kinesis = boto3.client("kinesis", region_name=self.region)
+
+        replies: List[Event] = []
+        for shard in kinesis.list_shards(StreamName="stateflow-reply")["Shards"]:
+            iterator = kinesis.get_shard_iterator(
+                StreamName="stateflow-reply",
+                ShardId=shard["ShardId"],
+                ShardIteratorType="TRIM_HORIZON",
+            )["ShardIterator"]
+
+            while iterator is not None:
+                response = kinesis.get_records(ShardIterator=iterator, Limit=10000)
+                replies.extend(
+                    [
+                        self.serializer.deserialize_event(record["Data"])
+                        for record in response["Records"]
+                        if record["PartitionKey"] in event_ids
+                    ]
+                )
+                if len(response["Records"]) == 0:
+                    break
+                iterator = response.get("NextShardIterator")
+
+        return replies
+
+    def run(self, events: List[Event], name: str = "benchmark") -> BenchmarkResult:
+        """Invokes the handlers concurrently with the events, and measures throughput and latency.
+
+        :param events: the events to send.
+        :param name: the name of this run.
+        :return: the result.
+        """
+        invocations: List[Dict] = self._invocations(events)
+        latency: Histogram = Histogram()
+        latency_lock = threading.Lock()
+        errors: List[Exception] = []
+
+        # Each container handles one invocation at a time.
+        free_handlers: List = list(self.handlers)
+        handlers_lock = threading.Lock()
+
+        def invoke(invocation: Dict):
+            with handlers_lock:
+                handler = free_handlers.pop()
+
+            try:
+                start: float = time.perf_counter()
+                response = handler(invocation, None)
+                millis: float = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                # A failed invocation is not retried, all its events count as failed.
+                errors.append(e)
+                return None
+            finally:
+                with handlers_lock:
+                    free_handlers.append(handler)
+
+            with latency_lock:
+                latency.record(millis)
+            return response
+
+        self.metrics.emitted = {}
+        output = open(os.devnull, "w") if self.quiet else None
+        with (
+            contextlib.redirect_stdout(output)
+            if self.quiet
+            else contextlib.nullcontext()
+        ):
+            start: float = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                responses: List = list(executor.map(invoke, invocations))
+            duration: float = time.perf_counter() - start
+
+        if output is not None:
+            output.close()
+
+        if self.is_kinesis():
+            replies: List[Event] = self._kinesis_replies(events)
+        else:
+            replies: List[Event] = self._gateway_replies(
+                [response for response in responses if response is not None]
+            )
+
+        failures: int = (
+            len(events)
+            - len(replies)
+            + sum([1 for reply in replies if is_failure(reply)])
+        )
+
+        return BenchmarkResult(
+            name,
+            len(events),
+            len(invocations),
+            failures,
+            errors,
+            duration,
+            latency,
+            self.metrics.emitted,
+        )
@@ -0,0 +1,157 @@
+from stateflow.dataflow.dataflow import Dataflow
+from stateflow.dataflow.event import Event
+from stateflow.runtime.beam_runtime import BeamRuntime
+from stateflow.runtime.kafka_config import KafkaConfig
+from stateflow.runtime.memory_io import InMemoryBroker, InMemoryConsume, InMemoryProduce
+from stateflow.runtime.metrics import Histogram
+from stateflow.util.benchmark import BenchmarkResult, is_failure
+from stateflow.serialization.pickle_serializer import PickleSerializer, SerDe
+from typing import Any, Dict, List, Optional
+import threading
+import time
+
+
+class BeamBenchmark:
+    """Benchmarks the Beam runtime end to end, without a Kafka broker.
+
+    Kafka is replaced by an in-memory broker, so the pipeline has to run in this process (i.e. the DirectRunner).
+    A single pipeline runs for the lifetime of the benchmark, so that state is kept between runs.
+    Latency is measured from producing a request to producing its reply.
+
+    Usage:
+        with BeamBenchmark(flow, multiplexed=True) as benchmark:
+            benchmark.run(create_events, "create")
+            print(benchmark.run(invoke_events, "invoke", rate=1000).report())
+    """
+
+    def __init__(
+        self,
+        flow: Dataflow,
+        multiplexed: bool = False,
+        serializer: SerDe = PickleSerializer(),
+        max_buffer_size: int = 500,
+        timeout: float = 60.0,
+        **runtime_kwargs: Any,
+    ):
+        """Initializes a benchmark.
+
+        :param flow: the dataflow.
+        :param multiplexed: if True, the multiplexed operator layout of the runtime is used.
+        :param serializer: the serializer for events.
+        :param max_buffer_size: the maximum amount of messages the source reads at once.
+        :param timeout: the amount of seconds to wait for the pipeline to start, and for the replies of a run.
+        :param runtime_kwargs: additional arguments for the runtime, e.g. pipeline_options. The in-memory broker
+            is not shared with worker processes, so the DirectRunner can only use multiple workers in threads.
+        """
+        self.flow: Dataflow = flow
+        self.multiplexed: bool = multiplexed
+        self.serializer: SerDe = serializer
+        self.max_buffer_size: int = max_buffer_size
+        self.timeout: float = timeout
+        self.config: KafkaConfig = KafkaConfig()
+        self.runtime_kwargs: Dict[str, Any] = runtime_kwargs
+
+        self.broker: Optional[InMemoryBroker] = None
+        self.runtime: Optional[BeamRuntime] = None
+        self._thread: Optional[threading.Thread] = None
+        self._reply_offset: int = 0
+
+    def __enter__(self) -> "BeamBenchmark":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self.broker = InMemoryBroker()
+        broker_name: str = self.broker.name
+
+        self.runtime = BeamRuntime(
+            self.flow,
+            serializer=self.serializer,
+            config=self.config,
+            multiplexed=self.multiplexed,
+            source=InMemoryConsume(
+                broker_name, self.config.input_topics(), self.max_buffer_size
+            ),
+            sink=lambda topic: InMemoryProduce(broker_name, topic),
+            **self.runtime_kwargs,
+        )
+        self._thread = threading.Thread(target=self.runtime.run, daemon=True)
+        self._thread.start()
+
+        # Wait until the pipeline reads, so that its startup is not part of the first run.
+        deadline: float = time.perf_counter() + self.timeout
+        while self.broker.reads == 0:
+            if time.perf_counter() > deadline or not self._thread.is_alive():
+                raise AttributeError("The Beam pipeline did not start.")
+            time.sleep(0.01)
+
+    def stop(self):
+        self.broker.close()
+        self._thread.join(self.timeout)
+        self.broker.remove()
+
+    def _send(self, events: List[Event], rate: Optional[float]) -> Dict[str, float]:
+        sent: Dict[str, float] = {}
+        start: float = time.perf_counter()
+
+        for i, event in enumerate(events):
+            if rate is not None:
+                delay: float = start + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            sent[event.event_id] = time.perf_counter()
+            self.broker.produce(
+                self.config.request_topic,
+                event.event_id.encode(),
+                self.serializer.serialize_event(event),
+            )
+
+        return sent
+
+    def run(
+        self, events: List[Event], name: str = "benchmark", rate: Optional[float] = None
+    ) -> BenchmarkResult:
+        """Sends the events to the pipeline, and measures throughput and latency.
+
+        :param events: the events to send.
+        :param name: the name of this run.
+        :param rate: the amount of events per second, if None all events are sent at once.
+        :return: the result.
+        """
+        start: float = time.perf_counter()
+        sent: Dict[str, float] = self._send(events, rate)
+
+        latency: Histogram = Histogram()
+        replies: List[Event] = []
+        deadline: float = time.perf_counter() + self.timeout
+
+        while len(replies) < len(events) and time.perf_counter() < deadline:
+            messages = self.broker.read(
+                self.config.reply_topic, self._reply_offset, len(events)
+            )
+            if not messages:
+                time.sleep(0.001)
+                continue
+
+            self._reply_offset += len(messages)
+            for produced, _, value in messages:
+                reply: Event = self.serializer.deserialize_event(value)
+                if reply.event_id in sent:
+                    latency.record((produced - sent[reply.event_id]) * 1000)
+                    replies.append(reply)
+
+        duration: float = time.perf_counter() - start
+
+        failures: int = (
+            len(events)
+            - len(replies)
+            + sum([1 for reply in replies if is_failure(reply)])
+        )
+
+        return BenchmarkResult(
+            name, len(events), len(events), failures, [], duration, latency, {}
+        )
@@ -0,0 +1,109 @@
+from stateflow.client.stateflow_client import StateflowClient, StateflowFuture, T
+from stateflow.dataflow.dataflow import Dataflow
+from stateflow.dataflow.event import Event, EventType
+from stateflow.runtime.metrics import Histogram, MetricKey
+from stateflow.serialization.pickle_serializer import PickleSerializer, SerDe
+from typing import Dict, List
+import time
+
+
+class EventRecorder(StateflowClient):
+    """A client which records events instead of sending them, to build a workload.
+
+    Instances can be referenced by key without creating them, e.g. `User(__key="wouter")`.
+    """
+
+    def __init__(self, flow: Dataflow, serializer: SerDe = PickleSerializer()):
+        super().__init__(flow, serializer)
+        self.events: List[Event] = []
+
+        # Set the wrapper.
+        [op.meta_wrapper.set_client(self) for op in flow.operators]
+
+    def send(self, event: Event, return_type: T = None) -> StateflowFuture[T]:
+        self.events.append(event)
+        return StateflowFuture(
+            event.event_id, time.time(), event.fun_address, return_type
+        )
+
+    def record(self) -> List[Event]:
+        """Returns all events recorded so far, and starts a new recording.
+
+        :return: the recorded events.
+        """
+        events, self.events = self.events, []
+        return events
+
+
+def is_failure(reply: Event) -> bool:
+    """Checks if a reply is a failure, a batch result fails if any of its replies fails.
+
+    :param reply: the reply.
+    :return: True if the invocation failed or the key was not found.
+    """
+    if reply.event_type == EventType.Reply.BatchResult:
+        return any(is_failure(sub_reply) for sub_reply in reply.unpack())
+    return reply.event_type in [
+        EventType.Reply.FailedInvocation,
+        EventType.Reply.KeyNotFound,
+    ]
+
+
+class BenchmarkResult:
+    """The result of a benchmark run."""
+
+    def __init__(
+        self,
+        name: str,
+        events: int,
+        invocations: int,
+        failures: int,
+        errors: List[Exception],
+        duration: float,
+        latency: Histogram,
+        phases: Dict[MetricKey, Histogram],
+    ):
+        self.name: str = name
+        self.events: int = events
+        self.invocations: int = invocations
+        self.failures: int = failures
+        self.errors: List[Exception] = errors
+        self.duration: float = duration
+        self.latency: Histogram = latency
+        self.phases: Dict[MetricKey, Histogram] = phases
+
+    @property
+    def throughput(self) -> float:
+        """The amount of events per second."""
+        return self.events / self.duration if self.duration > 0 else 0.0
+
+    def _format_histogram(self, histogram: Histogram) -> str:
+        return (
+            f"n={histogram.count} mean={histogram.sum / histogram.count:.2f}ms "
+            f"p50={histogram.percentile(50)}ms p95={histogram.percentile(95)}ms "
+            f"p99={histogram.percentile(99)}ms max={histogram.max:.2f}ms"
+        )
+
+    def report(self) -> str:
+        lines: List[str] = [
+            f"{self.name}: {self.events} events in {self.invocations} invocations "
+            f"({self.failures} events and {len(self.errors)} invocations failed) "
+            f"in {self.duration:.2f}s, {self.throughput:.1f} events/s",
+        ]
+        if self.latency.count > 0:
+            lines.append(
+                f"  invocation latency: {self._format_histogram(self.latency)}"
+            )
+        for error in set([repr(error) for error in self.errors]):
+            lines.append(f"  error: {error}")
+
+        for (phase, operator, method), histogram in sorted(
+            self.phases.items(), key=lambda item: [str(el) for el in item[0]]
+        ):
+            label: str = phase if operator is None else f"{phase} {operator}.{method}"
+            lines.append(f"  {label}: {self._format_histogram(histogram)}")
+
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.report()
@@ -0,0 +1,189 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class KinesisBufferError(RuntimeError):
+    """Raised when buffered records could not be sent, it holds the records which were not sent."""
+
+    def __init__(self, stream: str, records: List[Dict], msg: str):
+        super().__init__(msg)
+        self.stream: str = stream
+        self.records: List[Dict] = records
+
+
+class KinesisBuffer:
+    """Buffers outgoing Kinesis records and sends them in batches using `put_records`.
+
+    A stream is flushed once its buffer reaches the maximum amount of records or bytes of a single
+    `put_records` request, or (if a linger time is set) once the oldest buffered record is older than the linger time.
+    Records which (partially) fail, are retried with an exponential backoff.
+    """
+
+    # The limits of a single put_records request.
+    MAX_RECORDS: int = 500
+    MAX_BYTES: int = 5 * 1024 * 1024
+
+    def __init__(
+        self,
+        kinesis,
+        max_records: int = MAX_RECORDS,
+        max_bytes: int = MAX_BYTES,
+        linger: Optional[float] = None,
+        max_retries: int = 5,
+        on_failure: Optional[Callable[[KinesisBufferError], None]] = None,
+    ):
+        """Initializes a Kinesis buffer.
+
+        :param kinesis: the boto3 Kinesis client.
+        :param max_records: the maximum amount of records per request.
+        :param max_bytes: the maximum amount of bytes (data + partition keys) per request.
+        :param linger: the maximum time (in seconds) a record is buffered. If None, the buffer is only flushed
+            when it is full or when flush() is called explicitly.
+        :param max_retries: the maximum amount of retries for failed records.
+        :param on_failure: called with the error of every failed flush, the records of the error are not sent.
+            The error is raised to the flushing caller as well, except for a flush on linger.
+        """
+        self.kinesis = kinesis
+        self.max_records: int = min(max_records, KinesisBuffer.MAX_RECORDS)
+        self.max_bytes: int = min(max_bytes, KinesisBuffer.MAX_BYTES)
+        self.linger: Optional[float] = linger
+        self.max_retries: int = max_retries
+        self.on_failure: Optional[Callable[[KinesisBufferError], None]] = on_failure
+
+        self.lock = threading.RLock()
+        self.buffers: Dict[str, List[Dict]] = {}
+        self.buffer_bytes: Dict[str, int] = {}
+        self.first_buffered: Dict[str, float] = {}
+
+        self.running: bool = linger is not None
+        if self.running:
+            self.linger_thread = threading.Thread(target=self._flush_on_linger, daemon=True)
+            self.linger_thread.start()
+
+    def put(self, stream: str, data: bytes, partition_key: str):
+        """Buffers a record for a stream.
+
+        :param stream: the name of the stream.
+        :param data: the data of the record.
+        :param partition_key: the partition key of the record.
+        """
+        record_size: int = len(data) + len(partition_key.encode("utf-8"))
+        flushes: List[Tuple[str, List[Dict]]] = []
+
+        with self.lock:
+            if (
+                self.buffer_bytes.get(stream, 0) + record_size > self.max_bytes
+                and len(self.buffers.get(stream, [])) > 0
+            ):
+                flushes.append((stream, self._pop_stream(stream)))
+
+            if stream not in self.buffers or len(self.buffers[stream]) == 0:
+                self.buffers[stream] = []
+                self.buffer_bytes[stream] = 0
+                self.first_buffered[stream] = time.time()
+
+            self.buffers[stream].append({"Data": data, "PartitionKey": partition_key})
+            self.buffer_bytes[stream] += record_size
+
+            if len(self.buffers[stream]) >= self.max_records:
+                flushes.append((stream, self._pop_stream(stream)))
+
+        self._send(flushes)
+
+    def flush(self):
+        """Sends all buffered records."""
+        with self.lock:
+            flushes: List[Tuple[str, List[Dict]]] = [
+                (stream, self._pop_stream(stream))
+                for stream in list(self.buffers.keys())
+            ]
+
+        self._send(flushes)
+
+    def _pop_stream(self, stream: str) -> List[Dict]:
+        self.buffer_bytes.pop(stream, None)
+        self.first_buffered.pop(stream, None)
+        return self.buffers.pop(stream, [])
+
+    def _send(self, flushes: List[Tuple[str, List[Dict]]], raise_error: bool = True):
+        """Sends popped records, outside of the lock so that other threads can buffer records during retries.
+        Each failure is passed to `on_failure`, as the records may belong to other callers than the one flushing.
+
+        :param flushes: the records to send, per stream.
+        :param raise_error: if True, the first failure is raised once all records are sent.
+        """
+        error: Optional[KinesisBufferError] = None
+
+        for stream, records in flushes:
+            if len(records) == 0:
+                continue
+
+            try:
+                self._put_records(stream, records)
+            except KinesisBufferError as exc:
+                logger.error(str(exc))
+                if self.on_failure is not None:
+                    self.on_failure(exc)
+                error = error or exc
+
+        if error is not None and raise_error:
+            raise error
+
+    def _put_records(self, stream: str, records: List[Dict]):
+        retries: int = 0
+
+        while True:
+            try:
+                response = self.kinesis.put_records(StreamName=stream, Records=records)
+            except Exception as exc:
+                raise KinesisBufferError(
+                    stream,
+                    records,
+                    f"Failed to put {len(records)} records to {stream}: {exc!r}",
+                ) from exc
+
+            if response.get("FailedRecordCount", 0) == 0:
+                return
+
+            # Results are in the same order as the records, failed records have an ErrorCode.
+            records = [
+                record
+                for record, result in zip(records, response["Records"])
+                if "ErrorCode" in result
+            ]
+
+            if retries >= self.max_retries:
+                raise KinesisBufferError(
+                    stream,
+                    records,
+                    f"Failed to put {len(records)} records to {stream} after {retries} retries.",
+                )
+
+            time.sleep(0.05 * (2 ** retries))
+            retries += 1
+
+    def _flush_on_linger(self):
+        while self.running:
+            now: float = time.time()
+            with self.lock:
+                flushes: List[Tuple[str, List[Dict]]] = [
+                    (stream, self._pop_stream(stream))
+                    for stream, first_buffered in list(self.first_buffered.items())
+                    if now - first_buffered >= self.linger
+                ]
+
+            # A failed flush must not stop this thread, otherwise nothing is flushed on linger anymore.
+            try:
+                self._send(flushes, raise_error=False)
+            except Exception as exc:
+                logger.error(f"Failed to flush on linger: {exc!r}")
+
+            time.sleep(self.linger / 2)
+
+    def close(self):
+        self.running = False
+        self.flush()
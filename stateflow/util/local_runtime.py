@@ -1,4 +1,9 @@
-from stateflow.client.stateflow_client import StateflowClient, StateflowFuture, T
+from stateflow.client.stateflow_client import (
+    StateflowClient,
+    StateflowFuture,
+    StateflowBatchFuture,
+    T,
+)
 from stateflow.dataflow.dataflow import Dataflow
 from stateflow.dataflow.stateful_operator import StatefulOperator
 from stateflow.serialization.pickle_serializer import SerDe, PickleSerializer
@@ -10,7 +15,7 @@ from stateflow.dataflow.dataflow import (
     EventType,
 )
 from stateflow.dataflow.event import Event
-from typing import Dict, ByteString
+from typing import Dict, ByteString, List
 import time
 
 
@@ -74,15 +79,27 @@ class LocalRuntime(StateflowClient):
         else:
             return route
 
-    def execute_event(self, event: Event) -> Event:
-        parsed_event: Event = self.ingress_router.parse(event)
-        return_route: Route = self.handle_invocation(parsed_event)
+    def _execute_parsed_event(self, event: Event) -> Event:
+        if event.is_batch():
+            return Event.pack(
+                event.event_id,
+                event.fun_address,
+                [self._execute_parsed_event(sub_event) for sub_event in event.unpack()],
+                reply=True,
+                reply_to=event.reply_to,
+            )
+
+        return_route: Route = self.handle_invocation(event)
 
         while return_route.direction != RouteDirection.CLIENT:
             return_route = self.handle_invocation(return_route.value)
 
         return return_route.value
 
+    def execute_event(self, event: Event) -> Event:
+        parsed_event: Event = self.ingress_router.parse(event)
+        return self._execute_parsed_event(parsed_event)
+
     def send(self, event: Event, return_type: T = None) -> T:
         return_event = self.execute_event(self.serializer.serialize_event(event))
         future = StateflowFuture(
@@ -94,3 +111,16 @@ class LocalRuntime(StateflowClient):
             return future
         else:
             return future.get()
+
+    def _send_batch_event(self, batch: Event, future: StateflowBatchFuture):
+        future.complete(self.execute_event(self.serializer.serialize_event(batch)))
+
+    def send_batch(
+        self, events: List[Event], return_type: T = None, batch_size: int = 1000
+    ) -> StateflowBatchFuture[T]:
+        future = super().send_batch(events, return_type, batch_size)
+
+        if self.return_future:
+            return future
+        else:
+            return future.get()
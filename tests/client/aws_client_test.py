@@ -0,0 +1,358 @@
+import threading
+import time
+import uuid
+from typing import List
+from unittest import mock
+import boto3
+import pytest
+from moto import mock_aws
+from tests.context import stateflow
+from tests.common.common_classes import stateflow, User
+from stateflow.client.aws_client import AWSKinesisClient
+from stateflow.client.future import StateflowFuture, StateflowFailure
+from stateflow.dataflow.event import Event, EventType
+from stateflow.dataflow.address import FunctionAddress, FunctionType
+from stateflow.serialization.pickle_serializer import PickleSerializer
+from stateflow.util.kinesis_buffer import KinesisBuffer, KinesisBufferError
+
+
+@pytest.fixture
+def kinesis(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    with mock_aws():
+        kinesis = boto3.client("kinesis")
+        kinesis.create_stream(StreamName="stateflow-request", ShardCount=1)
+        kinesis.create_stream(StreamName="stateflow-reply", ShardCount=2)
+        yield kinesis
+
+
+def wait_for(condition, timeout=5):
+    timeout_time = time.time() + timeout
+    while not condition() and time.time() < timeout_time:
+        time.sleep(0.05)
+
+
+def put_replies(client: AWSKinesisClient, kinesis, amount: int) -> List[str]:
+    """Puts replies on the reply stream, for futures registered in the client.
+
+    :return: the shard ids the replies were put on.
+    """
+    shards: List[str] = []
+    for _ in range(amount):
+        event = Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), "wouter"),
+            EventType.Reply.SuccessfulInvocation,
+            {"return_results": [True]},
+        )
+        client.futures[event.event_id] = StateflowFuture(
+            event.event_id, time.time(), event.fun_address, None
+        )
+
+        response = kinesis.put_record(
+            StreamName="stateflow-reply",
+            Data=PickleSerializer().serialize_event(event),
+            PartitionKey=event.event_id,
+        )
+        shards.append(response["ShardId"])
+
+    return shards
+
+
+class DelayedKinesisClient(AWSKinesisClient):
+    """A Kinesis client which only starts consuming once `started` is set."""
+
+    def __init__(self, *args, **kwargs):
+        self.started = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def consume(self):
+        self.started.wait()
+        super().consume()
+
+
+class TestAWSKinesisClient:
+    def test_consume_all_shards(self, kinesis):
+        client = AWSKinesisClient(stateflow.init())
+        wait_for(lambda: len(client.shard_consumers) == 2)
+
+        shards = put_replies(client, kinesis, 20)
+
+        wait_for(lambda: len(client.futures) == 0)
+        client.stop()
+
+        assert len(client.futures) == 0
+        assert set(client.checkpoints.keys()) == set(shards)
+
+    def test_follow_resharding(self, kinesis):
+        client = AWSKinesisClient(stateflow.init(), shard_discovery_interval=0.1)
+        wait_for(lambda: len(client.shard_consumers) == 2)
+
+        kinesis.update_shard_count(
+            StreamName="stateflow-reply",
+            TargetShardCount=4,
+            ScalingType="UNIFORM_SCALING",
+        )
+        wait_for(lambda: len(client.shard_consumers) > 2)
+
+        shards = put_replies(client, kinesis, 20)
+
+        wait_for(lambda: len(client.futures) == 0)
+        client.stop()
+
+        assert len(client.futures) == 0
+        assert set(shards).issubset(set(client.checkpoints.keys()))
+
+    def test_retry_failed_discovery(self, kinesis):
+        client = DelayedKinesisClient(stateflow.init())
+        list_shards = client._list_shards
+
+        with mock.patch.object(
+            client,
+            "_list_shards",
+            side_effect=[Exception("throttled"), list_shards()],
+        ):
+            client.started.set()
+            wait_for(lambda: len(client.shard_consumers) == 2)
+
+        client.stop()
+        assert len(client.shard_consumers) == 2
+
+    def test_expired_iterator_without_checkpoint(self, kinesis):
+        client = DelayedKinesisClient(stateflow.init())
+        get_records = client.kinesis.get_records
+        replies_put = threading.Event()
+        expired_shards = set()
+
+        def expire_once(**kwargs):
+            # The first read of each shard expires, after replies were put on the shard.
+            if threading.get_ident() not in expired_shards:
+                expired_shards.add(threading.get_ident())
+                replies_put.wait(5)
+                raise client.kinesis.exceptions.ExpiredIteratorException(
+                    {"Error": {"Code": "ExpiredIteratorException", "Message": ""}},
+                    "GetRecords",
+                )
+            return get_records(**kwargs)
+
+        with mock.patch.object(client.kinesis, "get_records", side_effect=expire_once):
+            client.started.set()
+            wait_for(lambda: len(client.shard_consumers) == 2)
+
+            put_replies(client, kinesis, 10)
+            replies_put.set()
+
+            wait_for(lambda: len(client.futures) == 0)
+            client.stop()
+
+        assert len(client.futures) == 0
+
+    def test_resume_from_checkpoint(self, kinesis):
+        client = AWSKinesisClient(stateflow.init())
+        wait_for(lambda: len(client.shard_consumers) == 2)
+
+        # Replies are put until each shard has a checkpoint, shards without a checkpoint
+        # are consumed from the latest record after a restart.
+        shards = set()
+        while len(shards) < 2:
+            shards.update(put_replies(client, kinesis, 1))
+        wait_for(lambda: len(client.futures) == 0)
+        client.stop()
+        assert len(client.checkpoints) == 2
+
+        # Replies sent while no client is running, are consumed after a restart from the checkpoints.
+        restarted_client = DelayedKinesisClient(
+            stateflow.init(), checkpoints=client.checkpoints
+        )
+        put_replies(restarted_client, kinesis, 5)
+        restarted_client.started.set()
+
+        wait_for(lambda: len(restarted_client.futures) == 0)
+        restarted_client.stop()
+
+        assert len(restarted_client.futures) == 0
+
+    def test_fail_requests_of_failed_flush(self, kinesis):
+        client = AWSKinesisClient(stateflow.init(), linger=60)
+        future = client.find(User, "wouter")
+
+        event = Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), "wouter"),
+            EventType.Request.FindClass,
+            {},
+        )
+        with mock.patch.object(
+            client.kinesis, "put_records", side_effect=Exception("throttled")
+        ):
+            with pytest.raises(KinesisBufferError):
+                client.send_batch([event])
+
+        client.stop()
+
+        # The request buffered before the batch fails as well.
+        assert future.is_completed
+        assert isinstance(future.result, StateflowFailure)
+        assert len(client.futures) == 0
+
+    def test_send_batches_requests(self, kinesis):
+        client = AWSKinesisClient(stateflow.init(), linger=60)
+        wait_for(lambda: len(client.shard_consumers) == 2)
+
+        for _ in range(10):
+            client.find(User, "wouter")
+
+        with mock.patch.object(
+            client.kinesis, "put_records", wraps=client.kinesis.put_records
+        ) as put_records:
+            client.stop()
+            put_records.assert_called_once()
+
+        shard_id = kinesis.list_shards(StreamName="stateflow-request")["Shards"][0][
+            "ShardId"
+        ]
+        iterator = kinesis.get_shard_iterator(
+            StreamName="stateflow-request",
+            ShardId=shard_id,
+            ShardIteratorType="TRIM_HORIZON",
+        )["ShardIterator"]
+        records = kinesis.get_records(ShardIterator=iterator)["Records"]
+
+        assert len(records) == 10
+        assert set([record["PartitionKey"] for record in records]) == set(
+            client.futures.keys()
+        )
+
+    def test_fail_unsent_requests(self, kinesis):
+        client = AWSKinesisClient(stateflow.init(), linger=0.01)
+
+        with mock.patch.object(
+            client.kinesis, "put_records", side_effect=Exception("throttled")
+        ):
+            future = client.find(User, "wouter")
+            wait_for(lambda: future.is_completed)
+
+        client.stop()
+
+        assert future.is_completed
+        assert isinstance(future.result, StateflowFailure)
+        assert len(client.futures) == 0
+
+
+class TestKinesisBuffer:
+    def test_flush_on_max_records(self):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
+        buffer = KinesisBuffer(kinesis_mock, max_records=3)
+
+        for i in range(7):
+            buffer.put("stream", b"data", str(i))
+
+        assert kinesis_mock.put_records.call_count == 2
+
+        buffer.flush()
+        assert kinesis_mock.put_records.call_count == 3
+        assert len(kinesis_mock.put_records.call_args[1]["Records"]) == 1
+
+    def test_flush_on_max_bytes(self):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
+        buffer = KinesisBuffer(kinesis_mock, max_bytes=10)
+
+        buffer.put("stream", b"12345678", "0")
+        buffer.put("stream", b"12345678", "1")
+
+        kinesis_mock.put_records.assert_called_once()
+
+    def test_retry_failed_records(self):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.side_effect = [
+            {
+                "FailedRecordCount": 1,
+                "Records": [
+                    {"ShardId": "0", "SequenceNumber": "0"},
+                    {"ErrorCode": "ProvisionedThroughputExceededException"},
+                ],
+            },
+            {"FailedRecordCount": 0, "Records": [{"ShardId": "0"}]},
+        ]
+        buffer = KinesisBuffer(kinesis_mock)
+
+        buffer.put("stream", b"data", "0")
+        buffer.put("stream", b"data", "1")
+        buffer.flush()
+
+        assert kinesis_mock.put_records.call_count == 2
+        assert kinesis_mock.put_records.call_args[1]["Records"] == [
+            {"Data": b"data", "PartitionKey": "1"}
+        ]
+
+    def test_retry_gives_up(self):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {
+            "FailedRecordCount": 1,
+            "Records": [{"ErrorCode": "InternalFailure"}],
+        }
+        buffer = KinesisBuffer(kinesis_mock, max_retries=1)
+
+        buffer.put("stream", b"data", "0")
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+
+    def test_linger_flush_failure(self):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.side_effect = [
+            Exception("throttled"),
+            {"FailedRecordCount": 0, "Records": []},
+        ]
+        failures = []
+        buffer = KinesisBuffer(kinesis_mock, linger=0.01, on_failure=failures.append)
+
+        buffer.put("stream", b"data", "0")
+        wait_for(lambda: len(failures) == 1)
+
+        assert isinstance(failures[0], KinesisBufferError)
+        assert failures[0].records == [{"Data": b"data", "PartitionKey": "0"}]
+
+        # The linger thread keeps flushing after a failure.
+        buffer.put("stream", b"data", "1")
+        wait_for(lambda: kinesis_mock.put_records.call_count == 2)
+        assert kinesis_mock.put_records.call_count == 2
+        buffer.close()
+
+    def test_flush_failure(self):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.side_effect = Exception("throttled")
+        failures = []
+        buffer = KinesisBuffer(kinesis_mock, max_records=2, on_failure=failures.append)
+
+        buffer.put("stream", b"data", "0")
+        with pytest.raises(KinesisBufferError):
+            buffer.put("stream", b"data", "1")
+
+        # The records of all callers are reported, not only the one of the caller that flushed.
+        assert len(failures) == 1
+        assert [record["PartitionKey"] for record in failures[0].records] == ["0", "1"]
+
+    def test_retry_without_lock(self):
+        kinesis_mock = mock.MagicMock()
+        buffer = KinesisBuffer(kinesis_mock)
+        locked = []
+
+        def put_records(**kwargs):
+            # Another thread can buffer records, while records are (re)tried.
+            acquire = lambda: locked.append(not buffer.lock.acquire(timeout=0.1))
+            thread = threading.Thread(target=acquire)
+            thread.start()
+            thread.join()
+            return {"FailedRecordCount": 0, "Records": []}
+
+        kinesis_mock.put_records.side_effect = put_records
+
+        buffer.put("stream", b"data", "0")
+        buffer.flush()
+
+        assert locked == [False]
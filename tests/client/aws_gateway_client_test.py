@@ -0,0 +1,268 @@
+from tests.context import stateflow
+from tests.common.common_classes import stateflow
+from stateflow.client.aws_gateway_client import AWSGatewayClient
+from stateflow.client.fastapi.aws_gateway import AWSGatewayFastAPIClient
+from stateflow.client.fastapi.aws_lambda import AWSLambdaFastAPIClient
+from stateflow.client.async_http import AsyncLambdaInvoker
+from stateflow.client.future import StateflowFuture, StateflowFailure
+from stateflow.dataflow.event import Event, EventType
+from stateflow.dataflow.address import FunctionType, FunctionAddress
+from stateflow.serialization.pickle_serializer import PickleSerializer
+import asyncio
+import base64
+import boto3
+import httpx
+import json
+import pytest
+import time
+import uuid
+from unittest import mock
+
+
+def ping_event() -> Event:
+    return Event(
+        str(uuid.uuid4()),
+        FunctionAddress(FunctionType("", "", False), None),
+        EventType.Request.Ping,
+        {},
+    )
+
+
+def reply_body(request: httpx.Request) -> dict:
+    """Replies to the (encoded) event in a request, with its event id as return value."""
+    serializer = PickleSerializer()
+    event: Event = serializer.deserialize_event(
+        base64.b64decode(json.loads(request.content)["event"])
+    )
+    replies = [
+        sub_event.copy(
+            event_type=EventType.Reply.SuccessfulInvocation,
+            payload={"return_results": sub_event.event_id},
+        )
+        for sub_event in event.unpack()
+    ]
+    reply: Event = (
+        Event.pack(event.event_id, event.fun_address, replies, reply=True)
+        if event.is_batch()
+        else replies[0]
+    )
+    return {"event": base64.b64encode(serializer.serialize_event(reply)).decode()}
+
+
+class TestAWSGatewayClient:
+    def setup_client(
+        self, handler, max_concurrency: int = 100, binary: bool = False
+    ) -> AWSGatewayClient:
+        client = AWSGatewayClient(
+            stateflow.init(),
+            "https://gateway",
+            max_concurrency=max_concurrency,
+            binary=binary,
+        )
+        client.http.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return client
+
+    def test_bounded_concurrency(self):
+        in_flight = []
+        max_in_flight = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            in_flight.append(request)
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(request)
+            return httpx.Response(200, json=reply_body(request))
+
+        client = self.setup_client(handler, max_concurrency=4)
+
+        events = [ping_event() for _ in range(20)]
+        futures = [client.send(event) for event in events]
+
+        assert [future.get(timeout=5) for future in futures] == [
+            event.event_id for event in events
+        ]
+        assert max(max_in_flight) == 4
+
+        client.stop()
+
+    def test_send_does_not_block(self):
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json=reply_body(request))
+
+        client = self.setup_client(handler)
+
+        start = time.perf_counter()
+        futures = [client.send(ping_event()) for _ in range(50)]
+        assert time.perf_counter() - start < 0.2
+
+        [future.get(timeout=5) for future in futures]
+        assert time.perf_counter() - start < 1
+
+        client.stop()
+
+    def test_failed_request(self):
+        client = self.setup_client(lambda request: httpx.Response(502))
+
+        future: StateflowFuture = client.send(ping_event())
+        with pytest.raises(StateflowFailure):
+            future.get(timeout=5)
+
+        client.stop()
+
+    def test_invalid_reply(self):
+        client = self.setup_client(lambda request: httpx.Response(200, text="not json"))
+
+        future: StateflowFuture = client.send(ping_event())
+        with pytest.raises(StateflowFailure):
+            future.get(timeout=5)
+
+        client.stop()
+
+    def test_send_batch(self):
+        client = self.setup_client(
+            lambda request: httpx.Response(200, json=reply_body(request))
+        )
+
+        events = [ping_event() for _ in range(3)]
+        assert client.send_batch(events).get(timeout=5) == [
+            event.event_id for event in events
+        ]
+
+        client.stop()
+
+    def test_binary(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            event: Event = PickleSerializer().deserialize_event(request.content)
+            reply: Event = event.copy(
+                event_type=EventType.Reply.SuccessfulInvocation,
+                payload={"return_results": event.event_id},
+            )
+            return httpx.Response(
+                200,
+                headers={"Content-Type": "application/octet-stream"},
+                content=PickleSerializer().serialize_event(reply),
+            )
+
+        client = self.setup_client(handler, binary=True)
+
+        event: Event = ping_event()
+        assert client.send(event).get(timeout=5) == event.event_id
+        assert requests[0].headers["Content-Type"] == "application/octet-stream"
+        assert requests[0].headers["Accept"] == "application/octet-stream"
+
+        client.stop()
+
+
+class TestAWSFastAPIClients:
+    def send_and_wait(self, client) -> StateflowFuture:
+        event: Event = ping_event()
+        future: StateflowFuture = StateflowFuture(
+            event.event_id, time.time(), event.fun_address, None
+        )
+        asyncio.run(client.send_and_wait_with_future(event, future, "Timed out."))
+        return future
+
+    def test_gateway_invalid_reply(self):
+        client = AWSGatewayFastAPIClient(stateflow.init(), "https://gateway")
+        client.http.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, text="not json")
+            )
+        )
+
+        with pytest.raises(StateflowFailure):
+            self.send_and_wait(client).get(timeout=5)
+
+    def test_gateway_timeout(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("Timed out.", request=request)
+
+        client = AWSGatewayFastAPIClient(stateflow.init(), "https://gateway")
+        client.http.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        with pytest.raises(StateflowFailure) as exc:
+            self.send_and_wait(client).get(timeout=5)
+        assert exc.value.error_msg == "Timed out."
+
+    def test_lambda_function_error(self):
+        client = AWSLambdaFastAPIClient(
+            stateflow.init(), "stateflow", region="eu-west-1"
+        )
+        client.invoker = mock.MagicMock()
+        client.invoker.invoke = mock.AsyncMock(side_effect=AttributeError("Oops"))
+
+        with pytest.raises(StateflowFailure):
+            self.send_and_wait(client).get(timeout=5)
+
+
+class TestAsyncLambdaInvoker:
+    def setup_invoker(self, handler) -> AsyncLambdaInvoker:
+        session = boto3.session.Session(
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+            region_name="eu-west-1",
+        )
+        invoker = AsyncLambdaInvoker("stateflow", session=session)
+        invoker.pool.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return invoker
+
+    def test_signed_invoke(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, content=b'{"body": "{}"}')
+
+        invoker = self.setup_invoker(handler)
+        assert asyncio.run(invoker.invoke(b'{"event": ""}')) == b'{"body": "{}"}'
+
+        request: httpx.Request = requests[0]
+        assert (
+            str(request.url)
+            == "https://lambda.eu-west-1.amazonaws.com/2015-03-31/functions/stateflow/invocations"
+        )
+        assert request.content == b'{"event": ""}'
+        assert request.headers["Authorization"].startswith(
+            "AWS4-HMAC-SHA256 Credential=testing/"
+        )
+        assert "/eu-west-1/lambda/aws4_request" in request.headers["Authorization"]
+
+    def test_concurrent_invokes(self):
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, content=request.content)
+
+        invoker = self.setup_invoker(handler)
+
+        async def invoke_all():
+            return await asyncio.gather(
+                *[invoker.invoke(str(i).encode()) for i in range(50)]
+            )
+
+        start = time.perf_counter()
+        assert asyncio.run(invoke_all()) == [str(i).encode() for i in range(50)]
+        assert time.perf_counter() - start < 1
+
+    def test_function_error(self):
+        invoker = self.setup_invoker(
+            lambda request: httpx.Response(
+                200,
+                headers={"X-Amz-Function-Error": "Unhandled"},
+                content=b'{"errorMessage": "Oops"}',
+            )
+        )
+
+        with pytest.raises(AttributeError):
+            asyncio.run(invoker.invoke(b"{}"))
+
+    def test_requires_region(self, monkeypatch):
+        monkeypatch.delenv("AWS_DEFAULT_REGION", raising=False)
+        monkeypatch.delenv("AWS_REGION", raising=False)
+        monkeypatch.setenv("AWS_CONFIG_FILE", "/dev/null")
+
+        with pytest.raises(AttributeError):
+            AsyncLambdaInvoker("stateflow")
@@ -1,7 +1,11 @@
 import pytest
 from tests.context import stateflow
 from tests.common.common_classes import User
-from stateflow.client.future import StateflowFuture, StateflowFailure
+from stateflow.client.future import (
+    StateflowFuture,
+    StateflowBatchFuture,
+    StateflowFailure,
+)
 from stateflow.dataflow.event import EventType, Event
 from stateflow.dataflow.address import FunctionAddress, FunctionType
 from stateflow.client.class_ref import ClassRef
@@ -195,3 +199,49 @@ def test_failure_object():
 
     assert str(failure) == "StateflowFailure: an error"
     assert repr(failure) == "StateflowFailure: an error"
+
+
+def test_batch_future_complete():
+    address = FunctionAddress(FunctionType("global", "Item", True), "coke")
+    futures = [StateflowFuture(str(i), 123, address, None) for i in range(3)]
+    batch_future = StateflowBatchFuture("batch", 123, futures)
+
+    # Partial completion by a single reply.
+    batch_future.complete(
+        Event(
+            "1",
+            address,
+            EventType.Reply.SuccessfulInvocation,
+            {"return_results": [True]},
+        )
+    )
+    assert not batch_future.is_completed
+
+    # The remaining events are completed by a batched reply.
+    batch_future.complete(
+        Event.pack(
+            "batch",
+            address,
+            [
+                Event(
+                    "0",
+                    address,
+                    EventType.Reply.SuccessfulInvocation,
+                    {"return_results": [1, 2]},
+                ),
+                Event(
+                    "2",
+                    address,
+                    EventType.Reply.KeyNotFound,
+                    {"error_message": "not found"},
+                ),
+            ],
+            reply=True,
+        )
+    )
+
+    result = batch_future.get()
+    assert batch_future.is_completed
+    assert result[0] == (1, 2)
+    assert result[1] is True
+    assert isinstance(result[2], StateflowFailure)
@@ -11,6 +11,9 @@ from stateflow.client.kafka_client import (
     FunctionType,
 )
 from stateflow.client.class_ref import ClassRef
+from stateflow.client.fastapi.kafka import KafkaFastAPIClient
+from stateflow.dataflow.address import ReplyAddress
+from stateflow.serialization.json_serde import JsonSerializer
 from unittest import mock
 
 
@@ -45,3 +48,89 @@ class TestStateflowKafkaClient:
         self.client.running = False
 
         self.producer_mock.produce.assert_called_once()
+
+    def test_send_batch_json(self):
+        self.client.running = False
+        self.client.serializer = JsonSerializer()
+        self.client.request_partitions = 4
+
+        events = [
+            Event(
+                str(i),
+                FunctionAddress(FunctionType("global", "User", True), "test-user"),
+                EventType.Request.InvokeStateful,
+                {},
+            )
+            for i in range(3)
+        ]
+        partition = self.client._batch_group(events[0])
+
+        self.client.send_batch(events)
+
+        self.producer_mock.produce.assert_called_once()
+        assert self.producer_mock.produce.call_args[1]["partition"] == partition
+
+    def test_send_with_reply_partition(self):
+        self.client.running = False
+
+        client: StateflowKafkaClient = StateflowKafkaClient.__new__(
+            StateflowKafkaClient
+        )
+        client._set_producer = lambda _: self.producer_mock
+        consumer_mock = mock.MagicMock(Consumer)
+        consumer_mock.poll = lambda _: None
+        client._set_consumer = lambda _: consumer_mock
+        client.__init__(stateflow.init(), "", reply_partition=3)
+
+        event = Event(
+            "123",
+            FunctionAddress(FunctionType("global", "User", True), "test-user"),
+            EventType.Request.InvokeStateful,
+            {},
+        )
+        client.send(event, ClassRef)
+
+        client.running = False
+        client.consumer_thread.join()
+
+        assert event.reply_to == ReplyAddress("client_reply", 3)
+        consumer_mock.assign.assert_called_once()
+        consumer_mock.subscribe.assert_not_called()
+
+    def test_discard_foreign_reply_by_key(self):
+        self.client.running = False
+        self.client.consumer_thread.join()
+
+        foreign_msg = mock.MagicMock()
+        foreign_msg.error.return_value = None
+        foreign_msg.key.return_value = b"not-my-event"
+
+        messages = [foreign_msg]
+
+        def poll(_):
+            if not messages:
+                self.client.running = False
+                return None
+            return messages.pop()
+
+        self.consumer_mock.poll = poll
+        self.client.serializer = mock.MagicMock()
+        self.client.running = True
+        self.client.start_consuming()
+
+        self.client.serializer.deserialize_event.assert_not_called()
+        foreign_msg.value.assert_not_called()
+
+
+class TestKafkaFastAPIClient:
+    def test_create_reply_topic(self):
+        with mock.patch(
+            "stateflow.client.fastapi.kafka.create_topics"
+        ) as create_topics:
+            client = KafkaFastAPIClient(stateflow.init(), reply_topic_suffix="client-1")
+
+        assert client.reply_topic == "client_reply_client-1"
+        assert client.reply_address == ReplyAddress("client_reply_client-1")
+        create_topics.assert_called_once()
+        [topic] = create_topics.call_args[0][1]
+        assert topic.topic == "client_reply_client-1"
@@ -198,6 +198,54 @@ class TestStatefulOperator:
         assert return_event.event_type == EventType.Reply.KeyNotFound
         assert updated_state is None
 
+    def test_handle_state(self, setup):
+        operator: StatefulOperator = setup[0]
+
+        init_event = operator.handle_create(
+            Event(
+                str(uuid.uuid4()),
+                FunctionAddress(FunctionType("global", "User", True), None),
+                EventType.Request.InitClass,
+                {"args": Arguments({"username": "wouter"})},
+            )
+        )
+        return_event, state = operator.handle_state(init_event, None)
+        assert return_event.event_type == EventType.Reply.SuccessfulCreateClass
+        assert isinstance(state, State)
+
+        # Multiple invocations on the same (deserialized) state.
+        for _ in range(3):
+            event = Event(
+                str(uuid.uuid4()),
+                FunctionAddress(FunctionType("global", "User", True), "wouter"),
+                EventType.Request.InvokeStateful,
+                {"args": Arguments({"x": 5}), "method_name": "update_balance"},
+            )
+            return_event, state = operator.handle_state(event, state)
+            assert return_event.event_type == EventType.Reply.SuccessfulInvocation
+
+        assert state["balance"] == 15
+
+        # The state is kept if the instance already exists.
+        return_event, existing_state = operator.handle_state(init_event, state)
+        assert return_event.event_type == EventType.Reply.FailedInvocation
+        assert existing_state is state
+
+    def test_handle_state_does_not_exist(self, setup):
+        operator: StatefulOperator = setup[0]
+
+        event = Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), "wouter"),
+            EventType.Request.InvokeStateful,
+            {"args": Arguments({"x": 5}), "method_name": "update_balance"},
+        )
+
+        return_event, state = operator.handle_state(event, None)
+
+        assert return_event.event_type == EventType.Reply.KeyNotFound
+        assert state is None
+
     @staticmethod
     def bytes_to_state(state: bytes) -> State:
         return State(JsonSerializer().deserialize_dict(state))
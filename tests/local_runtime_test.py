@@ -3,6 +3,7 @@ from .context import stateflow
 
 from stateflow import stateflow_test
 from tests.common.common_classes import User, Item
+from stateflow.client.future import StateflowFailure
 
 
 def test_user():
@@ -11,3 +12,19 @@ def test_user():
 
     assert user.balance == 10
     assert user.username == "kyriakos"
+
+
+def test_bulk_create_find_and_invoke(stateflow_test):
+    items = stateflow_test.bulk_create(
+        Item, [("coke", 2), {"item_name": "pepsi", "price": 3}]
+    )
+
+    assert [item._fun_addr.key for item in items] == ["coke", "pepsi"]
+
+    results = stateflow_test.bulk_invoke(items, "update_stock", [(5,), {"amount": -1}])
+    assert results == [True, False]
+    assert items[0].stock == 5
+
+    found = stateflow_test.bulk_find(Item, ["pepsi", "fanta"])
+    assert found[0]._fun_addr.key == "pepsi"
+    assert isinstance(found[1], StateflowFailure)
@@ -0,0 +1,65 @@
+from tests.context import stateflow
+from tests.common.common_classes import stateflow, User
+from stateflow.runtime.aws.gateway_lambda import AWSGatewayLambdaRuntime
+from stateflow.runtime.aws.kinesis_lambda import AWSKinesisLambdaRuntime
+from stateflow.util.aws_benchmark import AWSLambdaBenchmark, EventRecorder
+
+
+def record_workload(recorder: EventRecorder, users: int):
+    for i in range(users):
+        User(f"user-{i}")
+    create_events = recorder.record()
+
+    for i in range(users):
+        User(__key=f"user-{i}").update_balance(1)
+    User(__key="unknown-user").update_balance(1)
+    invoke_events = recorder.record()
+
+    return create_events, invoke_events
+
+
+class TestAWSLambdaBenchmark:
+    def test_gateway_benchmark(self):
+        flow = stateflow.init()
+        recorder = EventRecorder(flow)
+        create_events, invoke_events = record_workload(recorder, 10)
+
+        with AWSLambdaBenchmark(
+            flow, AWSGatewayLambdaRuntime, concurrency=2
+        ) as benchmark:
+            result = benchmark.run(create_events, "create")
+            assert result.events == 10
+            assert result.invocations == 10
+            assert result.failures == 0
+
+            result = benchmark.run(invoke_events, "invoke")
+
+        assert result.invocations == 11
+        assert result.failures == 1
+        assert result.latency.count == 11
+        assert result.throughput > 0
+
+        for phase in ["lock", "read", "execute", "write", "unlock"]:
+            assert result.phases[(phase, "global/User", "update_balance")].count == 11
+        assert "invoke: 11 events in 11 invocations" in result.report()
+
+    def test_kinesis_benchmark(self):
+        flow = stateflow.init()
+        recorder = EventRecorder(flow)
+        create_events, invoke_events = record_workload(recorder, 10)
+
+        with AWSLambdaBenchmark(
+            flow,
+            AWSKinesisLambdaRuntime,
+            concurrency=2,
+            batch_size=4,
+            optimistic=True,
+        ) as benchmark:
+            benchmark.run(create_events, "create")
+            result = benchmark.run(invoke_events, "invoke")
+
+        assert result.invocations == 3
+        assert result.failures == 1
+        assert len(result.errors) == 0
+        # A commit per key, also for the unknown user (without any writes).
+        assert result.phases[("commit", None, None)].count == 11
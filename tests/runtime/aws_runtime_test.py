@@ -1,9 +1,13 @@
 import base64
 from tests.context import stateflow
-from tests.common.common_classes import stateflow
-from stateflow.runtime.aws.abstract_lambda import AWSLambdaRuntime
+from tests.common.common_classes import stateflow, User, Item
+from stateflow.runtime.aws.abstract_lambda import AWSLambdaRuntime, StateflowRecord
 from stateflow.runtime.aws.kinesis_lambda import AWSKinesisLambdaRuntime
 from stateflow.runtime.aws.gateway_lambda import AWSGatewayLambdaRuntime
+from stateflow.runtime.aws.state_cache import StateCache
+from stateflow.runtime.metrics import LocalMetricsCollector
+from stateflow.util.local_runtime import LocalRuntime
+from stateflow.util.aws_benchmark import EventRecorder
 from stateflow.dataflow.event import Event, EventType
 from stateflow.dataflow.event_flow import InternalClassRef
 from stateflow.dataflow.state import State
@@ -14,9 +18,65 @@ from stateflow.dataflow.address import FunctionType, FunctionAddress
 from python_dynamodb_lock.python_dynamodb_lock import *
 import uuid
 from unittest import mock
+from moto import mock_aws
+from botocore.config import Config
+import boto3
+import pytest
 import json
 
 
+@pytest.fixture
+def dynamodb(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-west-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    with mock_aws():
+        StateflowRecord.create_table(
+            read_capacity_units=1, write_capacity_units=1, wait=True
+        )
+        yield
+
+
+class LambdaClient(LocalRuntime):
+    """A client which executes events directly in a Lambda runtime."""
+
+    def __init__(self, runtime: AWSLambdaRuntime):
+        super().__init__(runtime.flow)
+        self.runtime = runtime
+        self.events = []
+
+    def execute_event(self, event: bytes) -> Event:
+        parsed_event: Event = self.runtime.ingress_router.parse(event)
+        self.events.append(parsed_event)
+        return self.runtime.execute_event(parsed_event)
+
+
+def gateway_event(event: Event):
+    serialized_event = PickleSerializer().serialize_event(event)
+    return {"body": json.dumps({"event": base64.b64encode(serialized_event).decode()})}
+
+
+def kinesis_event(events):
+    return {
+        "Records": [
+            {
+                "kinesis": {
+                    "data": base64.b64encode(PickleSerializer().serialize_event(event)),
+                    "sequenceNumber": str(i),
+                }
+            }
+            for i, event in enumerate(events)
+        ]
+    }
+
+
+def gateway_reply(reply) -> Event:
+    return PickleSerializer().deserialize_event(
+        base64.b64decode(json.loads(reply["body"])["event"])
+    )
+
+
 class TestAWSRuntime:
     def setup_handle(self):
         return AWSKinesisLambdaRuntime.get_handler(stateflow.init())
@@ -26,6 +86,7 @@ class TestAWSRuntime:
 
     def test_simple_event(self):
         kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
         lock_mock = mock.MagicMock(DynamoDBLockClient)
 
         AWSKinesisLambdaRuntime._setup_dynamodb = lambda x, y: None
@@ -53,10 +114,10 @@ class TestAWSRuntime:
         handler(json_event, None)
 
         lock_mock.acquire_lock.assert_called_once()
-        kinesis_mock.put_record.assert_called_once()
+        kinesis_mock.put_records.assert_called_once()
 
         lock_mock.reset_mock()
-        kinesis_mock.reset_mock()
+        kinesis_mock.put_records.reset_mock()
 
         event: Event = Event(
             event_id,
@@ -95,7 +156,7 @@ class TestAWSRuntime:
         handler(json_event, None)
 
         lock_mock.acquire_lock.assert_called_once()
-        kinesis_mock.put_record.assert_called_once()
+        kinesis_mock.put_records.assert_called_once()
 
     def test_simple_event_gateway(self):
         lock_mock = mock.MagicMock(DynamoDBLockClient)
@@ -164,3 +225,662 @@ class TestAWSRuntime:
         handler(json_event, None)
 
         lock_mock.acquire_lock.assert_called_once()
+
+
+class TestOptimisticAWSRuntime:
+    def setup_handle(self, state_cache=None):
+        inst, handler = AWSGatewayLambdaRuntime.get_handler(
+            stateflow.init(), optimistic=True, state_cache=state_cache
+        )
+        return inst, handler
+
+    def create_user(self, handler):
+        event: Event = Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), None),
+            EventType.Request.InitClass,
+            {"args": Arguments({"username": "wouter"})},
+        )
+        return gateway_reply(handler(gateway_event(event), None))
+
+    def update_balance(self, handler, x: int):
+        event: Event = Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), "wouter"),
+            EventType.Request.InvokeStateful,
+            {"args": Arguments({"x": x}), "method_name": "update_balance"},
+        )
+        return gateway_reply(handler(gateway_event(event), None))
+
+    def get_balance(self, inst) -> int:
+        state, _ = inst.get_versioned_state("global/User_wouter")
+        return PickleSerializer().deserialize_dict(state)["balance"]
+
+    def test_versioned_writes(self, dynamodb):
+        inst, handler = self.setup_handle()
+        assert inst.lock_client is None
+
+        reply = self.create_user(handler)
+        assert reply.event_type == EventType.Reply.SuccessfulCreateClass
+        assert StateflowRecord.get("global/User_wouter").version == 1
+
+        # Creating the same key again fails.
+        reply = self.create_user(handler)
+        assert reply.event_type == EventType.Reply.FailedInvocation
+        assert StateflowRecord.get("global/User_wouter").version == 1
+
+        reply = self.update_balance(handler, 5)
+        assert reply.event_type == EventType.Reply.SuccessfulInvocation
+        assert StateflowRecord.get("global/User_wouter").version == 2
+        assert self.get_balance(inst) == 5
+
+        # Reading state does not write it.
+        event: Event = Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), "wouter"),
+            EventType.Request.GetState,
+            {"attribute": "balance"},
+        )
+        reply = gateway_reply(handler(gateway_event(event), None))
+        assert reply.payload["state"] == 5
+        assert StateflowRecord.get("global/User_wouter").version == 2
+
+    def test_retry_on_conflict(self, dynamodb):
+        inst, handler = self.setup_handle()
+        self.create_user(handler)
+
+        save_versioned_state = inst.save_versioned_state
+        conflicts = []
+
+        def concurrent_save(key, state, version):
+            # Another invocation commits its state, right before this invocation does.
+            if len(conflicts) == 0:
+                concurrent_state, concurrent_version = inst.get_versioned_state(key)
+                state_dict = PickleSerializer().deserialize_dict(concurrent_state)
+                state_dict["balance"] = 100
+                assert save_versioned_state(
+                    key,
+                    PickleSerializer().serialize_dict(state_dict),
+                    concurrent_version,
+                )
+
+            result = save_versioned_state(key, state, version)
+            conflicts.append(not result)
+            return result
+
+        inst.save_versioned_state = concurrent_save
+
+        reply = self.update_balance(handler, 5)
+        assert reply.event_type == EventType.Reply.SuccessfulInvocation
+        assert conflicts == [True, False]
+        assert StateflowRecord.get("global/User_wouter").version == 3
+        assert self.get_balance(inst) == 105
+
+    def test_write_unversioned_record(self, dynamodb):
+        inst, handler = self.setup_handle()
+
+        # A record written with locks, has no version yet.
+        inst.save_state("global/User_wouter", b"state")
+        state, version = inst.get_versioned_state("global/User_wouter")
+        assert version == 0
+
+        assert inst.save_versioned_state("global/User_wouter", b"new_state", version)
+        assert not inst.save_versioned_state("global/User_wouter", b"state", version)
+        assert StateflowRecord.get("global/User_wouter").version == 1
+
+    def test_metrics(self, dynamodb):
+        metrics = LocalMetricsCollector()
+        inst, handler = AWSGatewayLambdaRuntime.get_handler(
+            stateflow.init(), optimistic=True, metrics=metrics
+        )
+
+        self.create_user(handler)
+        self.update_balance(handler, 5)
+
+        for phase in ["read", "execute", "write"]:
+            assert metrics.get(phase, "global/User", "update_balance").count == 1
+            assert metrics.get(phase, "global/User", "InitClass").count == 1
+        assert metrics.get("invocation").count == 2
+        assert metrics.get("conflict", "global/User", "update_balance") is None
+
+    def test_cache_requires_optimistic(self):
+        with pytest.raises(AttributeError):
+            AWSGatewayLambdaRuntime(stateflow.init(), state_cache=StateCache())
+
+    def test_cache_hit_skips_read(self, dynamodb):
+        inst, handler = self.setup_handle(StateCache())
+        self.create_user(handler)
+
+        with mock.patch.object(
+            inst, "get_versioned_state", wraps=inst.get_versioned_state
+        ) as get_versioned_state:
+            for _ in range(3):
+                self.update_balance(handler, 5)
+
+            get_versioned_state.assert_not_called()
+
+        assert inst.state_cache.get("global/User_wouter")[1] == 4
+        assert StateflowRecord.get("global/User_wouter").version == 4
+        assert self.get_balance(inst) == 15
+
+    def test_stale_cache(self, dynamodb):
+        inst, handler = self.setup_handle(StateCache())
+        self.create_user(handler)
+
+        # Another container updates the state, so the cached state is stale.
+        other_inst, other_handler = self.setup_handle()
+        self.update_balance(other_handler, 100)
+
+        reply = self.update_balance(handler, 5)
+        assert reply.event_type == EventType.Reply.SuccessfulInvocation
+        assert self.get_balance(inst) == 105
+        assert inst.state_cache.get("global/User_wouter")[1] == 3
+
+    def get_state_event(self) -> Event:
+        return Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), "wouter"),
+            EventType.Request.GetState,
+            {"attribute": "balance"},
+        )
+
+    def test_read_fills_cache(self, dynamodb):
+        # The user is created by another container, so it is not cached yet.
+        other_inst, other_handler = self.setup_handle()
+        self.create_user(other_handler)
+        self.update_balance(other_handler, 5)
+
+        inst, handler = self.setup_handle(StateCache())
+        with mock.patch.object(
+            inst, "get_versioned_state", wraps=inst.get_versioned_state
+        ) as get_versioned_state:
+            for _ in range(3):
+                reply = gateway_reply(
+                    handler(gateway_event(self.get_state_event()), None)
+                )
+                assert reply.payload["state"] == 5
+
+            get_versioned_state.assert_called_once()
+
+        assert inst.state_cache.get("global/User_wouter")[1] == 2
+
+    def test_stale_read_bounded_by_ttl(self, dynamodb):
+        inst, handler = self.setup_handle(StateCache(ttl=1.0))
+        self.create_user(handler)
+
+        other_inst, other_handler = self.setup_handle()
+        self.update_balance(other_handler, 100)
+
+        with mock.patch("stateflow.runtime.aws.state_cache.time") as time_mock:
+            time_mock.monotonic.return_value = 0.0
+            inst.state_cache.put(
+                "global/User_wouter", *inst.state_cache.get("global/User_wouter")
+            )
+
+            # Within the TTL, the read is served from the (stale) cache.
+            time_mock.monotonic.return_value = 0.5
+            reply = gateway_reply(handler(gateway_event(self.get_state_event()), None))
+            assert reply.payload["state"] == 0
+
+            # After the TTL, the latest state is read.
+            time_mock.monotonic.return_value = 1.5
+            reply = gateway_reply(handler(gateway_event(self.get_state_event()), None))
+            assert reply.payload["state"] == 100
+
+
+class TestPrefetchAWSRuntime:
+    def setup_client(self, state_cache=None) -> LambdaClient:
+        runtime = AWSGatewayLambdaRuntime(
+            stateflow.init(), optimistic=True, state_cache=state_cache, prefetch=True
+        )
+        return LambdaClient(runtime)
+
+    def setup_user_and_item(self):
+        user = User("wouter")
+        user.update_balance(10)
+        item = Item("coke", 2)
+        item.update_stock(5)
+        return user, item
+
+    def test_prefetch_requires_optimistic(self):
+        with pytest.raises(AttributeError):
+            AWSGatewayLambdaRuntime(stateflow.init(), prefetch=True)
+
+    def test_buy_item_flow(self, dynamodb):
+        client = self.setup_client()
+        runtime = client.runtime
+        user, item = self.setup_user_and_item()
+
+        with mock.patch.object(
+            runtime, "get_versioned_state", wraps=runtime.get_versioned_state
+        ) as get_versioned_state, mock.patch.object(
+            runtime,
+            "batch_get_versioned_state",
+            wraps=runtime.batch_get_versioned_state,
+        ) as batch_get_versioned_state, mock.patch.object(
+            runtime, "commit_versioned_states", wraps=runtime.commit_versioned_states
+        ) as commit_versioned_states:
+            assert user.buy_item(2, item)
+
+            get_versioned_state.assert_not_called()
+            batch_get_versioned_state.assert_called_once()
+            commit_versioned_states.assert_called_once()
+
+        assert set(runtime.flow_keys(client.events[-1])) == {
+            "global/User_wouter",
+            "global/Item_coke",
+        }
+        # Both keys are committed once by the flow.
+        assert StateflowRecord.get("global/User_wouter").version == 3
+        assert StateflowRecord.get("global/Item_coke").version == 3
+        assert user.balance == 6
+        assert item.stock == 3
+
+    def test_flow_metrics(self, dynamodb):
+        client = self.setup_client()
+        user, item = self.setup_user_and_item()
+
+        metrics = LocalMetricsCollector()
+        client.runtime.metrics = metrics
+        user.buy_item(2, item)
+        client.runtime.flush_metrics()
+
+        assert metrics.get("execute", "global/User", "buy_item_0").count == 1
+        assert metrics.get("execute", "global/Item", "update_stock").count == 1
+        assert metrics.get("prefetch").count == 1
+        assert metrics.get("commit").count == 1
+
+    def test_retry_flow_on_conflict(self, dynamodb):
+        client = self.setup_client(StateCache())
+        runtime = client.runtime
+        user, item = self.setup_user_and_item()
+
+        commit_versioned_states = runtime.commit_versioned_states
+        conflicts = []
+
+        def concurrent_commit(writes):
+            # Another invocation takes stock, right before this invocation commits.
+            if len(conflicts) == 0:
+                state, version = runtime.get_versioned_state("global/Item_coke")
+                state_dict = PickleSerializer().deserialize_dict(state)
+                state_dict["stock"] = 2
+                assert runtime.save_versioned_state(
+                    "global/Item_coke",
+                    PickleSerializer().serialize_dict(state_dict),
+                    version,
+                )
+
+            result = commit_versioned_states(writes)
+            conflicts.append(not result)
+            return result
+
+        runtime.commit_versioned_states = concurrent_commit
+
+        # Only 2 items are left, so the retried flow fails to buy 3 items.
+        assert not user.buy_item(3, item)
+
+        # The retried flow does not change any state, so it has nothing to commit.
+        assert conflicts == [True]
+
+        assert user.balance == 10
+        assert item.stock == 2
+
+
+class TestBatchKinesisAWSRuntime:
+    def update_balance_event(self, username: str, x: int) -> Event:
+        return Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), username),
+            EventType.Request.InvokeStateful,
+            {"args": Arguments({"x": x}), "method_name": "update_balance"},
+        )
+
+    def init_event(self, username: str) -> Event:
+        return Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), None),
+            EventType.Request.InitClass,
+            {"args": Arguments({"username": username})},
+        )
+
+    def test_group_per_key(self, dynamodb):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
+
+        with mock.patch.object(
+            AWSKinesisLambdaRuntime, "_setup_kinesis", lambda x, y: kinesis_mock
+        ):
+            inst, handler = AWSKinesisLambdaRuntime.get_handler(
+                stateflow.init(), optimistic=True
+            )
+
+        handler(
+            kinesis_event([self.init_event("wouter"), self.init_event("kyriakos")]),
+            None,
+        )
+
+        events = []
+        for _ in range(5):
+            events.append(self.update_balance_event("wouter", 1))
+            events.append(self.update_balance_event("kyriakos", 2))
+
+        batch_events = [self.update_balance_event("wouter", 1) for _ in range(2)]
+        events.append(
+            Event.pack(str(uuid.uuid4()), batch_events[0].fun_address, batch_events)
+        )
+
+        kinesis_mock.put_records.reset_mock()
+        with mock.patch.object(
+            inst, "get_versioned_state", wraps=inst.get_versioned_state
+        ) as get_versioned_state, mock.patch.object(
+            inst, "commit_versioned_states", wraps=inst.commit_versioned_states
+        ) as commit_versioned_states:
+            handler(kinesis_event(events), None)
+
+            # A single read and write per key.
+            assert get_versioned_state.call_count == 2
+            assert commit_versioned_states.call_count == 2
+
+        # A reply per record, in order of the records.
+        records = kinesis_mock.put_records.call_args[1]["Records"]
+        assert [record["PartitionKey"] for record in records] == [
+            event.event_id for event in events
+        ]
+
+        batch_reply: Event = PickleSerializer().deserialize_event(records[-1]["Data"])
+        assert batch_reply.event_type == EventType.Reply.BatchResult
+        assert [reply.event_id for reply in batch_reply.unpack()] == [
+            event.event_id for event in batch_events
+        ]
+
+        for username, balance in [("wouter", 7), ("kyriakos", 10)]:
+            state, version = inst.get_versioned_state(f"global/User_{username}")
+            assert PickleSerializer().deserialize_dict(state)["balance"] == balance
+            assert version == 2
+
+    def test_report_failed_groups(self, dynamodb):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
+
+        with mock.patch.object(
+            AWSKinesisLambdaRuntime, "_setup_kinesis", lambda x, y: kinesis_mock
+        ):
+            inst, handler = AWSKinesisLambdaRuntime.get_handler(
+                stateflow.init(), optimistic=True
+            )
+
+        handler(
+            kinesis_event([self.init_event("wouter"), self.init_event("kyriakos")]),
+            None,
+        )
+
+        events = []
+        for _ in range(2):
+            events.append(self.update_balance_event("wouter", 1))
+            events.append(self.update_balance_event("kyriakos", 2))
+
+        execute_transaction = inst._execute_transaction
+
+        def failing_transaction(group_events):
+            if group_events[0].fun_address.key == "kyriakos":
+                raise AttributeError("Could not commit.")
+            return execute_transaction(group_events)
+
+        kinesis_mock.put_records.reset_mock()
+        with mock.patch.object(inst, "_execute_transaction", failing_transaction):
+            result = handler(kinesis_event(events), None)
+
+        # Only the records of the failed group are retried.
+        assert result == {
+            "batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "3"}]
+        }
+        records = kinesis_mock.put_records.call_args[1]["Records"]
+        assert [record["PartitionKey"] for record in records] == [
+            events[0].event_id,
+            events[2].event_id,
+        ]
+
+        for username, balance in [("wouter", 2), ("kyriakos", 0)]:
+            state, _ = inst.get_versioned_state(f"global/User_{username}")
+            assert PickleSerializer().deserialize_dict(state)["balance"] == balance
+
+    def test_stop_group_after_failure(self, dynamodb):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
+
+        lock_mock = mock.MagicMock(DynamoDBLockClient)
+
+        with mock.patch.object(
+            AWSKinesisLambdaRuntime, "_setup_kinesis", lambda x, y: kinesis_mock
+        ), mock.patch.object(
+            AWSKinesisLambdaRuntime, "_setup_lock_client", lambda x, y: lock_mock
+        ):
+            inst, handler = AWSKinesisLambdaRuntime.get_handler(stateflow.init())
+
+        events = [self.init_event("wouter"), self.init_event("kyriakos")]
+        handler(kinesis_event(events), None)
+
+        events = [
+            self.update_balance_event("wouter", 1),
+            self.update_balance_event("wouter", 2),
+            self.update_balance_event("wouter", 3),
+        ]
+        execute_flow = inst._execute_flow
+
+        def failing_flow(flow_event):
+            if flow_event.event_id == events[1].event_id:
+                raise AttributeError("Could not execute.")
+            return execute_flow(flow_event)
+
+        with mock.patch.object(inst, "_execute_flow", failing_flow):
+            result = handler(kinesis_event(events), None)
+
+        # The events after the failed event of a group are not executed, so they are retried in order.
+        assert result == {
+            "batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "2"}]
+        }
+        state, _ = inst.get_versioned_state("global/User_wouter")
+        assert PickleSerializer().deserialize_dict(state)["balance"] == 1
+
+    def test_group_flows_sharing_keys(self):
+        kinesis_mock = mock.MagicMock()
+        with mock.patch.object(
+            AWSKinesisLambdaRuntime, "_setup_kinesis", lambda x, y: kinesis_mock
+        ):
+            inst, _ = AWSKinesisLambdaRuntime.get_handler(
+                stateflow.init(), optimistic=True
+            )
+
+        recorder = EventRecorder(stateflow.init())
+        coke = Item(__key="coke")
+        User(__key="wouter").buy_item(1, coke)
+        User(__key="kyriakos").buy_item(1, coke)
+        User(__key="wouter").update_balance(1)
+        User(__key="henk").update_balance(1)
+        events = recorder.record()
+
+        # Both flows take stock of coke, so they are executed in the same group.
+        groups, sequential_events = inst._group_events(events)
+        assert groups == [events[:3], events[3:]]
+        assert sequential_events == []
+
+    def test_group_at_most_transaction_items(self, dynamodb):
+        kinesis_mock = mock.MagicMock()
+        kinesis_mock.put_records.return_value = {"FailedRecordCount": 0, "Records": []}
+        with mock.patch.object(
+            AWSKinesisLambdaRuntime, "_setup_kinesis", lambda x, y: kinesis_mock
+        ):
+            inst, handler = AWSKinesisLambdaRuntime.get_handler(
+                stateflow.init(), optimistic=True
+            )
+
+        recorder = EventRecorder(stateflow.init())
+        Item("coke", 1)
+        for i in range(120):
+            User(f"user-{i}")
+        handler(kinesis_event(recorder.record()), None)
+
+        Item(__key="coke").update_stock(120)
+        for i in range(120):
+            User(__key=f"user-{i}").update_balance(1)
+        handler(kinesis_event(recorder.record()), None)
+
+        coke = Item(__key="coke")
+        for i in range(120):
+            User(__key=f"user-{i}").buy_item(1, coke)
+        events = recorder.record()
+
+        # All flows take stock of coke, the group is full once it has coke and 99 users.
+        groups, sequential_events = inst._group_events(events)
+        assert groups == [events[:99]]
+        assert sequential_events == events[99:]
+
+        kinesis_mock.put_records.reset_mock()
+        handler(kinesis_event(events), None)
+
+        records = kinesis_mock.put_records.call_args[1]["Records"]
+        replies = [
+            PickleSerializer().deserialize_event(record["Data"]) for record in records
+        ]
+        assert [reply.event_id for reply in replies] == [
+            event.event_id for event in events
+        ]
+        assert all(
+            [
+                reply.event_type == EventType.Reply.SuccessfulInvocation
+                for reply in replies
+            ]
+        )
+
+        state, _ = inst.get_versioned_state("global/Item_coke")
+        assert PickleSerializer().deserialize_dict(state)["stock"] == 0
+
+        with pytest.raises(AttributeError):
+            inst.commit_versioned_states(
+                {f"global/User_user-{i}": (b"state", 1) for i in range(101)}
+            )
+
+
+class TestBinaryAWSRuntime:
+    def init_event(self) -> Event:
+        return Event(
+            str(uuid.uuid4()),
+            FunctionAddress(FunctionType("global", "User", True), None),
+            EventType.Request.InitClass,
+            {"args": Arguments({"username": "wouter"})},
+        )
+
+    def test_binary_gateway_event(self, dynamodb):
+        _, handler = AWSGatewayLambdaRuntime.get_handler(
+            stateflow.init(), optimistic=True
+        )
+
+        event: Event = self.init_event()
+        reply = handler(
+            {
+                "headers": {"content-type": "application/octet-stream"},
+                "isBase64Encoded": True,
+                "body": base64.b64encode(
+                    PickleSerializer().serialize_event(event)
+                ).decode(),
+            },
+            None,
+        )
+
+        assert reply["isBase64Encoded"]
+        assert reply["headers"]["Content-Type"] == "application/octet-stream"
+        reply_event: Event = PickleSerializer().deserialize_event(
+            base64.b64decode(reply["body"])
+        )
+        assert reply_event.event_id == event.event_id
+        assert reply_event.event_type == EventType.Reply.SuccessfulCreateClass
+
+        # The JSON envelope is still supported.
+        reply_event = gateway_reply(handler(gateway_event(self.init_event()), None))
+        assert reply_event.event_type == EventType.Reply.FailedInvocation
+
+    def test_compact_direct_invocation(self, dynamodb):
+        _, handler = AWSGatewayLambdaRuntime.get_handler(
+            stateflow.init(), gateway=False, optimistic=True
+        )
+
+        event: Event = self.init_event()
+        reply = handler(
+            base64.b64encode(PickleSerializer().serialize_event(event)).decode(), None
+        )
+
+        reply_event: Event = PickleSerializer().deserialize_event(
+            base64.b64decode(reply)
+        )
+        assert reply_event.event_id == event.event_id
+        assert reply_event.event_type == EventType.Reply.SuccessfulCreateClass
+
+
+class TestTableLayoutAWSRuntime:
+    def setup_client(self, **kwargs) -> LambdaClient:
+        runtime = AWSGatewayLambdaRuntime(
+            stateflow.init(), optimistic=True, prefetch=True, **kwargs
+        )
+        runtime.create_tables()
+        return LambdaClient(runtime)
+
+    def buy_item(self, client: LambdaClient):
+        user: User = User("wouter")
+        item: Item = Item("coke", 2)
+        user.update_balance(10)
+        item.update_stock(5)
+        assert user.buy_item(2, item)
+        assert user.balance == 6
+        assert item.stock == 3
+
+    def test_configured_table_and_region(self, dynamodb):
+        client = self.setup_client(
+            table_name="state", config=Config(region_name="us-east-1")
+        )
+        self.buy_item(client)
+
+        tables = boto3.client("dynamodb", region_name="us-east-1").list_tables()
+        assert tables["TableNames"] == ["state"]
+
+    def test_table_per_operator(self, dynamodb):
+        client = self.setup_client(table_per_operator=True)
+        self.buy_item(client)
+
+        tables = boto3.client("dynamodb", region_name="eu-west-1").list_tables()
+        assert set(tables["TableNames"]) >= {
+            "stateflow-global-User",
+            "stateflow-global-Item",
+        }
+        # Written by create, update_balance and buy_item, reading the balance does not write.
+        state, version = client.runtime.get_versioned_state("global/User_wouter")
+        assert version == 3
+
+    def test_composite_key(self, dynamodb):
+        client = self.setup_client(table_name="state", composite_key=True)
+        self.buy_item(client)
+        User("kyriakos")
+        User("adil")
+
+        record = client.runtime.record_classes["global/User"].get(
+            "global/User", "wouter"
+        )
+        assert record.version == 3
+
+        # The instances of an operator are scanned in order of their key.
+        users = list(client.runtime.scan_operator("global/User"))
+        assert [key for key, _ in users] == ["adil", "kyriakos", "wouter"]
+        assert PickleSerializer().deserialize_dict(users[-1][1])["balance"] == 6
+
+        assert [
+            key for key, _ in client.runtime.scan_operator("global/User", "kyriakos")
+        ] == ["kyriakos", "wouter"]
+
+    def test_scan_single_key(self, dynamodb):
+        client = self.setup_client()
+        self.buy_item(client)
+        User("kyriakos")
+
+        assert set(key for key, _ in client.runtime.scan_operator("global/User")) == {
+            "wouter",
+            "kyriakos",
+        }
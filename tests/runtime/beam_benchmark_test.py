@@ -0,0 +1,61 @@
+from tests.context import stateflow
+from tests.common.common_classes import stateflow, User
+from stateflow.runtime.memory_io import InMemoryBroker, InMemoryConsume, InMemoryProduce
+from stateflow.util.beam_benchmark import BeamBenchmark
+from stateflow.util.benchmark import EventRecorder
+from apache_beam.testing.util import assert_that, equal_to
+from apache_beam.testing.test_pipeline import TestPipeline
+import apache_beam as beam
+
+
+class TestInMemoryIO:
+    def test_consume_and_produce(self):
+        broker = InMemoryBroker()
+        broker.produce("request", b"a", b"1")
+        broker.produce("internal", b"b", b"2")
+        broker.produce("request", b"c", b"3")
+        broker.close()
+
+        with TestPipeline() as p:
+            output = (
+                p
+                | InMemoryConsume(broker.name, ["request", "internal"])
+                | beam.Map(lambda element: (element[0].decode(), element[1]))
+                | InMemoryProduce(broker.name, "reply")
+            )
+            assert_that(output, equal_to([("a", b"1"), ("b", b"2"), ("c", b"3")]))
+
+        assert sorted([message[1:] for message in broker.read("reply", 0, 10)]) == [
+            (b"a", b"1"),
+            (b"b", b"2"),
+            (b"c", b"3"),
+        ]
+        broker.remove()
+
+
+class TestBeamBenchmark:
+    def test_benchmark(self):
+        flow = stateflow.init()
+        recorder = EventRecorder(flow)
+
+        for i in range(10):
+            User(f"user-{i}")
+        create_events = recorder.record()
+
+        for i in range(10):
+            User(__key=f"user-{i}").update_balance(1)
+        User(__key="unknown-user").update_balance(1)
+        invoke_events = recorder.record()
+
+        with BeamBenchmark(flow, multiplexed=True) as benchmark:
+            result = benchmark.run(create_events, "create")
+            assert result.events == 10
+            assert result.failures == 0
+
+            result = benchmark.run(invoke_events, "invoke", rate=100)
+
+        assert result.events == 11
+        assert result.failures == 1
+        assert result.latency.count == 11
+        assert result.throughput > 0
+        assert "invoke: 11 events in 11 invocations" in result.report()
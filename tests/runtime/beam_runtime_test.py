@@ -1,6 +1,14 @@
 from tests.context import stateflow
-from stateflow.runtime.beam_runtime import BeamRuntime
+from tests.common.common_classes import stateflow
+from stateflow.runtime.beam_runtime import BeamRuntime, StateCoder, DeduplicatedState
+from stateflow.dataflow.state import State
 from apache_beam.testing.test_stream import TestStream
+from apache_beam.options.pipeline_options import (
+    PipelineOptions,
+    StandardOptions,
+    DirectOptions,
+    FlinkRunnerOptions,
+)
 import apache_beam as beam
 from apache_beam.testing import util as beam_test
 from hamcrest.core.base_matcher import BaseMatcher, Description
@@ -11,7 +19,21 @@ from stateflow.dataflow.event import (
 from stateflow.dataflow.address import FunctionAddress, FunctionType
 from stateflow.dataflow.args import Arguments
 import uuid
+from typing import Tuple
 from stateflow.serialization.json_serde import JsonSerializer
+from stateflow.runtime.KafkaConsumer import (
+    KafkaConsume,
+    _ConsumeKafkaTopic,
+    _ProduceKafkaMessage,
+)
+from apache_beam.io.restriction_trackers import OffsetRange, OffsetRestrictionTracker
+from confluent_kafka import TopicPartition, OFFSET_INVALID
+from types import SimpleNamespace
+import sys
+import time
+from stateflow.dataflow.address import ReplyAddress
+from unittest import mock
+import pytest
 
 
 class EventMatcher(BaseMatcher):
@@ -242,3 +264,569 @@ class TestBeamRuntime:
             label="CheckOutput",
         )
         self.run_and_reset()
+
+
+class TestMultiplexedBeamRuntime:
+    def setup_beam_runtime(self, multiplexed: bool = True, dedup_window: int = 0):
+        self.input = TestStream()
+        self.runtime: BeamRuntime = BeamRuntime(
+            stateflow.init(),
+            test_mode=True,
+            multiplexed=multiplexed,
+            dedup_window=dedup_window,
+        )
+        self.runtime._setup_kafka_client = lambda: self.input
+        self.runtime._setup_kafka_producer = lambda topic: beam.Map(lambda x: x)
+
+    @staticmethod
+    def init_event(event_id: str, class_name: str, args: dict) -> Tuple[bytes, bytes]:
+        return (
+            bytes(event_id, "utf-8"),
+            JsonSerializer().serialize_event(
+                Event(
+                    event_id,
+                    FunctionAddress(FunctionType("global", class_name, True), None),
+                    EventType.Request.InitClass,
+                    {"args": Arguments(args)},
+                )
+            ),
+        )
+
+    def test_state_namespaced_per_operator(self):
+        event_id: str = str(uuid.uuid4())
+        user_type: FunctionType = FunctionType("global", "User", True)
+        item_type: FunctionType = FunctionType("global", "Item", True)
+
+        # A User and Item with the same key, and a duplicate User.
+        self.setup_beam_runtime()
+        self.input.add_elements(
+            [
+                self.init_event(event_id, "User", {"username": "coke"}),
+                self.init_event(event_id, "Item", {"item_name": "coke", "price": 2}),
+                self.init_event(event_id, "User", {"username": "coke"}),
+                (
+                    bytes(event_id, "utf-8"),
+                    JsonSerializer().serialize_event(
+                        Event(
+                            event_id,
+                            FunctionAddress(item_type, "coke"),
+                            EventType.Request.InvokeStateful,
+                            {
+                                "args": Arguments({"amount": 1}),
+                                "method_name": "update_stock",
+                            },
+                        )
+                    ),
+                ),
+            ]
+        )
+        self.runtime._setup_pipeline()
+
+        beam_test.assert_that(
+            self.runtime.test_output["external"],
+            beam_test.matches_all(
+                [
+                    match_event(
+                        event_id,
+                        FunctionAddress(user_type, "coke"),
+                        EventType.Reply.SuccessfulCreateClass,
+                        {"key": "coke"},
+                    ),
+                    match_event(
+                        event_id,
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulCreateClass,
+                        {"key": "coke"},
+                    ),
+                    match_event(
+                        event_id,
+                        FunctionAddress(user_type, "coke"),
+                        EventType.Reply.FailedInvocation,
+                        {
+                            "error_message": "global/User class with key=coke already exists."
+                        },
+                    ),
+                    match_event(
+                        event_id,
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulInvocation,
+                        {"return_results": True},
+                    ),
+                ]
+            ),
+            label="CheckOutput",
+        )
+        self.runtime.run()
+
+    def test_deduplicate_replayed_events(self):
+        item_type: FunctionType = FunctionType("global", "Item", True)
+
+        def item_event(event_id: str, event_type: EventType, payload: dict):
+            return (
+                bytes(event_id, "utf-8"),
+                JsonSerializer().serialize_event(
+                    Event(
+                        event_id,
+                        FunctionAddress(item_type, "coke"),
+                        event_type,
+                        payload,
+                    )
+                ),
+            )
+
+        add_stock = item_event(
+            "add-stock",
+            EventType.Request.InvokeStateful,
+            {"args": Arguments({"amount": 1}), "method_name": "update_stock"},
+        )
+
+        # The stock is added once, even though the event is replayed. Therefore, removing 2 fails.
+        self.setup_beam_runtime(dedup_window=10)
+        self.input.add_elements(
+            [
+                self.init_event("create", "Item", {"item_name": "coke", "price": 2}),
+                add_stock,
+                add_stock,
+                item_event(
+                    "remove-stock",
+                    EventType.Request.InvokeStateful,
+                    {"args": Arguments({"amount": -2}), "method_name": "update_stock"},
+                ),
+                item_event(
+                    "get-stock", EventType.Request.GetState, {"attribute": "stock"}
+                ),
+            ]
+        )
+        self.runtime._setup_pipeline()
+
+        beam_test.assert_that(
+            self.runtime.test_output["external"],
+            beam_test.matches_all(
+                [
+                    match_event(
+                        "create",
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulCreateClass,
+                        {"key": "coke"},
+                    ),
+                    match_event(
+                        "add-stock",
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulInvocation,
+                        {"return_results": True},
+                    ),
+                    match_event(
+                        "add-stock",
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulInvocation,
+                        {"return_results": True},
+                    ),
+                    match_event(
+                        "remove-stock",
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulInvocation,
+                        {"return_results": False},
+                    ),
+                    match_event(
+                        "get-stock",
+                        FunctionAddress(item_type, "coke"),
+                        EventType.Reply.SuccessfulStateRequest,
+                        {"state": 1},
+                    ),
+                ]
+            ),
+            label="CheckOutput",
+        )
+        self.runtime.run()
+
+    def test_fewer_stages(self):
+        def count_stages(multiplexed: bool) -> int:
+            self.setup_beam_runtime(multiplexed)
+            self.input.add_elements([])
+            self.runtime._setup_pipeline()
+            return len(self.runtime.pipeline.to_runner_api().components.transforms)
+
+        assert count_stages(True) < count_stages(False)
+
+
+class TestProduceKafkaMessage:
+    def setup_producer(self) -> _ProduceKafkaMessage:
+        produce = _ProduceKafkaMessage(
+            dict(
+                topic="client_reply",
+                servers="localhost:9092",
+                producer_config={"linger.ms": 10},
+            )
+        )
+        with mock.patch("stateflow.runtime.KafkaConsumer.Producer") as producer:
+            produce.setup()
+        producer.return_value.flush.return_value = 0
+
+        self.producer_class = producer
+        return produce
+
+    def test_producer_reused_across_bundles(self):
+        produce = self.setup_producer()
+
+        for i in range(3):
+            produce.start_bundle()
+            assert list(produce.process(("key", b"value"))) == [("key", b"value")]
+            produce.finish_bundle()
+
+        self.producer_class.assert_called_once()
+        config = self.producer_class.call_args[0][0]
+        assert config["bootstrap.servers"] == "localhost:9092"
+        assert config["linger.ms"] == 10
+        assert config["compression.type"] == "lz4"
+
+        producer = self.producer_class.return_value
+        assert producer.produce.call_count == 3
+        assert producer.flush.call_count == 3
+
+    def test_reply_address(self):
+        produce = self.setup_producer()
+
+        list(produce.process(("key", b"value", ReplyAddress("client_reply_1", 2))))
+
+        args, kwargs = self.producer_class.return_value.produce.call_args
+        assert args == ("client_reply_1", b"value")
+        assert kwargs["key"] == b"key"
+        assert kwargs["partition"] == 2
+
+    def test_full_buffer(self):
+        produce = self.setup_producer()
+        producer = self.producer_class.return_value
+        producer.produce.side_effect = [BufferError(), None]
+
+        list(produce.process(("key", b"value")))
+
+        assert producer.produce.call_count == 2
+        producer.poll.assert_any_call(0.1)
+
+    def test_delivery_error(self):
+        produce = self.setup_producer()
+        producer = self.producer_class.return_value
+
+        def fail_delivery(topic, value, key, on_delivery):
+            on_delivery("Broker: Message timed out", None)
+
+        producer.produce.side_effect = fail_delivery
+
+        list(produce.process(("key", b"value")))
+        with pytest.raises(AttributeError):
+            produce.finish_bundle()
+
+        # The error is only reported once.
+        produce.finish_bundle()
+
+    def test_flush_timeout(self):
+        produce = self.setup_producer()
+        self.producer_class.return_value.flush.return_value = 1
+
+        list(produce.process(("key", b"value")))
+        with pytest.raises(AttributeError):
+            produce.finish_bundle()
+
+
+class FakeKafkaMessage:
+    def __init__(self, key: bytes, value: bytes, offset: int):
+        self._key = key
+        self._value = value
+        self._offset = offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return None
+
+
+class FakeKafkaConsumer:
+    """An in-memory replacement of `confluent_kafka.Consumer`, it serves the messages in PARTITIONS."""
+
+    PARTITIONS = {}
+    COMMITTED = {}
+    ASSIGNED = []
+    BUFFER_SIZES = []
+
+    def __init__(self, **config):
+        self.config = config
+        self.assignment = None
+
+    def list_topics(self, timeout=None):
+        topics = {}
+        for topic, partition in FakeKafkaConsumer.PARTITIONS:
+            topics.setdefault(
+                topic, SimpleNamespace(partitions={}, error=None)
+            ).partitions[partition] = None
+        return SimpleNamespace(topics=topics)
+
+    def committed(self, partitions, timeout=None):
+        return [
+            TopicPartition(
+                tp.topic,
+                tp.partition,
+                FakeKafkaConsumer.COMMITTED.get(
+                    (tp.topic, tp.partition), OFFSET_INVALID
+                ),
+            )
+            for tp in partitions
+        ]
+
+    def get_watermark_offsets(self, tp, timeout=None):
+        return 0, len(FakeKafkaConsumer.PARTITIONS[(tp.topic, tp.partition)])
+
+    def assign(self, partitions):
+        [tp] = partitions
+        FakeKafkaConsumer.ASSIGNED.append((tp.topic, tp.partition, tp.offset))
+        self.assignment = [tp.topic, tp.partition, tp.offset]
+
+    def consume(self, num_messages, timeout):
+        topic, partition, offset = self.assignment
+        messages = FakeKafkaConsumer.PARTITIONS[(topic, partition)][
+            offset : offset + num_messages
+        ]
+        FakeKafkaConsumer.BUFFER_SIZES.append(len(messages))
+        if not messages:
+            time.sleep(timeout)
+            return []
+
+        self.assignment[2] += len(messages)
+        return [
+            FakeKafkaMessage(f"{topic}-{partition}".encode(), message, offset + i)
+            for i, message in enumerate(messages)
+        ]
+
+    def commit(self, offsets, asynchronous=True):
+        for tp in offsets:
+            FakeKafkaConsumer.COMMITTED[(tp.topic, tp.partition)] = tp.offset
+
+    def close(self):
+        pass
+
+
+class RejectingTracker(OffsetRestrictionTracker):
+    """A restriction tracker which rejects all claims, e.g. as its restriction was split before the first claim."""
+
+    def try_claim(self, position):
+        return False
+
+
+class TestKafkaConsume:
+    def test_read_all_partitions(self):
+        FakeKafkaConsumer.PARTITIONS = {
+            (topic, partition): [f"{topic}-{partition}-{i}".encode() for i in range(5)]
+            for topic in ["client_request", "internal"]
+            for partition in range(3)
+        }
+        FakeKafkaConsumer.COMMITTED = {("internal", 2): 3}
+        FakeKafkaConsumer.ASSIGNED = []
+        FakeKafkaConsumer.BUFFER_SIZES = []
+
+        consume = KafkaConsume(
+            consumer_config={
+                "bootstrap.servers": "localhost:9092",
+                "auto.offset.reset": "earliest",
+                "group.id": "stateflow",
+                "topic": ["client_request", "internal"],
+            },
+            timeout=3,
+            checkpoint_interval=0.2,
+            max_buffer_size=2,
+        )
+
+        expected = [
+            (f"{topic}-{partition}".encode(), message)
+            for (topic, partition), messages in FakeKafkaConsumer.PARTITIONS.items()
+            for message in messages[
+                FakeKafkaConsumer.COMMITTED.get((topic, partition), 0) :
+            ]
+        ]
+
+        with mock.patch("stateflow.runtime.KafkaConsumer.Consumer", FakeKafkaConsumer):
+            with beam.Pipeline() as pipeline:
+                beam_test.assert_that(pipeline | consume, beam_test.equal_to(expected))
+
+        # Every partition is read (from its committed offset) and its offset is committed.
+        assert {
+            (topic, partition) for topic, partition, _ in FakeKafkaConsumer.ASSIGNED
+        } == set(FakeKafkaConsumer.PARTITIONS)
+        assert ("internal", 2, 3) in FakeKafkaConsumer.ASSIGNED
+        assert max(FakeKafkaConsumer.BUFFER_SIZES) == 2
+        assert FakeKafkaConsumer.COMMITTED == {
+            partition: 5 for partition in FakeKafkaConsumer.PARTITIONS
+        }
+
+    def test_restart_after_crash(self):
+        FakeKafkaConsumer.PARTITIONS = {
+            ("client_request", 0): [f"message-{i}".encode() for i in range(5)]
+        }
+        FakeKafkaConsumer.COMMITTED = {}
+        FakeKafkaConsumer.ASSIGNED = []
+        FakeKafkaConsumer.BUFFER_SIZES = []
+
+        def consume() -> KafkaConsume:
+            return KafkaConsume(
+                consumer_config={
+                    "bootstrap.servers": "localhost:9092",
+                    "auto.offset.reset": "earliest",
+                    "group.id": "stateflow",
+                    "topic": ["client_request"],
+                },
+                timeout=2,
+                checkpoint_interval=0.2,
+                max_buffer_size=2,
+            )
+
+        def crash(message: Tuple[bytes, bytes]):
+            if message[1] == b"message-3":
+                raise RuntimeError("Crash")
+            return message
+
+        with mock.patch("stateflow.runtime.KafkaConsumer.Consumer", FakeKafkaConsumer):
+            with pytest.raises(Exception):
+                with beam.Pipeline() as pipeline:
+                    pipeline | consume() | beam.Map(crash)
+
+            # The offset of a failed bundle is not committed, so its messages are read again after a restart.
+            committed: int = FakeKafkaConsumer.COMMITTED.get(("client_request", 0), 0)
+            assert committed <= 3
+
+            with beam.Pipeline() as pipeline:
+                beam_test.assert_that(
+                    pipeline | consume(),
+                    beam_test.equal_to(
+                        [
+                            (b"client_request-0", f"message-{i}".encode())
+                            for i in range(committed, 5)
+                        ]
+                    ),
+                )
+
+        assert FakeKafkaConsumer.COMMITTED == {("client_request", 0): 5}
+
+    def test_seek_back_after_rejected_claim(self):
+        FakeKafkaConsumer.PARTITIONS = {
+            ("client_request", 0): [f"message-{i}".encode() for i in range(5)]
+        }
+        FakeKafkaConsumer.COMMITTED = {}
+        FakeKafkaConsumer.ASSIGNED = []
+        FakeKafkaConsumer.BUFFER_SIZES = []
+
+        consume_topic = _ConsumeKafkaTopic(
+            dict(
+                consumer_config={"group.id": "stateflow"},
+                value_decoder=None,
+                timeout=-1,
+                checkpoint_interval=None,
+                max_buffer_size=3,
+            )
+        )
+        consume_topic.setup()
+        element = ("client_request", 0, 0)
+
+        with mock.patch("stateflow.runtime.KafkaConsumer.Consumer", FakeKafkaConsumer):
+            # The first buffer is consumed, but not claimed.
+            assert (
+                list(
+                    consume_topic.process(
+                        element,
+                        mock.MagicMock(),
+                        RejectingTracker(OffsetRange(0, sys.maxsize)),
+                    )
+                )
+                == []
+            )
+
+            # The remainder starts at the first unclaimed message, so nothing is skipped.
+            consume_topic.stop_time = time.time() + 0.5
+            messages = list(
+                consume_topic.process(
+                    element,
+                    mock.MagicMock(),
+                    OffsetRestrictionTracker(OffsetRange(0, sys.maxsize)),
+                )
+            )
+
+        assert [value for _, value in messages] == FakeKafkaConsumer.PARTITIONS[
+            ("client_request", 0)
+        ]
+        assert FakeKafkaConsumer.ASSIGNED == [
+            ("client_request", 0, 0),
+            ("client_request", 0, 0),
+        ]
+
+
+class TestStateCoder:
+    def test_round_trip(self):
+        coder = StateCoder()
+        state = State({"username": "wouter", "balance": 10, "items": ["a", "b"]})
+
+        decoded: State = coder.decode(coder.encode(state))
+
+        assert isinstance(decoded, State)
+        assert decoded.get() == state.get()
+
+    def test_round_trip_deduplicated(self):
+        coder = StateCoder()
+        state = DeduplicatedState(
+            State({"balance": 10}), {"event-1": ("kafka", ("event-1", b"reply"))}
+        )
+
+        decoded: DeduplicatedState = coder.decode(coder.encode(state))
+
+        assert isinstance(decoded, DeduplicatedState)
+        assert decoded.state.get() == {"balance": 10}
+        assert decoded.outputs == {"event-1": ("kafka", ("event-1", b"reply"))}
+
+
+class TestPipelineOptions:
+    def test_default_options(self):
+        options = BeamRuntime(stateflow.init())._setup_pipeline_options()
+
+        assert options.view_as(DirectOptions).direct_num_workers == 1
+        assert options.view_as(StandardOptions).streaming is False
+
+    def test_direct_parallelism(self):
+        options = BeamRuntime(
+            stateflow.init(), runner="DirectRunner", parallelism=4
+        )._setup_pipeline_options()
+
+        assert options.view_as(StandardOptions).runner == "DirectRunner"
+        assert options.view_as(DirectOptions).direct_num_workers == 4
+        assert options.view_as(DirectOptions).direct_running_mode == "multi_processing"
+
+    def test_keep_direct_running_mode(self):
+        options = BeamRuntime(
+            stateflow.init(),
+            pipeline_options=PipelineOptions(direct_running_mode="multi_threading"),
+            parallelism=4,
+        )._setup_pipeline_options()
+
+        assert options.view_as(DirectOptions).direct_num_workers == 4
+        assert options.view_as(DirectOptions).direct_running_mode == "multi_threading"
+
+    def test_flink_parallelism(self):
+        options = BeamRuntime(
+            stateflow.init(),
+            pipeline_options=PipelineOptions(
+                ["--runner=FlinkRunner", "--flink_master=localhost:8081"]
+            ),
+            parallelism=4,
+        )._setup_pipeline_options()
+
+        assert options.view_as(FlinkRunnerOptions).parallelism == 4
+        assert options.view_as(FlinkRunnerOptions).flink_master == "localhost:8081"
+        assert options.view_as(StandardOptions).streaming is True
+
+    def test_unsupported_parallelism(self):
+        with pytest.raises(AttributeError):
+            BeamRuntime(
+                stateflow.init(), runner="DataflowRunner", parallelism=4
+            )._setup_pipeline_options()
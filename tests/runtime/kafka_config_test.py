@@ -0,0 +1,61 @@
+from tests.common.common_classes import stateflow
+from stateflow.runtime.kafka_config import KafkaConfig
+from stateflow.runtime.beam_runtime import BeamRuntime
+
+
+class TestKafkaConfig:
+    def test_defaults(self):
+        config = KafkaConfig()
+
+        assert config.input_topics() == ["client_request", "internal"]
+        assert config.consumer_config()["group.id"] == "stateflow-runtime"
+        assert config.consumer_config()["fetch.wait.max.ms"] == 100
+        assert config.producer_config()["linger.ms"] == 5
+        assert config.producer_config()["enable.idempotence"] is True
+
+    def test_extra_settings(self):
+        config = KafkaConfig(
+            brokers="kafka:9092",
+            consumer_extra={"session.timeout.ms": 10000, "fetch.min.bytes": 1024},
+            producer_extra={"enable.idempotence": True},
+        )
+
+        assert config.consumer_config()["bootstrap.servers"] == "kafka:9092"
+        assert config.consumer_config()["session.timeout.ms"] == 10000
+        assert config.consumer_config()["fetch.min.bytes"] == 1024
+        assert config.producer_config()["enable.idempotence"] is True
+
+    def test_java_properties(self):
+        config = KafkaConfig(producer_extra={"enable.idempotence": True})
+
+        consumer_properties = config.java_consumer_properties()
+        assert consumer_properties["fetch.max.wait.ms"] == "100"
+        assert "fetch.wait.max.ms" not in consumer_properties
+        assert config.java_producer_properties()["enable.idempotence"] == "true"
+        assert all(
+            isinstance(value, str)
+            for value in config.java_producer_properties().values()
+        )
+
+    def test_beam_runtime(self):
+        config = KafkaConfig(
+            brokers="kafka:9092",
+            group_id="beam",
+            request_topic="requests",
+            internal_topic="internal_events",
+            linger_ms=20,
+        )
+        runtime = BeamRuntime(stateflow.init(), config=config)
+
+        consumer_args = runtime._setup_kafka_client()._consumer_args
+        assert consumer_args["consumer_config"]["topic"] == [
+            "requests",
+            "internal_events",
+        ]
+        assert consumer_args["consumer_config"]["group.id"] == "beam"
+        assert consumer_args["consumer_config"]["bootstrap.servers"] == "kafka:9092"
+
+        producer_attributes = runtime._setup_kafka_producer("replies")._attributes
+        assert producer_attributes["topic"] == "replies"
+        assert producer_attributes["servers"] == "kafka:9092"
+        assert producer_attributes["producer_config"]["linger.ms"] == 20
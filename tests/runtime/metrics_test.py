@@ -0,0 +1,86 @@
+import json
+from stateflow.runtime.metrics import (
+    Histogram,
+    LocalMetricsCollector,
+    EMFMetricsCollector,
+)
+
+
+class TestMetrics:
+    def test_histogram(self):
+        histogram = Histogram()
+        assert histogram.percentile(50) is None
+
+        for value in range(1, 101):
+            histogram.record(float(value))
+
+        assert histogram.count == 100
+        assert histogram.min == 1.0
+        assert histogram.max == 100.0
+        assert histogram.sum == 5050.0
+        assert histogram.percentile(50) == 50.0
+        assert histogram.percentile(99) == 99.0
+
+        # Values are rounded to two significant digits.
+        histogram.record(1.234)
+        assert 1.2 in histogram.values
+
+    def test_local_collector(self):
+        collector = LocalMetricsCollector()
+        collector.record("read", 1.0, "global/User", "update_balance")
+        collector.record("read", 3.0, "global/User", "update_balance")
+        collector.flush()
+        collector.record("read", 2.0, "global/User", "update_balance")
+        collector.flush()
+
+        histogram = collector.get("read", "global/User", "update_balance")
+        assert histogram.count == 3
+        assert histogram.min == 1.0
+        assert histogram.max == 3.0
+        assert collector.get("write", "global/User", "update_balance") is None
+        assert len(collector.histograms) == 0
+
+    def test_emf_collector(self):
+        lines = []
+        collector = EMFMetricsCollector(namespace="test", out=lines.append)
+
+        # Nothing is emitted without metrics.
+        collector.flush()
+        assert lines == []
+
+        collector.record("read", 1.0, "global/User", "update_balance")
+        collector.record("read", 1.0, "global/User", "update_balance")
+        collector.record("write", 2.0, "global/User", "update_balance")
+        collector.record("invocation", 5.0)
+        collector.flush()
+
+        assert len(lines) == 2
+        line = json.loads(lines[0])
+
+        metadata = line["_aws"]["CloudWatchMetrics"][0]
+        assert metadata["Namespace"] == "test"
+        assert metadata["Dimensions"] == [["Operator", "Method"]]
+        assert metadata["Metrics"] == [
+            {"Name": "read", "Unit": "Milliseconds"},
+            {"Name": "write", "Unit": "Milliseconds"},
+        ]
+        assert line["Operator"] == "global/User"
+        assert line["Method"] == "update_balance"
+        assert line["read"] == {"Values": [1.0], "Counts": [2]}
+
+        line = json.loads(lines[1])
+        assert line["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [[]]
+        assert line["invocation"] == {"Values": [5.0], "Counts": [1]}
+
+    def test_emf_collector_max_values(self):
+        lines = []
+        collector = EMFMetricsCollector(out=lines.append)
+
+        for value in range(150):
+            collector.record("read", float(value))
+        collector.flush()
+
+        lines = [json.loads(line) for line in lines]
+        assert len(lines) == 2
+        assert len(lines[0]["read"]["Values"]) == 100
+        assert sum(lines[0]["read"]["Counts"]) + sum(lines[1]["read"]["Counts"]) == 150
@@ -0,0 +1,80 @@
+from stateflow.runtime.aws.state_cache import StateCache
+from unittest import mock
+
+
+class TestStateCache:
+    def test_get_and_put(self):
+        cache = StateCache()
+        assert cache.get("a") is None
+
+        cache.put("a", b"state", 1)
+        assert cache.get("a") == (b"state", 1)
+
+        cache.put("a", b"new_state", 2)
+        assert cache.get("a") == (b"new_state", 2)
+        assert len(cache) == 1
+        assert cache.size == len("a") + len(b"new_state")
+
+        assert cache.hits == 2
+        assert cache.misses == 1
+
+    def test_evict_lru_on_max_entries(self):
+        cache = StateCache(max_entries=2)
+        cache.put("a", b"state", 1)
+        cache.put("b", b"state", 1)
+
+        # "a" is now the most recently used.
+        cache.get("a")
+        cache.put("c", b"state", 1)
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_evict_on_max_bytes(self):
+        cache = StateCache(max_bytes=20)
+        cache.put("a", b"123456789", 1)
+        cache.put("b", b"123456789", 1)
+        assert len(cache) == 2
+
+        cache.put("c", b"123456789", 1)
+        assert len(cache) == 2
+        assert cache.get("a") is None
+        assert cache.size == 20
+
+        # State larger than the budget is not cached at all.
+        cache.put("d", b"1" * 100, 1)
+        assert cache.get("d") is None
+        assert len(cache) == 2
+
+    def test_invalidate(self):
+        cache = StateCache()
+        cache.put("a", b"state", 1)
+        cache.invalidate("a")
+        cache.invalidate("b")
+
+        assert cache.get("a") is None
+        assert cache.size == 0
+
+    def test_expire_after_ttl(self):
+        with mock.patch("stateflow.runtime.aws.state_cache.time") as time_mock:
+            time_mock.monotonic.return_value = 100.0
+            cache = StateCache(ttl=1.0)
+            cache.put("a", b"state", 1)
+
+            time_mock.monotonic.return_value = 100.5
+            assert cache.get("a") == (b"state", 1)
+
+            time_mock.monotonic.return_value = 101.0
+            assert cache.get("a") is None
+            assert len(cache) == 0
+            assert cache.size == 0
+
+    def test_without_ttl(self):
+        with mock.patch("stateflow.runtime.aws.state_cache.time") as time_mock:
+            time_mock.monotonic.return_value = 100.0
+            cache = StateCache(ttl=None)
+            cache.put("a", b"state", 1)
+
+            time_mock.monotonic.return_value = 10000.0
+            assert cache.get("a") == (b"state", 1)
@@ -0,0 +1,90 @@
+from tests.context import stateflow
+from tests.common.common_classes import stateflow
+from stateflow.util.local_runtime import LocalRuntime
+from stateflow.dataflow.dataflow import Dataflow
+import subprocess
+import pytest
+import sys
+import os
+
+
+def snapshot_class(flow: Dataflow, class_name: str):
+    return [
+        op.meta_wrapper
+        for op in flow.operators
+        if op.class_wrapper.class_desc.class_name == class_name
+    ][0]
+
+
+def test_load_snapshot(tmp_path):
+    path = str(tmp_path / "dataflow.snapshot")
+    stateflow.save_snapshot(stateflow.init(), path)
+
+    flow: Dataflow = stateflow.load_snapshot(path)
+    assert [op.class_wrapper.class_desc.class_name for op in flow.operators] == [
+        op.class_wrapper.class_desc.class_name for op in stateflow.init().operators
+    ]
+
+    # The classes of the snapshot are not analyzed again.
+    user_desc = snapshot_class(flow, "User").descriptor
+    assert user_desc.class_node is None
+    assert user_desc.get_method_by_name("buy_item").is_splitted_function()
+
+    LocalRuntime(flow)
+    User = snapshot_class(flow, "User")
+    Item = snapshot_class(flow, "Item")
+
+    user = User("wouter")
+    item = Item("coke", 2)
+    user.update_balance(10)
+    item.update_stock(5)
+
+    # A split method, executed as a flow.
+    assert user.buy_item(2, item)
+    assert user.balance == 6
+    assert item.stock == 3
+    assert not user.buy_item(4, item)
+
+
+def test_snapshot_version(tmp_path):
+    path = str(tmp_path / "dataflow.snapshot")
+    stateflow.save_snapshot(stateflow.init(), path)
+
+    stateflow.core.SNAPSHOT_VERSION += 1
+    try:
+        with pytest.raises(AttributeError):
+            stateflow.load_snapshot(path)
+    finally:
+        stateflow.core.SNAPSHOT_VERSION -= 1
+
+
+def test_load_snapshot_without_analysis(tmp_path):
+    path = str(tmp_path / "dataflow.snapshot")
+    stateflow.save_snapshot(stateflow.init(), path)
+
+    # A fresh interpreter, in which importing libcst or the module of the classes fails.
+    script = f"""
+import sys
+
+class Block:
+    def find_spec(self, name, path, target=None):
+        if name.split(".")[0] == "libcst" or name.startswith("tests.common"):
+            raise ImportError(name)
+
+sys.meta_path.insert(0, Block())
+
+import stateflow
+from stateflow.util.local_runtime import LocalRuntime
+
+flow = stateflow.load_snapshot({path!r})
+LocalRuntime(flow)
+Item = [op.meta_wrapper for op in flow.operators if op.class_wrapper.class_desc.class_name == "Item"][0]
+item = Item("coke", 2)
+item.update_stock(5)
+assert item.stock == 5
+"""
+    subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
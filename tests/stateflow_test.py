@@ -11,6 +11,7 @@ from .context import stateflow
 from stateflow.client.kafka_client import StateflowKafkaClient
 from stateflow.runtime.flink.pyflink import FlinkRuntime
 from stateflow.runtime.beam_runtime import BeamRuntime
+from stateflow.runtime.kafka_config import KafkaConfig
 from stateflow.serialization.pickle_serializer import PickleSerializer
 
 import time
@@ -28,12 +29,19 @@ def kafka():
 
 def start_runtime(runtime):
     try:
+        # A new consumer group per run, so that each run starts at the latest offset.
+        config = KafkaConfig(group_id=str(uuid.uuid4()))
         if runtime == "beam":
             run_time = BeamRuntime(
-                stateflow.init(), timeout=15, serializer=PickleSerializer()
+                stateflow.init(),
+                timeout=15,
+                serializer=PickleSerializer(),
+                config=config,
             )
         else:
-            run_time = FlinkRuntime(stateflow.init(), serializer=PickleSerializer())
+            run_time = FlinkRuntime(
+                stateflow.init(), serializer=PickleSerializer(), config=config
+            )
         run_time.run(async_execution=True)
     except Exception as excp:
         import traceback